@@ -20,6 +20,16 @@ config.set_main_option("sqlalchemy.url", settings.database_url)
 target_metadata = Base.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave out of autogenerate the model objects declared with ddl_if() for
+    another database (e.g. the Postgres-only trigram index on SQLite), as
+    create_all() does."""
+    ddl_if = getattr(object, "_ddl_if", None)
+    if not reflected and ddl_if is not None and ddl_if.dialect is not None:
+        return ddl_if.dialect == context.get_context().dialect.name
+    return True
+
+
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
@@ -27,6 +37,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -38,11 +50,23 @@ def run_migrations_online() -> None:
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        connect_args=(
+            {"options": f"-c lock_timeout={settings.migration_lock_timeout}"}
+            if settings.database_url.startswith("postgresql")
+            else {}
+        ),
     )
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # Each migration commits on its own, so online steps (app.migrations)
+            # don't hold locks taken by earlier migrations
+            transaction_per_migration=True,
+            # SQLite can only alter most constraints by recreating the table
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_object=include_object,
         )
 
         with context.begin_transaction():
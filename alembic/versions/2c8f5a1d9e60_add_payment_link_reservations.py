@@ -0,0 +1,28 @@
+"""add payment link reservations
+
+Revision ID: 2c8f5a1d9e60
+Revises: e7a3f09c52d8
+Create Date: 2026-10-19 04:31:06.172839
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8f5a1d9e60'
+down_revision: Union[str, None] = 'e7a3f09c52d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('payment_links', sa.Column('reserved_until', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('payment_links', sa.Column('reserved_by', sa.String(length=26), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('payment_links', 'reserved_by')
+    op.drop_column('payment_links', 'reserved_until')
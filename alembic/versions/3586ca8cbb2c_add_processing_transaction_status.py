@@ -0,0 +1,34 @@
+"""add processing transaction status
+
+Revision ID: 3586ca8cbb2c
+Revises: 4930af991936
+Create Date: 2026-10-19 01:34:12.880215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3586ca8cbb2c'
+down_revision: Union[str, None] = '4930af991936'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not is_postgres():
+        # Enums are plain VARCHAR columns elsewhere
+        return
+    # ADD VALUE can't be used inside the transaction that adds it
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE transactionstatus ADD VALUE IF NOT EXISTS 'PROCESSING' AFTER 'PENDING'")
+
+
+def downgrade() -> None:
+    # Postgres can't drop enum values; leftover PROCESSING rows go back to PENDING
+    op.execute("UPDATE transactions SET status = 'PENDING' WHERE status = 'PROCESSING'")
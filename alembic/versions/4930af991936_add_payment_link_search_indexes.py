@@ -0,0 +1,40 @@
+"""add payment link search indexes
+
+Revision ID: 4930af991936
+Revises: 84153c7cc41d
+Create Date: 2026-10-19 00:20:41.508117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, drop_index_concurrently, is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4930af991936'
+down_revision: Union[str, None] = '84153c7cc41d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently('ix_payment_links_user_id_status_created_at', 'payment_links', ['user_id', 'status', 'created_at'])
+    if not is_postgres():
+        # The trigram index is Postgres only; other databases scan for q
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    create_index_concurrently(
+        'ix_payment_links_description_trgm',
+        'payment_links',
+        ['description'],
+        postgresql_using='gin',
+        postgresql_ops={'description': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_payment_links_description_trgm', 'payment_links')
+    drop_index_concurrently('ix_payment_links_user_id_status_created_at', 'payment_links')
@@ -0,0 +1,36 @@
+"""add unique visitor sketches
+
+Revision ID: 5b2e9d7c1a44
+Revises: 3586ca8cbb2c
+Create Date: 2026-10-19 02:10:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9d7c1a44'
+down_revision: Union[str, None] = '3586ca8cbb2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('payment_links', sa.Column('visitors_sketch', sa.LargeBinary(), nullable=True))
+    op.add_column('payment_links', sa.Column('unique_visitors', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table('link_visitor_sketches',
+    sa.Column('payment_link_id', sa.Uuid(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('registers', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['payment_link_id'], ['payment_links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('payment_link_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('link_visitor_sketches')
+    op.drop_column('payment_links', 'unique_visitors')
+    op.drop_column('payment_links', 'visitors_sketch')
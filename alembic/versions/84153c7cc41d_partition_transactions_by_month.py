@@ -0,0 +1,194 @@
+"""partition transactions by month
+
+Revision ID: 84153c7cc41d
+Revises: bec5d4993610
+Create Date: 2026-10-18 23:52:07.113402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.config import get_settings
+from app.migrations import is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = '84153c7cc41d'
+down_revision: Union[str, None] = 'bec5d4993610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRANSACTION_COLUMNS = (
+    "id, payment_link_id, buy_order, session_id, token, status, response_code, "
+    "authorization_code, payment_type_code, installments_number, amount, "
+    "card_last_four, created_at, authorized_at, webpay_response"
+)
+
+# Crea las particiones mensuales (en UTC) desde el mes de `since` hasta
+# `months_ahead` meses después del mes actual. Es idempotente: el job de
+# archivado la llama periódicamente para tener siempre particiones futuras.
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(
+    months_ahead integer DEFAULT 3,
+    since timestamptz DEFAULT now()
+) RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    partition_start timestamptz := date_trunc('month', since AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    last_start timestamptz := (date_trunc('month', now() AT TIME ZONE 'UTC')
+        + make_interval(months => months_ahead)) AT TIME ZONE 'UTC';
+    partition_name text;
+BEGIN
+    WHILE partition_start <= last_start LOOP
+        partition_name := format('transactions_%s', to_char(partition_start AT TIME ZONE 'UTC', 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                partition_start,
+                ((partition_start AT TIME ZONE 'UTC') + interval '1 month') AT TIME ZONE 'UTC'
+            );
+        END IF;
+        partition_start := ((partition_start AT TIME ZONE 'UTC') + interval '1 month') AT TIME ZONE 'UTC';
+    END LOOP;
+END;
+$$
+"""
+
+
+def _create_side_tables() -> None:
+    op.create_table('transaction_archives',
+    sa.Column('transaction_id', sa.Uuid(), nullable=False),
+    sa.Column('transaction_created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('webpay_response', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('transaction_id')
+    )
+    # Keeps buy_order globally unique, which the partitioned table can't
+    op.create_table('transaction_buy_orders',
+    sa.Column('buy_order', sa.String(length=26), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('buy_order')
+    )
+    op.execute(
+        "INSERT INTO transaction_buy_orders (buy_order, created_at) "
+        "SELECT buy_order, created_at FROM transactions"
+    )
+
+
+def upgrade() -> None:
+    if not is_postgres():
+        # No partitioning elsewhere: just the same keys as the partitioned table
+        with op.batch_alter_table(
+            'transactions',
+            recreate='always',
+            reflect_args=[
+                sa.Column('id', sa.Uuid(), primary_key=True),
+                sa.Column('created_at', sa.DateTime(timezone=True), primary_key=True),
+            ],
+        ) as batch_op:
+            batch_op.drop_index('ix_transactions_buy_order')
+            batch_op.create_index('ix_transactions_buy_order', ['buy_order'], unique=False)
+        _create_side_tables()
+        return
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+    op.execute("ALTER TABLE transactions_legacy RENAME CONSTRAINT transactions_pkey TO transactions_legacy_pkey")
+    for column in ("buy_order", "created_at", "payment_link_id", "status"):
+        op.execute(f"ALTER INDEX ix_transactions_{column} RENAME TO ix_transactions_legacy_{column}")
+
+    # The partition key must be part of every unique constraint, so the
+    # primary key becomes (id, created_at) and buy_order uniqueness moves to
+    # transaction_buy_orders.
+    op.execute("""
+        CREATE TABLE transactions (
+            id UUID NOT NULL,
+            payment_link_id UUID NOT NULL REFERENCES payment_links (id) ON DELETE CASCADE,
+            buy_order VARCHAR(26) NOT NULL,
+            session_id VARCHAR(61) NOT NULL,
+            token VARCHAR(64),
+            status transactionstatus NOT NULL,
+            response_code INTEGER,
+            authorization_code VARCHAR(6),
+            payment_type_code VARCHAR(3),
+            installments_number INTEGER,
+            amount INTEGER NOT NULL,
+            card_last_four VARCHAR(4),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            authorized_at TIMESTAMP WITH TIME ZONE,
+            webpay_response JSONB,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index(op.f('ix_transactions_buy_order'), 'transactions', ['buy_order'], unique=False)
+    op.create_index(op.f('ix_transactions_created_at'), 'transactions', ['created_at'], unique=False)
+    op.create_index(op.f('ix_transactions_payment_link_id'), 'transactions', ['payment_link_id'], unique=False)
+    op.create_index(op.f('ix_transactions_status'), 'transactions', ['status'], unique=False)
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+    op.execute(
+        sa.text("""
+            SELECT ensure_transaction_partitions(
+                :months_ahead, coalesce((SELECT min(created_at) FROM transactions_legacy), now())
+            )
+        """).bindparams(months_ahead=get_settings().transaction_partitions_ahead)
+    )
+    op.execute(
+        f"INSERT INTO transactions ({TRANSACTION_COLUMNS}) "
+        f"SELECT {TRANSACTION_COLUMNS} FROM transactions_legacy"
+    )
+    op.drop_table('transactions_legacy')
+
+    _create_side_tables()
+
+
+def downgrade() -> None:
+    # Las respuestas ya archivadas quedan comprimidas fuera de la tabla y se pierden
+    op.drop_table('transaction_archives')
+    op.drop_table('transaction_buy_orders')
+
+    if not is_postgres():
+        with op.batch_alter_table('transactions', recreate='always') as batch_op:
+            batch_op.drop_index('ix_transactions_buy_order')
+            batch_op.create_primary_key('pk_transactions', ['id'])
+            batch_op.create_index('ix_transactions_buy_order', ['buy_order'], unique=True)
+        return
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned")
+    op.execute("ALTER TABLE transactions_partitioned RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey")
+    for column in ("buy_order", "created_at", "payment_link_id", "status"):
+        op.execute(f"ALTER INDEX ix_transactions_{column} RENAME TO ix_transactions_partitioned_{column}")
+
+    op.create_table('transactions',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('payment_link_id', sa.Uuid(), nullable=False),
+    sa.Column('buy_order', sa.String(length=26), nullable=False),
+    sa.Column('session_id', sa.String(length=61), nullable=False),
+    sa.Column('token', sa.String(length=64), nullable=True),
+    sa.Column('status', postgresql.ENUM(name='transactionstatus', create_type=False), nullable=False),
+    sa.Column('response_code', sa.Integer(), nullable=True),
+    sa.Column('authorization_code', sa.String(length=6), nullable=True),
+    sa.Column('payment_type_code', sa.String(length=3), nullable=True),
+    sa.Column('installments_number', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('card_last_four', sa.String(length=4), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('authorized_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('webpay_response', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['payment_link_id'], ['payment_links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        f"INSERT INTO transactions ({TRANSACTION_COLUMNS}) "
+        f"SELECT {TRANSACTION_COLUMNS} FROM transactions_partitioned"
+    )
+    op.create_index(op.f('ix_transactions_buy_order'), 'transactions', ['buy_order'], unique=True)
+    op.create_index(op.f('ix_transactions_created_at'), 'transactions', ['created_at'], unique=False)
+    op.create_index(op.f('ix_transactions_payment_link_id'), 'transactions', ['payment_link_id'], unique=False)
+    op.create_index(op.f('ix_transactions_status'), 'transactions', ['status'], unique=False)
+
+    op.execute("DROP TABLE transactions_partitioned")
+    op.execute("DROP FUNCTION ensure_transaction_partitions(integer, timestamptz)")
@@ -0,0 +1,37 @@
+"""add hot lookup indexes
+
+Revision ID: 9d41c6e2b7f3
+Revises: 5b2e9d7c1a44
+Create Date: 2026-10-19 03:05:12.604281
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, create_partitioned_index, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41c6e2b7f3'
+down_revision: Union[str, None] = '5b2e9d7c1a44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Webpay return: transactions looked up by token
+    create_partitioned_index('ix_transactions_token', 'transactions', ['token'])
+    create_index_concurrently('ix_payment_links_user_id_created_at', 'payment_links', ['user_id', 'created_at'])
+    create_index_concurrently('ix_payment_links_status_expires_at', 'payment_links', ['status', 'expires_at'])
+    # Redundant with the (status, expires_at) prefix
+    drop_index_concurrently('ix_payment_links_status', 'payment_links')
+
+
+def downgrade() -> None:
+    create_index_concurrently('ix_payment_links_status', 'payment_links', ['status'])
+    drop_index_concurrently('ix_payment_links_status_expires_at', 'payment_links')
+    drop_index_concurrently('ix_payment_links_user_id_created_at', 'payment_links')
+    # Partitioned indexes can't be dropped concurrently
+    op.drop_index('ix_transactions_token', table_name='transactions', if_exists=True)
@@ -21,7 +21,7 @@ depends_on: Union[str, Sequence[str], None] = None
 def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table('users',
-    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
     sa.Column('email', sa.String(length=255), nullable=False),
     sa.Column('name', sa.String(length=255), nullable=False),
     sa.Column('google_id', sa.String(length=255), nullable=False),
@@ -34,15 +34,15 @@ def upgrade() -> None:
     op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
     op.create_index(op.f('ix_users_google_id'), 'users', ['google_id'], unique=True)
     op.create_table('payment_links',
-    sa.Column('id', sa.UUID(), nullable=False),
-    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
     sa.Column('slug', sa.String(length=16), nullable=False),
     sa.Column('amount', sa.Integer(), nullable=False),
     sa.Column('description', sa.String(length=500), nullable=False),
     sa.Column('currency', sa.String(length=3), nullable=False),
     sa.Column('status', sa.Enum('ACTIVE', 'PAID', 'EXPIRED', 'CANCELLED', name='paymentlinkstatus'), nullable=False),
     sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
-    sa.Column('extra_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('extra_data', sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql'), nullable=False),
     sa.Column('views_count', sa.Integer(), nullable=False),
     sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
     sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
@@ -52,8 +52,8 @@ def upgrade() -> None:
     op.create_index(op.f('ix_payment_links_slug'), 'payment_links', ['slug'], unique=True)
     op.create_index(op.f('ix_payment_links_status'), 'payment_links', ['status'], unique=False)
     op.create_table('transactions',
-    sa.Column('id', sa.UUID(), nullable=False),
-    sa.Column('payment_link_id', sa.UUID(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('payment_link_id', sa.Uuid(), nullable=False),
     sa.Column('buy_order', sa.String(length=26), nullable=False),
     sa.Column('session_id', sa.String(length=61), nullable=False),
     sa.Column('token', sa.String(length=64), nullable=True),
@@ -69,7 +69,7 @@ def upgrade() -> None:
     sa.Column('payer_name', sa.String(length=255), nullable=True),
     sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
     sa.Column('authorized_at', sa.DateTime(timezone=True), nullable=True),
-    sa.Column('webpay_response', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('webpay_response', sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql'), nullable=True),
     sa.ForeignKeyConstraint(['payment_link_id'], ['payment_links.id'], ondelete='CASCADE'),
     sa.PrimaryKeyConstraint('id')
     )
@@ -0,0 +1,93 @@
+"""add refunds
+
+Revision ID: b3e61d0f8a27
+Revises: 7f2b4e8a0c13
+Create Date: 2026-10-19 06:03:27.514920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.migrations import is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e61d0f8a27'
+down_revision: Union[str, None] = '7f2b4e8a0c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if is_postgres():
+        # REFUNDED already exists since the initial revision; ADD VALUE can't run in a transaction
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE transactionstatus ADD VALUE IF NOT EXISTS 'PARTIALLY_REFUNDED'")
+            op.execute("ALTER TYPE transactionstatus ADD VALUE IF NOT EXISTS 'REFUNDED'")
+    else:
+        # Enums are plain VARCHAR columns elsewhere, sized to the longest name
+        with op.batch_alter_table('transactions') as batch_op:
+            batch_op.alter_column(
+                'status',
+                existing_type=sa.String(length=10),
+                type_=sa.String(length=18),
+                existing_nullable=False,
+            )
+
+    # A constant default is a metadata-only change on Postgres 11+, no table rewrite
+    op.add_column(
+        'transactions',
+        sa.Column('refunded_amount', sa.Integer(), nullable=False, server_default=sa.text('0')),
+    )
+
+    op.create_table('refund_jobs',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('criteria', sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql'), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'CANCELLED', name='refundjobstatus'), nullable=False),
+    sa.Column('total_items', sa.Integer(), nullable=False),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_refund_jobs_status_lease_expires_at', 'refund_jobs', ['status', 'lease_expires_at'], unique=False)
+    op.create_index(op.f('ix_refund_jobs_user_id'), 'refund_jobs', ['user_id'], unique=False)
+
+    op.create_table('refund_job_items',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('job_id', sa.Uuid(), nullable=False),
+    sa.Column('transaction_id', sa.Uuid(), nullable=False),
+    sa.Column('transaction_created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'SUCCEEDED', 'FAILED', 'SKIPPED', name='refunditemstatus'), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('refund_type', sa.String(length=20), nullable=True),
+    sa.Column('authorization_code', sa.String(length=6), nullable=True),
+    sa.Column('response_code', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['refund_jobs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_refund_job_items_job_id_status', 'refund_job_items', ['job_id', 'status'], unique=False)
+    op.create_index('ix_refund_job_items_transaction_id_status', 'refund_job_items', ['transaction_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refund_job_items_transaction_id_status', table_name='refund_job_items')
+    op.drop_index('ix_refund_job_items_job_id_status', table_name='refund_job_items')
+    op.drop_table('refund_job_items')
+    op.drop_index(op.f('ix_refund_jobs_user_id'), table_name='refund_jobs')
+    op.drop_index('ix_refund_jobs_status_lease_expires_at', table_name='refund_jobs')
+    op.drop_table('refund_jobs')
+    if is_postgres():
+        op.execute("DROP TYPE refunditemstatus")
+        op.execute("DROP TYPE refundjobstatus")
+    op.drop_column('transactions', 'refunded_amount')
+    # Postgres can't drop enum values; refunded transactions stay marked as such
@@ -20,7 +20,7 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     # Agregar columnas con valores por defecto para datos existentes
-    op.add_column('payment_links', sa.Column('single_use', sa.Boolean(), nullable=False, server_default='true'))
+    op.add_column('payment_links', sa.Column('single_use', sa.Boolean(), nullable=False, server_default=sa.true()))
     op.add_column('payment_links', sa.Column('times_paid', sa.Integer(), nullable=False, server_default='0'))
 
     # Actualizar times_paid=1 para links ya pagados
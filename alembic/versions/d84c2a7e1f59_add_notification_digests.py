@@ -0,0 +1,58 @@
+"""add notification digests
+
+Revision ID: d84c2a7e1f59
+Revises: b3e61d0f8a27
+Create Date: 2026-10-19 06:48:12.907361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd84c2a7e1f59'
+down_revision: Union[str, None] = 'b3e61d0f8a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+notification_mode = sa.Enum('IMMEDIATE', 'DIGEST', 'DAILY', name='notificationmode')
+
+
+def upgrade() -> None:
+    notification_mode.create(op.get_bind(), checkfirst=True)
+    # Constant defaults: metadata-only on Postgres 11+, no table rewrite
+    op.add_column(
+        'users',
+        sa.Column('notification_mode', notification_mode, nullable=False, server_default='IMMEDIATE'),
+    )
+    op.add_column(
+        'users',
+        sa.Column('notification_digest_minutes', sa.Integer(), nullable=False, server_default=sa.text('60')),
+    )
+
+    op.create_table('pending_notifications',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('payment_link_id', sa.Uuid(), nullable=False),
+    sa.Column('description', sa.String(length=500), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('authorization_code', sa.String(length=6), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['payment_link_id'], ['payment_links.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pending_notifications_user_id_created_at', 'pending_notifications', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pending_notifications_user_id_created_at', table_name='pending_notifications')
+    op.drop_table('pending_notifications')
+    op.drop_column('users', 'notification_digest_minutes')
+    op.drop_column('users', 'notification_mode')
+    if is_postgres():
+        notification_mode.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,36 @@
+"""add active expiry partial index
+
+Revision ID: e7a3f09c52d8
+Revises: 9d41c6e2b7f3
+Create Date: 2026-10-19 03:48:27.915462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3f09c52d8'
+down_revision: Union[str, None] = '9d41c6e2b7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_WITH_EXPIRY = "status = 'ACTIVE' AND expires_at IS NOT NULL"
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        'ix_payment_links_user_id_expires_at_active',
+        'payment_links',
+        ['user_id', 'expires_at'],
+        postgresql_where=sa.text(ACTIVE_WITH_EXPIRY),
+        sqlite_where=sa.text(ACTIVE_WITH_EXPIRY),
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_payment_links_user_id_expires_at_active', 'payment_links')
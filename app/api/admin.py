@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+from app.api.deps import AdminUser
+from app.config import get_settings
+from app.database import slow_query_log
+from app.schemas.profile import ProfileSummary, ProfileToken
+from app.schemas.slow_query import SlowQueryRead
+from app.services.profiling import (
+    PROFILE_HEADER,
+    create_profile_token,
+    profiler,
+    to_collapsed,
+    to_speedscope,
+)
+
+settings = get_settings()
+router = APIRouter()
+
+
+class ProfileFormat(str, Enum):
+    SPEEDSCOPE = "speedscope"
+    COLLAPSED = "collapsed"
+
+
+@router.post("/profiles/token", response_model=ProfileToken)
+async def create_token(admin: AdminUser):
+    """Signed value for the X-Profile header; requests sending it get profiled."""
+    return ProfileToken(
+        header=PROFILE_HEADER,
+        token=create_profile_token(str(admin.id)),
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.profiling_token_max_age_seconds),
+    )
+
+
+@router.get("/profiles", response_model=list[ProfileSummary])
+async def list_profiles(admin: AdminUser):
+    """Latest request profiles, newest first."""
+    return [profile.summary() for profile in profiler.list()]
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: int,
+    admin: AdminUser,
+    format: ProfileFormat = ProfileFormat.SPEEDSCOPE,
+):
+    """Download a profile for speedscope.app or flamegraph.pl/inferno."""
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado",
+        )
+
+    if format == ProfileFormat.COLLAPSED:
+        return PlainTextResponse(
+            to_collapsed(profile),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+        )
+    return ORJSONResponse(
+        to_speedscope(profile),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'},
+    )
+
+
+@router.get("/slow-queries", response_model=list[SlowQueryRead])
+async def list_slow_queries(admin: AdminUser, limit: int = Query(default=20, ge=1, le=200)):
+    """Slowest statement fingerprints seen by this worker, slowest first."""
+    return slow_query_log.top(limit)
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries(admin: AdminUser):
+    slow_query_log.clear()
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import desc
+
+from app.api.deps import DbSession, SessionUser
+from app.models.api_token import ApiToken
+from app.schemas.api_token import ApiTokenCreate, ApiTokenCreated, ApiTokenRead
+from app.services.api_tokens import generate_token, hash_token
+from app.services.cache import invalidate
+
+router = APIRouter()
+
+MAX_ACTIVE_TOKENS = 50
+
+
+@router.post("/", response_model=ApiTokenCreated, status_code=status.HTTP_201_CREATED)
+async def create_token(
+    token_data: ApiTokenCreate,
+    current_user: SessionUser,
+    db: DbSession,
+):
+    active = (
+        db.query(ApiToken)
+        .filter(ApiToken.user_id == current_user.id, ApiToken.revoked_at.is_(None))
+        .count()
+    )
+    if active >= MAX_ACTIVE_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_ACTIVE_TOKENS} tokens activos",
+        )
+
+    token, prefix = generate_token()
+    api_token = ApiToken(
+        user_id=current_user.id,
+        name=token_data.name,
+        prefix=prefix,
+        token_hash=hash_token(token),
+        scopes=sorted({scope.value for scope in token_data.scopes}),
+        expires_at=token_data.expires_at,
+    )
+    db.add(api_token)
+    db.commit()
+    db.refresh(api_token)
+    return ApiTokenCreated(**ApiTokenRead.model_validate(api_token).model_dump(), token=token)
+
+
+@router.get("/", response_model=list[ApiTokenRead])
+async def list_tokens(current_user: SessionUser, db: DbSession):
+    return (
+        db.query(ApiToken)
+        .filter(ApiToken.user_id == current_user.id)
+        .order_by(desc(ApiToken.created_at))
+        .all()
+    )
+
+
+@router.delete("/{token_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_token(
+    token_id: UUID,
+    current_user: SessionUser,
+    db: DbSession,
+):
+    api_token = (
+        db.query(ApiToken)
+        .filter(ApiToken.id == token_id, ApiToken.user_id == current_user.id)
+        .first()
+    )
+    if not api_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Token no encontrado",
+        )
+
+    if api_token.revoked_at is None:
+        api_token.revoked_at = datetime.now(timezone.utc)
+        # Other workers drop their cached grant on commit
+        invalidate(db, "api_token", api_token.prefix)
+        db.commit()
@@ -6,8 +6,9 @@ from sqlalchemy.orm import Session
 from app.config import get_settings
 from app.database import get_db
 from app.models.user import User
-from app.schemas.user import UserRead
-from app.api.deps import CurrentUser
+from app.schemas.user import UserRead, UserUpdate
+from app.api.deps import CurrentUser, DbSession, SessionUser
+from app.services.cache import invalidate
 
 settings = get_settings()
 router = APIRouter()
@@ -59,6 +60,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
     else:
         user.name = name
         user.picture_url = picture
+        invalidate(db, "user", user.id)
         db.commit()
         db.refresh(user)
 
@@ -76,3 +78,14 @@ async def logout(request: Request):
 @router.get("/me", response_model=UserRead)
 async def get_me(current_user: CurrentUser):
     return current_user
+
+
+@router.patch("/me", response_model=UserRead)
+async def update_me(user_data: UserUpdate, current_user: SessionUser, db: DbSession):
+    """Update the notification settings."""
+    for field, value in user_data.model_dump(exclude_unset=True, exclude_none=True).items():
+        setattr(current_user, field, value)
+    invalidate(db, "user", current_user.id)
+    db.commit()
+    db.refresh(current_user)
+    return current_user
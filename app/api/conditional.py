@@ -0,0 +1,66 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag from the given version parts."""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def cache_headers(etag: str, last_modified: datetime | None) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current version."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: ignore the W/ prefix on both sides
+        current = etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+    return False
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def immutable_response(
+    request: Request,
+    content: bytes,
+    media_type: str,
+    etag: str,
+    public: bool = True,
+) -> Response:
+    """Response for content that never changes under this URL: cached for a year
+    and revalidated (If-None-Match) without sending the body."""
+    scope = "public" if public else "private"
+    headers = {"ETag": etag, "Cache-Control": f"{scope}, max-age=31536000, immutable"}
+    if is_not_modified(request, etag, None):
+        return not_modified(headers)
+    return Response(content, media_type=media_type, headers=headers)
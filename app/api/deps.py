@@ -2,21 +2,73 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 
-from app.database import get_db
+from app.config import get_settings
+from app.database import SessionLocal, get_db
+from app.models.api_token import ApiTokenScope
 from app.models.user import User
+from app.services.api_tokens import verify_token
+from app.services.cache import TTLCache, register_cache
+
+settings = get_settings()
+
+# Detached User snapshots keyed by str(user.id)
+user_cache = TTLCache(
+    maxsize=10_000,
+    ttl=settings.cache_ttl_seconds,
+    fallback_ttl=settings.cache_fallback_ttl_seconds,
+)
+register_cache("user", user_cache)
+
+
+def _user_snapshot(user: User) -> User:
+    snapshot = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def load_user(db: Session, user_id: str) -> User | None:
+    """Get a user through the cache; cached users are merged without SQL."""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return db.merge(cached, load=False)
+
+    user = db.query(User).filter(User.id == UUID(user_id)).first()
+    if user:
+        user_cache.set(user_id, _user_snapshot(user))
+    return user
+
+
+def _token_user_id(request: Request, db: Session, authorization: str) -> str:
+    """User id of a Bearer API token; its scopes go to request.state.token_scopes."""
+    scheme, _, token = authorization.partition(" ")
+    grant = verify_token(db, token.strip()) if scheme.lower() == "bearer" else None
+    if grant is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    request.state.token_scopes = grant.scopes
+    return grant.user_id
 
 
 def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
-    user_id = request.session.get("user_id")
+    """User of the session cookie, or of the API token in the Authorization header."""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        user_id = _token_user_id(request, db, authorization)
+    else:
+        user_id = request.session.get("user_id")
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="No autenticado",
         )
 
-    user = db.query(User).filter(User.id == UUID(user_id)).first()
+    user = load_user(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,5 +84,57 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     return user
 
 
+def _check_scope(request: Request, scope: ApiTokenScope) -> None:
+    # Sessions carry no token scopes and may do anything their user can
+    scopes = getattr(request.state, "token_scopes", None)
+    if scopes is not None and scope.value not in scopes:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"El token no tiene el permiso {scope.value}",
+        )
+
+
+def require_scope(scope: ApiTokenScope):
+    """Dependency rejecting API tokens without `scope`."""
+
+    def check_scope(request: Request, user: User = Depends(get_current_user)) -> None:
+        _check_scope(request, scope)
+
+    return check_scope
+
+
+def get_session_user(request: Request, user: User = Depends(get_current_user)) -> User:
+    """Like get_current_user, for actions API tokens can't perform (managing tokens, admin)."""
+    if getattr(request.state, "token_scopes", None) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Requiere iniciar sesión",
+        )
+    return user
+
+
+def get_admin_user(user: User = Depends(get_session_user)) -> User:
+    if user.email not in settings.admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido a administradores",
+        )
+    return user
+
+
+def get_stream_user_id(request: Request) -> str:
+    """Authenticate like get_current_user, releasing the DB session before returning.
+
+    For long-lived responses (SSE) that must not pin a pooled connection.
+    """
+    with SessionLocal() as db:
+        user_id = str(get_current_user(request, db).id)
+    _check_scope(request, ApiTokenScope.LINKS_READ)
+    return user_id
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+SessionUser = Annotated[User, Depends(get_session_user)]
+AdminUser = Annotated[User, Depends(get_admin_user)]
 DbSession = Annotated[Session, Depends(get_db)]
+StreamUserId = Annotated[str, Depends(get_stream_user_id)]
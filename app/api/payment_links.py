@@ -1,16 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import desc, func, update
+from sqlalchemy.orm import Query as OrmQuery, Session
 
-from app.api.deps import CurrentUser, DbSession
+from app.api.conditional import cache_headers, immutable_response, is_not_modified, make_etag, not_modified
+from app.api.deps import CurrentUser, DbSession, StreamUserId, require_scope
+from app.models.api_token import ApiTokenScope
 from app.models.payment_link import PaymentLink, PaymentLinkStatus
 from app.models.user import User
-from app.schemas.payment_link import PaymentLinkCreate, PaymentLinkRead, PaymentLinkUpdate
+from app.models.visitor_sketch import LinkVisitorSketch
+from app.schemas.payment_link import (
+    BulkOutcome,
+    DailyVisitors,
+    PaymentLinkBulkResponse,
+    PaymentLinkBulkResult,
+    PaymentLinkBulkUpdate,
+    PaymentLinkCreate,
+    PaymentLinkFilter,
+    PaymentLinkListParams,
+    PaymentLinkQRBatch,
+    PaymentLinkRead,
+    PaymentLinkStats,
+    PaymentLinkUpdate,
+)
+from app.services.hll import HyperLogLog
+from app.services.link_events import link_event_broker, publish_link_event
+from app.services.qr import DEFAULT_SCALE, MAX_SCALE, MIN_SCALE, QRFormat, qr_cache
 
 router = APIRouter()
 
+# API tokens need the matching scope; browser sessions pass both
+READ = [Depends(require_scope(ApiTokenScope.LINKS_READ))]
+WRITE = [Depends(require_scope(ApiTokenScope.LINKS_WRITE))]
+
+SSE_HEARTBEAT_SECONDS = 15
+
+# Columns needed to build PaymentLinkRead; list queries select only these
+# instead of full rows (skips the JSONB extra_data and ORM identity overhead).
+LINK_READ_COLUMNS = tuple(getattr(PaymentLink, name) for name in PaymentLinkRead.model_fields)
+
 
 def get_user_link(db: Session, link_id: UUID, user: User) -> PaymentLink:
     """Get a payment link owned by the user, or raise 404."""
@@ -26,7 +60,41 @@ def get_user_link(db: Session, link_id: UUID, user: User) -> PaymentLink:
     return link
 
 
-@router.post("/", response_model=PaymentLinkRead, status_code=status.HTTP_201_CREATED)
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_links(query: OrmQuery, filters: PaymentLinkFilter) -> OrmQuery:
+    """Apply the optional list filters to a PaymentLink query."""
+    if filters.status is not None:
+        query = query.filter(PaymentLink.status == filters.status)
+    if filters.min_amount is not None:
+        query = query.filter(PaymentLink.amount >= filters.min_amount)
+    if filters.max_amount is not None:
+        query = query.filter(PaymentLink.amount <= filters.max_amount)
+    if filters.created_from is not None:
+        query = query.filter(PaymentLink.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.filter(PaymentLink.created_at <= filters.created_to)
+    if filters.expires_from is not None:
+        query = query.filter(PaymentLink.expires_at >= filters.expires_from)
+    if filters.expires_to is not None:
+        query = query.filter(PaymentLink.expires_at <= filters.expires_to)
+    if filters.single_use is not None:
+        query = query.filter(PaymentLink.single_use == filters.single_use)
+    if filters.payable is not None:
+        query = query.filter(PaymentLink.is_payable if filters.payable else ~PaymentLink.is_payable)
+    if filters.expired is not None:
+        query = query.filter(PaymentLink.is_expired if filters.expired else ~PaymentLink.is_expired)
+    if filters.q:
+        # Served by the pg_trgm GIN index on description
+        query = query.filter(
+            PaymentLink.description.ilike(f"%{_escape_like(filters.q)}%", escape="\\")
+        )
+    return query
+
+
+@router.post("/", response_model=PaymentLinkRead, status_code=status.HTTP_201_CREATED, dependencies=WRITE)
 async def create_link(
     link_data: PaymentLinkCreate,
     current_user: CurrentUser,
@@ -46,34 +114,248 @@ async def create_link(
     return link
 
 
-@router.get("/", response_model=list[PaymentLinkRead])
+@router.get("/", response_model=list[PaymentLinkRead], dependencies=READ)
 async def list_links(
+    request: Request,
+    response: Response,
     current_user: CurrentUser,
     db: DbSession,
-    skip: int = 0,
-    limit: int = 50,
+    params: Annotated[PaymentLinkListParams, Query()],
 ):
+    query = filter_links(
+        db.query(PaymentLink).filter(PaymentLink.user_id == current_user.id), params
+    )
+
+    # Cheap version check before loading any rows
+    count, last_updated = query.with_entities(
+        func.count(PaymentLink.id), func.max(PaymentLink.updated_at)
+    ).one()
+    etag = make_etag(current_user.id, request.url.query, count, last_updated)
+    headers = cache_headers(etag, last_updated)
+    if is_not_modified(request, etag, last_updated):
+        return not_modified(headers)
+    response.headers.update(headers)
+
     links = (
-        db.query(PaymentLink)
-        .filter(PaymentLink.user_id == current_user.id)
+        query.with_entities(*LINK_READ_COLUMNS)
         .order_by(desc(PaymentLink.created_at))
-        .offset(skip)
-        .limit(limit)
+        .offset(params.skip)
+        .limit(params.limit)
         .all()
     )
     return links
 
 
-@router.get("/{link_id}", response_model=PaymentLinkRead)
+# Must be declared before /{link_id}
+@router.get("/events")
+async def link_events(user_id: StreamUserId):
+    """Server-Sent Events stream of status and counter changes of the user's links."""
+
+    async def event_stream():
+        queue = link_event_broker.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: link\ndata: {payload}\n\n"
+        finally:
+            link_event_broker.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Must be declared before /{link_id}
+@router.patch("/bulk", response_model=PaymentLinkBulkResponse, dependencies=WRITE)
+async def bulk_update_links(
+    data: PaymentLinkBulkUpdate,
+    current_user: CurrentUser,
+    db: DbSession,
+):
+    """Change the status of many links with a single UPDATE.
+
+    PAID links are never changed. With `ids` every requested id gets an
+    outcome; with `filter` only the updated links are listed.
+    """
+    conditions = [PaymentLink.user_id == current_user.id]
+    if data.ids is not None:
+        conditions.append(PaymentLink.id.in_(data.ids))
+    else:
+        if data.filter.status is not None:
+            conditions.append(PaymentLink.status == data.filter.status)
+        if data.filter.created_before is not None:
+            conditions.append(PaymentLink.created_at < data.filter.created_before)
+        if data.filter.expires_before is not None:
+            conditions.append(PaymentLink.expires_at < data.filter.expires_before)
+
+    updated_links = db.execute(
+        update(PaymentLink)
+        .where(*conditions, PaymentLink.status.not_in((PaymentLinkStatus.PAID, data.status)))
+        .values(status=data.status)
+        .returning(PaymentLink)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    updated_ids = [link.id for link in updated_links]
+    # Delivered to the dashboards when the update commits
+    for link in updated_links:
+        publish_link_event(db, link)
+
+    if data.ids is None:
+        results = [PaymentLinkBulkResult(id=link_id, outcome=BulkOutcome.UPDATED) for link_id in updated_ids]
+    else:
+        updated = set(updated_ids)
+        requested = list(dict.fromkeys(data.ids))
+        skipped = [link_id for link_id in requested if link_id not in updated]
+        current = {}
+        if skipped:
+            # Classify the ids the UPDATE didn't touch
+            current = dict(
+                db.query(PaymentLink.id, PaymentLink.status)
+                .filter(PaymentLink.user_id == current_user.id, PaymentLink.id.in_(skipped))
+                .all()
+            )
+        results = []
+        for link_id in requested:
+            if link_id in updated:
+                outcome = BulkOutcome.UPDATED
+            elif link_id not in current:
+                outcome = BulkOutcome.NOT_FOUND
+            elif current[link_id] == PaymentLinkStatus.PAID:
+                outcome = BulkOutcome.PAID
+            else:
+                outcome = BulkOutcome.UNCHANGED
+            results.append(PaymentLinkBulkResult(id=link_id, outcome=outcome))
+
+    db.commit()
+    return PaymentLinkBulkResponse(updated=len(updated_ids), results=results)
+
+
+# Must be declared before /{link_id}
+@router.post("/qr", dependencies=READ)
+async def bulk_link_qr(
+    data: PaymentLinkQRBatch,
+    current_user: CurrentUser,
+    db: DbSession,
+):
+    """ZIP with the QR code of each of the given links (unknown ids are skipped)."""
+    slugs = [
+        slug
+        for (slug,) in db.query(PaymentLink.slug)
+        .filter(PaymentLink.user_id == current_user.id, PaymentLink.id.in_(data.ids))
+        .order_by(PaymentLink.created_at)
+    ]
+    if not slugs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Links no encontrados",
+        )
+
+    archive = await run_in_threadpool(qr_cache.zip, slugs, data.format, data.scale)
+    return Response(
+        archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="qr-{data.format.value}.zip"'},
+    )
+
+
+@router.get("/{link_id}", response_model=PaymentLinkRead, dependencies=READ)
 async def get_link(
     link_id: UUID,
+    request: Request,
+    response: Response,
     current_user: CurrentUser,
     db: DbSession,
 ):
+    updated_at = (
+        db.query(PaymentLink.updated_at)
+        .filter(PaymentLink.id == link_id, PaymentLink.user_id == current_user.id)
+        .scalar()
+    )
+    if updated_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link no encontrado",
+        )
+
+    etag = make_etag(link_id, updated_at)
+    headers = cache_headers(etag, updated_at)
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(headers)
+    response.headers.update(headers)
+
     return get_user_link(db, link_id, current_user)
 
 
-@router.patch("/{link_id}", response_model=PaymentLinkRead)
+@router.get("/{link_id}/stats", response_model=PaymentLinkStats, dependencies=READ)
+async def get_link_stats(
+    link_id: UUID,
+    current_user: CurrentUser,
+    db: DbSession,
+    days: Annotated[int, Query(ge=1, le=365)] = 30,
+):
+    """Visits and unique visitors per day (UTC) over the last `days` days."""
+    totals = (
+        db.query(PaymentLink.views_count, PaymentLink.unique_visitors, PaymentLink.times_paid)
+        .filter(PaymentLink.id == link_id, PaymentLink.user_id == current_user.id)
+        .first()
+    )
+    if totals is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link no encontrado",
+        )
+
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    sketches = (
+        db.query(LinkVisitorSketch.day, LinkVisitorSketch.registers)
+        .filter(LinkVisitorSketch.payment_link_id == link_id, LinkVisitorSketch.day >= since)
+        .order_by(LinkVisitorSketch.day)
+        .all()
+    )
+    return PaymentLinkStats(
+        views_count=totals.views_count,
+        unique_visitors=totals.unique_visitors,
+        times_paid=totals.times_paid,
+        daily=[
+            DailyVisitors(day=day, unique_visitors=HyperLogLog.from_bytes(registers).count())
+            for day, registers in sketches
+        ],
+    )
+
+
+@router.get("/{link_id}/qr", dependencies=READ)
+async def get_link_qr(
+    link_id: UUID,
+    request: Request,
+    current_user: CurrentUser,
+    db: DbSession,
+    format: QRFormat = QRFormat.SVG,
+    scale: Annotated[int, Query(ge=MIN_SCALE, le=MAX_SCALE)] = DEFAULT_SCALE,
+):
+    """QR code of the link's payment page URL."""
+    slug = (
+        db.query(PaymentLink.slug)
+        .filter(PaymentLink.id == link_id, PaymentLink.user_id == current_user.id)
+        .scalar()
+    )
+    if slug is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link no encontrado",
+        )
+
+    image = await run_in_threadpool(qr_cache.render, slug, format, scale)
+    return immutable_response(request, image.content, image.media_type, image.etag, public=False)
+
+
+@router.patch("/{link_id}", response_model=PaymentLinkRead, dependencies=WRITE)
 async def update_link(
     link_id: UUID,
     link_data: PaymentLinkUpdate,
@@ -85,12 +367,13 @@ async def update_link(
     for field, value in update_data.items():
         setattr(link, field, value)
 
+    publish_link_event(db, link)
     db.commit()
     db.refresh(link)
     return link
 
 
-@router.delete("/{link_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{link_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=WRITE)
 async def delete_link(
     link_id: UUID,
     current_user: CurrentUser,
@@ -104,4 +387,5 @@ async def delete_link(
         )
 
     link.status = PaymentLinkStatus.CANCELLED
+    publish_link_event(db, link)
     db.commit()
@@ -2,23 +2,58 @@ import logging
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from typing import Annotated
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.orm import Session, load_only
 
+from app.api.conditional import immutable_response
 from app.config import get_settings
 from app.database import get_db
 from app.models.payment_link import PaymentLink, PaymentLinkStatus
-from app.models.transaction import Transaction, TransactionStatus
+from app.models.transaction import Transaction, TransactionBuyOrder, TransactionStatus
+from app.services.checkout import (
+    CheckoutTransaction,
+    Payment,
+    reconcile_transaction,
+    release_link,
+    reserve_link,
+    settle_transaction,
+    transition_transaction,
+)
 from app.services.email import send_payment_notification
-from app.services.webpay import webpay_service
+from app.services.link_events import publish_link_event
+from app.services.qr import DEFAULT_SCALE, MAX_SCALE, MIN_SCALE, QRFormat, qr_cache
+from app.services.visitors import visitor_counter, visitor_key
+from app.services.webpay import WebpayTimeoutError, WebpayUnavailableError, webpay_service
+from app.templating import templates
 from app.utils import format_clp
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+
+VISITOR_COOKIE = "lp_vid"
+VISITOR_COOKIE_MAX_AGE = 86400 * 365
+
+PAYMENT_IN_PROGRESS_MESSAGE = "Hay un pago en curso para este link. Si no se completa, podrá intentarlo nuevamente en unos minutos."
+UNAVAILABLE_MESSAGE = "El servicio de pagos no está disponible en este momento. Por favor intente nuevamente en unos minutos."
+
+# Columns used by the public payment page and init_payment (is_payable reads
+# status and expires_at; link events read the counters)
+PUBLIC_LINK_COLUMNS = (
+    PaymentLink.user_id,
+    PaymentLink.slug,
+    PaymentLink.amount,
+    PaymentLink.description,
+    PaymentLink.status,
+    PaymentLink.expires_at,
+    PaymentLink.single_use,
+    PaymentLink.times_paid,
+    PaymentLink.views_count,
+)
 
 
 def generate_buy_order() -> str:
@@ -28,25 +63,111 @@ def generate_buy_order() -> str:
 
 
 def get_link_by_slug(db: Session, slug: str) -> PaymentLink | None:
-    return db.query(PaymentLink).filter(PaymentLink.slug == slug).first()
+    return (
+        db.query(PaymentLink)
+        .options(load_only(*PUBLIC_LINK_COLUMNS))
+        .filter(PaymentLink.slug == slug)
+        .first()
+    )
 
 
-def get_transaction_by_buy_order(db: Session, buy_order: str) -> Transaction | None:
-    return db.query(Transaction).filter(Transaction.buy_order == buy_order).first()
+def get_payable_link_by_slug(db: Session, slug: str) -> PaymentLink | None:
+    """Like get_link_by_slug, but only if the link can be paid (checked in SQL)."""
+    return (
+        db.query(PaymentLink)
+        .options(load_only(*PUBLIC_LINK_COLUMNS))
+        .filter(PaymentLink.slug == slug, PaymentLink.is_payable)
+        .first()
+    )
 
 
 def mark_transaction_failed(db: Session, buy_order: str | None) -> None:
     if not buy_order:
         return
-    transaction = get_transaction_by_buy_order(db, buy_order)
-    if transaction:
-        transaction.status = TransactionStatus.FAILED
-        db.commit()
+    link_id = db.execute(
+        update(Transaction)
+        .where(
+            Transaction.buy_order == buy_order,
+            Transaction.status == TransactionStatus.PENDING,
+        )
+        .values(status=TransactionStatus.FAILED)
+        .returning(Transaction.payment_link_id)
+    ).scalar()
+    if link_id is not None:
+        release_link(db, link_id, buy_order)
+    db.commit()
+
+
+def render_processed_transaction(request: Request, transaction: Transaction):
+    """Response for a transaction that already left PENDING."""
+    if transaction.status == TransactionStatus.AUTHORIZED:
+        return templates.TemplateResponse(
+            "payment_success.html",
+            {
+                "request": request,
+                "amount": format_clp(transaction.amount),
+                "authorization_code": transaction.authorization_code,
+                "card_last_four": transaction.card_last_four,
+                "description": transaction.payment_link.description,
+            },
+        )
+    if transaction.status in (TransactionStatus.PARTIALLY_REFUNDED, TransactionStatus.REFUNDED):
+        return templates.TemplateResponse(
+            "payment_error.html",
+            {"request": request, "error": "Este pago fue reembolsado"},
+        )
+    if transaction.status == TransactionStatus.PROCESSING:
+        return templates.TemplateResponse(
+            "payment_error.html",
+            {"request": request, "error": "Tu pago se está procesando. Revisa nuevamente en unos minutos."},
+        )
+    return templates.TemplateResponse(
+        "payment_error.html",
+        {"request": request, "error": "Esta transacción ya fue procesada"},
+    )
+
+
+def render_settled_transaction(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    transaction: Transaction,
+    approved: bool | None,
+    payment: Payment | None,
+):
+    """Response after settling a commit (see settle_transaction / reconcile_transaction)."""
+    if payment is not None:
+        if not payment.queued:
+            background_tasks.add_task(
+                send_payment_notification,
+                payment.recipient_email,
+                payment.description,
+                payment.amount,
+                payment.authorization_code,
+            )
+        return templates.TemplateResponse(
+            "payment_success.html",
+            {
+                "request": request,
+                "amount": format_clp(payment.amount),
+                "authorization_code": payment.authorization_code,
+                "card_last_four": payment.card_last_four,
+                "description": payment.description,
+            },
+        )
+    if approved is False:
+        return templates.TemplateResponse(
+            "payment_error.html",
+            {"request": request, "error": "Pago rechazado por el banco"},
+        )
+    # Still unknown, or settled by another request
+    db.refresh(transaction)
+    return render_processed_transaction(request, transaction)
 
 
 # IMPORTANTE: /return debe estar ANTES de /{slug} para que no sea capturado como slug
 @router.get("/return", response_class=HTMLResponse)
-async def payment_return(
+def payment_return(
     request: Request,
     background_tasks: BackgroundTasks,
     token_ws: str | None = None,
@@ -65,83 +186,51 @@ async def payment_return(
                 {"request": request, "error": "Transacción no encontrada"},
             )
 
-        # Idempotency check: prevent double-processing
-        if transaction.status != TransactionStatus.PENDING:
-            if transaction.status == TransactionStatus.AUTHORIZED:
-                return templates.TemplateResponse(
-                    "payment_success.html",
-                    {
-                        "request": request,
-                        "amount": format_clp(transaction.amount),
-                        "authorization_code": transaction.authorization_code,
-                        "card_last_four": transaction.card_last_four,
-                        "description": transaction.payment_link.description,
-                    },
-                )
-            return templates.TemplateResponse(
-                "payment_error.html",
-                {"request": request, "error": "Esta transacción ya fue procesada"},
-            )
+        checkout = CheckoutTransaction(
+            id=transaction.id,
+            created_at=transaction.created_at,
+            payment_link_id=transaction.payment_link_id,
+            buy_order=transaction.buy_order,
+            token=transaction.token,
+        )
+
+        # Claim it (PENDING -> PROCESSING) so concurrent returns don't commit twice
+        if not transition_transaction(
+            db, checkout.id, checkout.created_at, TransactionStatus.PENDING, TransactionStatus.PROCESSING
+        ):
+            db.rollback()
+            db.refresh(transaction)
+            if transaction.status != TransactionStatus.PROCESSING:
+                return render_processed_transaction(request, transaction)
+            # Being committed, or an earlier commit got no answer: ask Transbank
+            approved, payment = reconcile_transaction(db, checkout)
+            return render_settled_transaction(request, background_tasks, db, transaction, approved, payment)
+        # Commit releases the pooled connection during the Transbank call
+        db.commit()
 
         try:
             commit_response = webpay_service.commit_transaction(token_ws)
-        except Exception as e:
-            logger.error(f"Webpay commit failed for token {token_ws}: {e}")
-            transaction.status = TransactionStatus.FAILED
-            db.commit()
-            return templates.TemplateResponse(
-                "payment_error.html",
-                {"request": request, "error": "Error al confirmar el pago. Por favor intente nuevamente."},
-            )
-
-        transaction.webpay_response = commit_response
-        transaction.response_code = commit_response.get("response_code")
-        transaction.authorization_code = commit_response.get("authorization_code")
-        transaction.payment_type_code = commit_response.get("payment_type_code")
-        transaction.installments_number = commit_response.get("installments_number")
-
-        card_detail = commit_response.get("card_detail", {})
-        if card_detail:
-            transaction.card_last_four = card_detail.get("card_number")
-
-        if webpay_service.is_approved(commit_response):
-            transaction.status = TransactionStatus.AUTHORIZED
-            transaction.authorized_at = datetime.now(timezone.utc)
-
-            link = transaction.payment_link
-            link.times_paid += 1
-
-            # Solo marcar como PAID si es single_use
-            if link.single_use:
-                link.status = PaymentLinkStatus.PAID
-
-            db.commit()
-
-            background_tasks.add_task(
-                send_payment_notification,
-                link.user.email,
-                link.description,
-                link.amount,
-                transaction.authorization_code,
-            )
-
-            return templates.TemplateResponse(
-                "payment_success.html",
-                {
-                    "request": request,
-                    "amount": format_clp(transaction.amount),
-                    "authorization_code": transaction.authorization_code,
-                    "card_last_four": transaction.card_last_four,
-                    "description": link.description,
-                },
+        except WebpayUnavailableError:
+            # Not sent to Transbank: back to PENDING so reloading can confirm it later
+            transition_transaction(
+                db, checkout.id, checkout.created_at, TransactionStatus.PROCESSING, TransactionStatus.PENDING
             )
-        else:
-            transaction.status = TransactionStatus.FAILED
             db.commit()
             return templates.TemplateResponse(
                 "payment_error.html",
-                {"request": request, "error": "Pago rechazado por el banco"},
+                {"request": request, "error": UNAVAILABLE_MESSAGE},
+                status_code=503,
+                headers={"Retry-After": str(int(webpay_service.breaker.open_seconds))},
             )
+        except Exception as e:
+            # Timeout or error without an answer: the card may have been charged anyway
+            logger.error(f"Webpay commit failed for token {token_ws}: {e}")
+            approved, payment = reconcile_transaction(db, checkout)
+        else:
+            approved = webpay_service.is_approved(commit_response)
+            payment = settle_transaction(db, checkout, commit_response, approved)
+
+        return render_settled_transaction(request, background_tasks, db, transaction, approved, payment)
 
     # Case 2: User aborted payment
     if TBK_TOKEN:
@@ -167,7 +256,7 @@ async def payment_return(
 
 
 @router.get("/{slug}", response_class=HTMLResponse)
-async def payment_page(
+def payment_page(
     request: Request,
     slug: str,
     db: Session = Depends(get_db),
@@ -200,41 +289,103 @@ async def payment_page(
         )
 
     link.views_count += 1
-    db.commit()
+    publish_link_event(db, link)
 
-    return templates.TemplateResponse(
+    visitor_id = request.cookies.get(VISITOR_COOKIE)
+    key = visitor_key(visitor_id, request.client.host if request.client else None, request.headers.get("user-agent"))
+    visitor_counter.add(link.id, key)
+
+    # Rendered before the commit, which expires `link` (reading it after would reload it)
+    response = templates.TemplateResponse(
         "payment_page.html",
         {
             "request": request,
             "link": link,
             "formatted_amount": format_clp(link.amount),
+            # init_payment fails fast meanwhile; the page still shows the link
+            "unavailable_message": UNAVAILABLE_MESSAGE if webpay_service.breaker.is_open else None,
         },
     )
+    db.commit()
+
+    if visitor_id != key:
+        response.set_cookie(
+            VISITOR_COOKIE,
+            key,
+            max_age=VISITOR_COOKIE_MAX_AGE,
+            httponly=True,
+            samesite="lax",
+            secure=settings.is_https,
+        )
+    return response
+
+
+@router.get("/{slug}/qr.{qr_format}")
+def payment_link_qr(
+    slug: str,
+    qr_format: QRFormat,
+    request: Request,
+    scale: Annotated[int, Query(ge=MIN_SCALE, le=MAX_SCALE)] = DEFAULT_SCALE,
+    db: Session = Depends(get_db),
+):
+    """QR code of the payment page URL, for printing. Cached hits skip the database."""
+    image = qr_cache.get(slug, qr_format, scale)
+    if image is None:
+        if db.query(PaymentLink.id).filter(PaymentLink.slug == slug).first() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Link de pago no encontrado",
+            )
+        image = qr_cache.render(slug, qr_format, scale)
+    return immutable_response(request, image.content, image.media_type, image.etag)
 
 
 @router.post("/{slug}/init")
-async def init_payment(
+def init_payment(
     slug: str,
     db: Session = Depends(get_db),
 ):
-    link = get_link_by_slug(db, slug)
+    link = get_payable_link_by_slug(db, slug)
 
-    if not link or not link.is_payable:
+    if not link:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Link no disponible para pago",
         )
 
+    # Fail fast without creating a transaction while Transbank is failing
+    if webpay_service.breaker.is_open:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=UNAVAILABLE_MESSAGE,
+            headers={"Retry-After": str(int(webpay_service.breaker.open_seconds))},
+        )
+
     buy_order = generate_buy_order()
+    link_id = link.id
+    if link.single_use and not reserve_link(db, link_id, buy_order):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=PAYMENT_IN_PROGRESS_MESSAGE,
+        )
+
     session_id = f"session_{uuid.uuid4().hex[:16]}"
+    transaction_id = uuid.uuid4()
+    created_at = datetime.now(timezone.utc)
+    amount = link.amount
 
     transaction = Transaction(
-        payment_link_id=link.id,
+        id=transaction_id,
+        created_at=created_at,
+        payment_link_id=link_id,
         buy_order=buy_order,
         session_id=session_id,
-        amount=link.amount,
+        amount=amount,
     )
     db.add(transaction)
+    db.add(TransactionBuyOrder(buy_order=buy_order, created_at=created_at))
+    # Commit releases the pooled connection during the Transbank call
     db.commit()
 
     return_url = f"{settings.app_url}/pay/return"
@@ -243,19 +394,45 @@ async def init_payment(
         result = webpay_service.create_transaction(
             buy_order=buy_order,
             session_id=session_id,
-            amount=link.amount,
+            amount=amount,
             return_url=return_url,
         )
+    except WebpayUnavailableError:
+        transition_transaction(
+            db, transaction_id, created_at, TransactionStatus.PENDING, TransactionStatus.FAILED
+        )
+        release_link(db, link_id, buy_order)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=UNAVAILABLE_MESSAGE,
+            headers={"Retry-After": str(int(webpay_service.breaker.open_seconds))},
+        )
+    except WebpayTimeoutError:
+        # Transbank may still create it. Without its token it can't be queried,
+        # so it stays PENDING and the reservation lapses on its own.
+        logger.error(f"Webpay create transaction timed out for order {buy_order}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Error al iniciar la transacción. Por favor intente nuevamente en unos minutos.",
+        )
     except Exception as e:
         logger.error(f"Webpay create transaction failed for order {buy_order}: {e}")
-        transaction.status = TransactionStatus.FAILED
+        transition_transaction(
+            db, transaction_id, created_at, TransactionStatus.PENDING, TransactionStatus.FAILED
+        )
+        release_link(db, link_id, buy_order)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al iniciar la transacción. Por favor intente nuevamente.",
         )
 
-    transaction.token = result["token"]
+    db.execute(
+        update(Transaction)
+        .where(Transaction.id == transaction_id, Transaction.created_at == created_at)
+        .values(token=result["token"])
+    )
     db.commit()
 
     redirect_url = f"{result['url']}?token_ws={result['token']}"
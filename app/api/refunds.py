@@ -0,0 +1,164 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import desc, select, update
+from sqlalchemy.orm import Session
+
+from app.api.deps import DbSession, SessionUser
+from app.api.payment_links import filter_links
+from app.models.payment_link import PaymentLink
+from app.models.refund import RefundItemStatus, RefundJob, RefundJobItem, RefundJobStatus
+from app.models.user import User
+from app.schemas.refund import RefundJobCreate, RefundJobItemRead, RefundJobRead
+from app.services.refunds import ACTIVE_JOB_STATUSES, create_refund_job, item_counts, refund_runner
+
+router = APIRouter()
+
+
+def get_user_job(db: Session, job_id: UUID, user: User) -> RefundJob:
+    """Get a refund job owned by the user, or raise 404."""
+    job = (
+        db.query(RefundJob)
+        .filter(RefundJob.id == job_id, RefundJob.user_id == user.id)
+        .first()
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reembolso no encontrado",
+        )
+    return job
+
+
+def job_reads(db: Session, jobs: list[RefundJob]) -> list[RefundJobRead]:
+    counts = item_counts(db, [job.id for job in jobs])
+    return [
+        RefundJobRead(
+            id=job.id,
+            status=job.status,
+            criteria=job.criteria,
+            total_items=job.total_items,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            **counts[job.id],
+        )
+        for job in jobs
+    ]
+
+
+@router.post("/", response_model=RefundJobRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_data: RefundJobCreate,
+    current_user: SessionUser,
+    db: DbSession,
+):
+    """Start refunding the authorized payments of the selected links in the background."""
+    link_ids = select(PaymentLink.id).where(PaymentLink.user_id == current_user.id)
+    if job_data.link_ids is not None:
+        link_ids = link_ids.where(PaymentLink.id.in_(job_data.link_ids))
+    else:
+        link_ids = filter_links(link_ids, job_data.filter)
+
+    job = create_refund_job(db, current_user.id, link_ids, job_data.model_dump(mode="json", exclude_none=True))
+    if job.total_items == 0:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No hay pagos por reembolsar en esos links",
+        )
+    db.commit()
+    refund_runner.submit(job.id)
+    return job_reads(db, [job])[0]
+
+
+@router.get("/", response_model=list[RefundJobRead])
+async def list_jobs(
+    current_user: SessionUser,
+    db: DbSession,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    jobs = (
+        db.query(RefundJob)
+        .filter(RefundJob.user_id == current_user.id)
+        .order_by(desc(RefundJob.created_at))
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return job_reads(db, jobs)
+
+
+@router.get("/{job_id}", response_model=RefundJobRead)
+async def get_job(job_id: UUID, current_user: SessionUser, db: DbSession):
+    return job_reads(db, [get_user_job(db, job_id, current_user)])[0]
+
+
+@router.get("/{job_id}/items", response_model=list[RefundJobItemRead])
+async def list_job_items(
+    job_id: UUID,
+    current_user: SessionUser,
+    db: DbSession,
+    item_status: RefundItemStatus | None = Query(None, alias="status"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    get_user_job(db, job_id, current_user)
+    query = db.query(RefundJobItem).filter(RefundJobItem.job_id == job_id)
+    if item_status is not None:
+        query = query.filter(RefundJobItem.status == item_status)
+    return (
+        query.order_by(RefundJobItem.transaction_created_at, RefundJobItem.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+
+@router.post("/{job_id}/cancel", response_model=RefundJobRead)
+async def cancel_job(job_id: UUID, current_user: SessionUser, db: DbSession):
+    """Stop a job after the refunds in flight; pending items stay pending."""
+    job = get_user_job(db, job_id, current_user)
+    db.execute(
+        update(RefundJob)
+        .where(RefundJob.id == job.id, RefundJob.status.in_(ACTIVE_JOB_STATUSES))
+        .values(status=RefundJobStatus.CANCELLED, finished_at=datetime.now(timezone.utc), lease_expires_at=None)
+    )
+    db.commit()
+    db.refresh(job)
+    return job_reads(db, [job])[0]
+
+
+@router.post("/{job_id}/resume", response_model=RefundJobRead)
+async def resume_job(
+    job_id: UUID,
+    current_user: SessionUser,
+    db: DbSession,
+    retry_failed: bool = False,
+):
+    """Continue a cancelled or finished job with its pending items and, with
+    retry_failed, the ones that failed."""
+    job = get_user_job(db, job_id, current_user)
+    if job.status in ACTIVE_JOB_STATUSES and not retry_failed:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El reembolso ya está en curso",
+        )
+    if retry_failed:
+        # attempts=1: the retry asks Transbank for the balance before refunding again
+        db.execute(
+            update(RefundJobItem)
+            .where(RefundJobItem.job_id == job.id, RefundJobItem.status == RefundItemStatus.FAILED)
+            .values(status=RefundItemStatus.PENDING, attempts=1, error=None, processed_at=None)
+        )
+    db.execute(
+        update(RefundJob)
+        .where(RefundJob.id == job.id, RefundJob.status.in_((RefundJobStatus.CANCELLED, RefundJobStatus.COMPLETED)))
+        .values(status=RefundJobStatus.PENDING, finished_at=None)
+    )
+    db.commit()
+    refund_runner.submit(job.id)
+    db.refresh(job)
+    return job_reads(db, [job])[0]
@@ -0,0 +1,78 @@
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import get_db
+from app.models.transaction import Transaction
+from app.services.webpay import webpay_service
+from app.services.webpay_simulator import ABORTED, APPROVED, REJECTED, TIMEOUT
+from app.templating import templates
+from app.utils import format_clp
+
+settings = get_settings()
+router = APIRouter()
+
+# Time the form is shown before the automatic return to the store
+FORM_REDIRECT_SECONDS = 1
+
+OUTCOME_LABELS = {
+    APPROVED: "Pago aprobado",
+    REJECTED: "Pago rechazado",
+    ABORTED: "Pago anulado por el comprador",
+    TIMEOUT: "Tiempo de pago expirado",
+}
+
+
+@router.get("/webpay", response_class=HTMLResponse)
+async def simulated_webpay_form(
+    request: Request,
+    token_ws: str,
+    db: Session = Depends(get_db),
+):
+    """Stand-in for the Webpay payment form: returns to the store with the token's outcome."""
+    transaction = (
+        db.query(Transaction.buy_order, Transaction.session_id, Transaction.amount)
+        .filter(Transaction.token == token_ws)
+        .first()
+    )
+    if not transaction:
+        return templates.TemplateResponse(
+            "payment_error.html",
+            {"request": request, "error": "Token de Webpay inválido"},
+            status_code=404,
+        )
+
+    # Query parameters Webpay sends back for each outcome
+    outcome = webpay_service.tx.outcome(token_ws)
+    if outcome in (APPROVED, REJECTED):
+        params = {"token_ws": token_ws}
+    elif outcome == ABORTED:
+        params = {
+            "TBK_TOKEN": token_ws,
+            "TBK_ORDEN_COMPRA": transaction.buy_order,
+            "TBK_ID_SESION": transaction.session_id,
+        }
+    else:
+        params = {
+            "TBK_ORDEN_COMPRA": transaction.buy_order,
+            "TBK_ID_SESION": transaction.session_id,
+        }
+
+    payment = webpay_service.tx.payment(token_ws)
+    return_url = payment.return_url if payment else f"{settings.app_url}/pay/return"
+    return templates.TemplateResponse(
+        "webpay_simulator.html",
+        {
+            "request": request,
+            "amount": format_clp(transaction.amount),
+            "buy_order": transaction.buy_order,
+            "outcome_label": OUTCOME_LABELS[outcome],
+            "return_url": return_url,
+            "params": params,
+            "redirect_url": f"{return_url}?{urlencode(params)}",
+            "redirect_seconds": FORM_REDIRECT_SECONDS,
+        },
+    )
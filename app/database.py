@@ -1,11 +1,59 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from app.config import get_settings
+from app.services.query_log import SlowQueryLog
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url)
+is_sqlite = settings.database_url.startswith("sqlite")
+
+if is_sqlite:
+    # Sessions are used from FastAPI's threadpool
+    engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run while a write is in progress
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+else:
+    engine = create_engine(settings.database_url)
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.slow_query_threshold_ms,
+    max_fingerprints=settings.slow_query_max_fingerprints,
+    explain=settings.slow_query_explain,
+    explain_interval_seconds=settings.slow_query_explain_interval_seconds,
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if elapsed >= slow_query_log.threshold:
+        slow_query_log.record(conn, statement, parameters, elapsed, executemany)
+
+
+@event.listens_for(engine, "handle_error")
+def _discard_query_timer(exception_context):
+    connection = exception_context.connection
+    timers = connection.info.get("query_start") if connection is not None else None
+    if timers:
+        timers.pop()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
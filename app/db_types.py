@@ -0,0 +1,9 @@
+"""Column types that use the native Postgres types and still work on SQLite."""
+from sqlalchemy import JSON, Uuid
+from sqlalchemy.dialects.postgresql import JSONB
+
+# uuid on Postgres, CHAR(32) elsewhere
+GUID = Uuid(as_uuid=True)
+
+# jsonb on Postgres, JSON text elsewhere
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
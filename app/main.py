@@ -1,17 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.config import get_settings
-from app.api import auth, payment_links, payments
+from app.api import admin, api_tokens, auth, payment_links, payments, refunds, simulator
+from app.middleware import CompressionMiddleware, ProfilingMiddleware, QueryContextMiddleware
+from app.services.profiling import ProfiledJSONResponse
+from app.services.checkout import checkout_reconciler
+from app.services.email import prometheus_metrics as email_metrics
+from app.services.notifications import notification_digester
+from app.services.pubsub import pg_listener
+from app.services.refunds import refund_runner
+from app.services.visitors import visitor_counter
+from app.services.webpay import webpay_service
+from app.static_files import PrecompressedStaticFiles
+from app.templating import templates
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pg_listener.start()
+    visitor_counter.start()
+    refund_runner.start()
+    notification_digester.start()
+    checkout_reconciler.start()
+    yield
+    await checkout_reconciler.stop()
+    await notification_digester.stop()
+    refund_runner.stop()
+    await visitor_counter.stop()
+    pg_listener.stop()
+
+
 app = FastAPI(
     title="Link de Pago",
     description="Sistema de generación de links de pago con Webpay",
     version="1.0.0",
+    default_response_class=ProfiledJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -23,14 +53,31 @@ app.add_middleware(
     https_only=settings.is_https,
 )
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=500,
+    exclude_paths=("/static", "/api/v1/links/events"),
+)
+
+app.add_middleware(QueryContextMiddleware)
+
+# Outermost, so profiles include the other middleware
+app.add_middleware(
+    ProfilingMiddleware,
+    exclude_paths=("/static", "/api/v1/links/events", "/api/v1/admin/profiles"),
+)
 
-templates = Jinja2Templates(directory="app/templates")
+app.mount("/static", PrecompressedStaticFiles(directory="app/static"), name="static")
 
 # Routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(payment_links.router, prefix="/api/v1/links", tags=["links"])
 app.include_router(payments.router, prefix="/api/v1/pay", tags=["payments"])
+app.include_router(refunds.router, prefix="/api/v1/refunds", tags=["refunds"])
+app.include_router(api_tokens.router, prefix="/api/v1/tokens", tags=["tokens"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+if settings.webpay_environment == "simulated":
+    app.include_router(simulator.router, prefix="/api/v1/simulator", tags=["simulator"])
 
 
 @app.get("/")
@@ -44,3 +91,8 @@ async def root(request: Request):
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return webpay_service.prometheus_metrics() + email_metrics()
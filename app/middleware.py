@@ -0,0 +1,75 @@
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.profiling import profiler
+from app.services.query_log import request_scope
+
+
+class CompressionMiddleware:
+    """GZip for dynamic responses.
+
+    Skips static files (precompressed at build time) and Server-Sent Events
+    streams, which GZipMiddleware would buffer.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, exclude_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_paths):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """Profile requests picked by app.services.profiling.profiler.
+
+    Requests that are not picked pass through after a header check.
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.exclude_paths)
+            or not profiler.wants(scope["headers"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        profile, token = profiler.begin(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.end(profile, token, status_code)
+
+
+class QueryContextMiddleware:
+    """Make the current request's route available to the slow-query log."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
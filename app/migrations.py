@@ -0,0 +1,231 @@
+"""Helpers for online (non-blocking) Alembic migrations on Postgres.
+
+Plain DDL inside the migration transaction holds ACCESS EXCLUSIVE locks on
+busy tables (payment_links, transactions) until the migration commits.
+These helpers run the slow parts outside that transaction:
+
+- indexes are built with CREATE INDEX CONCURRENTLY;
+- constraints are added NOT VALID and validated in a separate step, which
+  only takes a SHARE UPDATE EXCLUSIVE lock;
+- backfills update a bounded number of rows per committed statement.
+
+The migration connection also runs with a short lock_timeout (see
+alembic/env.py), so DDL that does need a brief exclusive lock fails fast
+instead of queueing every payment behind it. Just re-run the migration.
+
+On other databases (SQLite) the helpers fall back to the plain operations.
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+DEFAULT_BACKFILL_BATCH_SIZE = 5000
+
+
+def is_postgres() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _index_is_invalid(name: str) -> bool:
+    if op.get_context().as_sql:
+        return False
+    return bool(
+        op.get_bind().execute(
+            sa.text(
+                "SELECT NOT i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace"
+            ),
+            {"name": name},
+        ).scalar()
+    )
+
+
+def _drop_invalid_index(name: str) -> None:
+    # A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS would keep
+    if _index_is_invalid(name):
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    **kw,
+) -> None:
+    """CREATE INDEX CONCURRENTLY, committed outside the migration transaction.
+
+    Extra keyword arguments go to op.create_index (postgresql_where,
+    postgresql_using, postgresql_ops...). Safe to re-run after a failure.
+    Not valid for partitioned tables: use create_partitioned_index.
+    """
+    if not is_postgres():
+        op.create_index(name, table, list(columns), unique=unique, if_not_exists=True, **kw)
+        return
+    with op.get_context().autocommit_block():
+        # Waiting for running transactions is part of a concurrent build
+        op.execute("SET lock_timeout = 0")
+        _drop_invalid_index(name)
+        op.create_index(
+            name,
+            table,
+            list(columns),
+            unique=unique,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            **kw,
+        )
+        op.execute("RESET lock_timeout")
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    if not is_postgres():
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.execute("SET lock_timeout = 0")
+        op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+        op.execute("RESET lock_timeout")
+
+
+def create_partitioned_index(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    using: str | None = None,
+) -> None:
+    """Index a partitioned table without locking its partitions for writes.
+
+    Postgres can't build an index on a partitioned table CONCURRENTLY.
+    Instead an (invalid) index is created ON ONLY the parent, each partition
+    is indexed concurrently and attached, and the parent index becomes valid
+    once every partition is attached. Partitions created later get the
+    index automatically. A unique index must include the partition key.
+    """
+    if not is_postgres():
+        op.create_index(name, table, list(columns), unique=unique, if_not_exists=True)
+        return
+
+    unique_sql = "UNIQUE " if unique else ""
+    using_sql = f"USING {using} " if using else ""
+    columns_sql = ", ".join(columns)
+
+    op.execute(
+        f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON ONLY {table} {using_sql}({columns_sql})"
+    )
+    partitions = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname"
+        ),
+        {"table": table},
+    ).scalars().all()
+
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            partition_index = f"{partition}_{name}"[:63]
+            op.execute("SET lock_timeout = 0")
+            _drop_invalid_index(partition_index)
+            op.execute(
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {partition_index} "
+                f"ON {partition} {using_sql}({columns_sql})"
+            )
+            op.execute("RESET lock_timeout")
+            attached = op.get_bind().execute(
+                sa.text(
+                    "SELECT 1 FROM pg_inherits "
+                    "WHERE inhrelid = CAST(:child AS regclass) AND inhparent = CAST(:parent AS regclass)"
+                ),
+                {"child": partition_index, "parent": name},
+            ).scalar()
+            if not attached:
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+
+
+def add_check_constraint_not_valid(name: str, table: str, condition: str) -> None:
+    """Add a CHECK constraint enforced for new rows only; validate it later."""
+    if not is_postgres():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_check_constraint(name, condition)
+        return
+    op.create_check_constraint(name, table, condition, postgresql_not_valid=True)
+
+
+def add_foreign_key_not_valid(
+    name: str,
+    source_table: str,
+    referent_table: str,
+    local_cols: Sequence[str],
+    remote_cols: Sequence[str],
+    **kw,
+) -> None:
+    """Add a FOREIGN KEY enforced for new rows only; validate it later."""
+    if not is_postgres():
+        with op.batch_alter_table(source_table) as batch_op:
+            batch_op.create_foreign_key(name, referent_table, list(local_cols), list(remote_cols), **kw)
+        return
+    op.create_foreign_key(
+        name,
+        source_table,
+        referent_table,
+        list(local_cols),
+        list(remote_cols),
+        postgresql_not_valid=True,
+        **kw,
+    )
+
+
+def validate_constraint(name: str, table: str) -> None:
+    """Check existing rows against a NOT VALID constraint without blocking writes."""
+    if not is_postgres():
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def set_not_null(table: str, column: str) -> None:
+    """SET NOT NULL without the full-table scan under ACCESS EXCLUSIVE.
+
+    A validated CHECK (column IS NOT NULL) lets Postgres skip the scan.
+    """
+    if not is_postgres():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, nullable=False)
+        return
+    constraint = f"{table}_{column}_not_null"[:63]
+    add_check_constraint_not_valid(constraint, table, f"{column} IS NOT NULL")
+    validate_constraint(constraint, table)
+    op.alter_column(table, column, nullable=False)
+    op.drop_constraint(constraint, table, type_="check")
+
+
+def backfill_in_batches(
+    table: str,
+    set_sql: str,
+    where_sql: str,
+    key: str = "id",
+    batch_size: int = DEFAULT_BACKFILL_BATCH_SIZE,
+) -> int:
+    """UPDATE `table` SET `set_sql` for rows matching `where_sql`, one committed batch at a time.
+
+    `where_sql` must stop matching a row once it is updated (e.g.
+    "new_column IS NULL"), otherwise this never ends. Returns the number
+    of updated rows.
+    """
+    total = 0
+    with op.get_context().autocommit_block():
+        while True:
+            result = op.get_bind().execute(
+                sa.text(
+                    f"UPDATE {table} SET {set_sql} "
+                    f"WHERE {key} IN (SELECT {key} FROM {table} WHERE {where_sql} LIMIT :batch_size)"
+                ),
+                {"batch_size": batch_size},
+            )
+            if result.rowcount == 0:
+                return total
+            total += result.rowcount
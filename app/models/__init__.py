@@ -1,5 +1,20 @@
 from app.models.user import User
 from app.models.payment_link import PaymentLink
-from app.models.transaction import Transaction
+from app.models.transaction import Transaction, TransactionArchive, TransactionBuyOrder
+from app.models.visitor_sketch import LinkVisitorSketch
+from app.models.api_token import ApiToken
+from app.models.refund import RefundJob, RefundJobItem
+from app.models.notification import PendingNotification
 
-__all__ = ["User", "PaymentLink", "Transaction"]
+__all__ = [
+    "User",
+    "PaymentLink",
+    "Transaction",
+    "TransactionArchive",
+    "TransactionBuyOrder",
+    "LinkVisitorSketch",
+    "ApiToken",
+    "RefundJob",
+    "RefundJobItem",
+    "PendingNotification",
+]
@@ -0,0 +1,34 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.db_types import GUID
+
+
+class PendingNotification(Base):
+    """Payment waiting to go out in its merchant's next digest email."""
+
+    __tablename__ = "pending_notifications"
+    __table_args__ = (
+        Index("ix_pending_notifications_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID, primary_key=True, default=uuid.uuid4
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    payment_link_id: Mapped[uuid.UUID] = mapped_column(
+        GUID, ForeignKey("payment_links.id", ondelete="CASCADE"), nullable=False
+    )
+    # Copied at payment time: the email describes the link as it was paid
+    description: Mapped[str] = mapped_column(String(500), nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    authorization_code: Mapped[str | None] = mapped_column(String(6), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
@@ -1,12 +1,13 @@
 import uuid
 import secrets
 from datetime import datetime, timezone
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Enum as SQLEnum, Boolean
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Index, LargeBinary, Enum as SQLEnum, Boolean, and_, or_, text
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
 import enum
 
 from app.database import Base
+from app.db_types import GUID, JSONDocument
 
 
 class PaymentLinkStatus(str, enum.Enum):
@@ -21,12 +22,34 @@ def generate_slug() -> str:
 
 class PaymentLink(Base):
     __tablename__ = "payment_links"
+    __table_args__ = (
+        Index("ix_payment_links_user_id_status_created_at", "user_id", "status", "created_at"),
+        # Unfiltered dashboard list: newest first per user
+        Index("ix_payment_links_user_id_created_at", "user_id", "created_at"),
+        # Expiry sweeps and status/expiry filters (also serves status alone)
+        Index("ix_payment_links_status_expires_at", "status", "expires_at"),
+        # is_payable / is_expired filters per user: only active links with an expiry
+        Index(
+            "ix_payment_links_user_id_expires_at_active",
+            "user_id",
+            "expires_at",
+            postgresql_where=text("status = 'ACTIVE' AND expires_at IS NOT NULL"),
+            sqlite_where=text("status = 'ACTIVE' AND expires_at IS NOT NULL"),
+        ),
+        # Needs pg_trgm: other databases scan for q (and the migration skips it there)
+        Index(
+            "ix_payment_links_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        GUID, primary_key=True, default=uuid.uuid4
     )
     user_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     slug: Mapped[str] = mapped_column(
         String(16), unique=True, nullable=False, index=True, default=generate_slug
@@ -35,13 +58,19 @@ class PaymentLink(Base):
     description: Mapped[str] = mapped_column(String(500), nullable=False)
     currency: Mapped[str] = mapped_column(String(3), default="CLP")
     status: Mapped[PaymentLinkStatus] = mapped_column(
-        SQLEnum(PaymentLinkStatus), default=PaymentLinkStatus.ACTIVE, index=True
+        SQLEnum(PaymentLinkStatus), default=PaymentLinkStatus.ACTIVE
     )
     single_use: Mapped[bool] = mapped_column(Boolean, default=True)
     expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
-    extra_data: Mapped[dict] = mapped_column(JSONB, default=dict)
+    extra_data: Mapped[dict] = mapped_column(JSONDocument, default=dict, deferred=True)
     times_paid: Mapped[int] = mapped_column(Integer, default=0)
+    # Single-use links: held by one checkout (buy order) until it finishes or this time passes
+    reserved_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    reserved_by: Mapped[str | None] = mapped_column(String(26), nullable=True)
     views_count: Mapped[int] = mapped_column(Integer, default=0)
+    # All-time HyperLogLog sketch and its estimate, updated in batches
+    visitors_sketch: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -56,12 +85,29 @@ class PaymentLink(Base):
         "Transaction", back_populates="payment_link", cascade="all, delete-orphan"
     )
 
-    @property
+    @hybrid_property
     def is_expired(self) -> bool:
         if self.expires_at is None:
             return False
-        return datetime.now(timezone.utc) > self.expires_at
+        expires_at = self.expires_at
+        if expires_at.tzinfo is None:
+            # SQLite returns naive datetimes (stored in UTC)
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) > expires_at
+
+    @is_expired.inplace.expression
+    @classmethod
+    def _is_expired_expression(cls):
+        return and_(cls.expires_at.is_not(None), cls.expires_at < datetime.now(timezone.utc))
 
-    @property
+    @hybrid_property
     def is_payable(self) -> bool:
         return self.status == PaymentLinkStatus.ACTIVE and not self.is_expired
+
+    @is_payable.inplace.expression
+    @classmethod
+    def _is_payable_expression(cls):
+        return and_(
+            cls.status == PaymentLinkStatus.ACTIVE,
+            or_(cls.expires_at.is_(None), cls.expires_at >= datetime.now(timezone.utc)),
+        )
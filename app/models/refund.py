@@ -0,0 +1,95 @@
+import enum
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Enum as SQLEnum, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+from app.db_types import GUID, JSONDocument
+
+
+class RefundJobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class RefundItemStatus(str, enum.Enum):
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    # Nothing left to refund when its turn came (refunded elsewhere)
+    SKIPPED = "skipped"
+
+
+class RefundJob(Base):
+    """Bulk refund of the authorized transactions selected when it was created.
+
+    Runs in whichever worker holds the lease (`lease_expires_at`); a job whose
+    worker died is picked up again once the lease expires and continues with
+    its pending items.
+    """
+
+    __tablename__ = "refund_jobs"
+    __table_args__ = (
+        Index("ix_refund_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID, primary_key=True, default=uuid.uuid4
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # How the transactions were selected (link ids or link filter), for reference
+    criteria: Mapped[dict] = mapped_column(JSONDocument, nullable=False, default=dict)
+    status: Mapped[RefundJobStatus] = mapped_column(
+        SQLEnum(RefundJobStatus), nullable=False, default=RefundJobStatus.PENDING
+    )
+    total_items: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    items: Mapped[list["RefundJobItem"]] = relationship(
+        "RefundJobItem", back_populates="job", cascade="all, delete-orphan"
+    )
+
+
+class RefundJobItem(Base):
+    """One transaction of a refund job and the outcome of its refund."""
+
+    __tablename__ = "refund_job_items"
+    __table_args__ = (
+        Index("ix_refund_job_items_job_id_status", "job_id", "status"),
+        Index("ix_refund_job_items_transaction_id_status", "transaction_id", "status"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID, primary_key=True, default=uuid.uuid4
+    )
+    job_id: Mapped[uuid.UUID] = mapped_column(
+        GUID, ForeignKey("refund_jobs.id", ondelete="CASCADE"), nullable=False
+    )
+    # No foreign key: transactions is partitioned and keyed by (id, created_at)
+    transaction_id: Mapped[uuid.UUID] = mapped_column(GUID, nullable=False)
+    transaction_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    status: Mapped[RefundItemStatus] = mapped_column(
+        SQLEnum(RefundItemStatus), nullable=False, default=RefundItemStatus.PENDING
+    )
+    # Amount refunded (or to refund, while pending)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Transbank's answer: REVERSED or NULLIFIED
+    refund_type: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    authorization_code: Mapped[str | None] = mapped_column(String(6), nullable=True)
+    response_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    job: Mapped["RefundJob"] = relationship("RefundJob", back_populates="items")
@@ -1,32 +1,58 @@
 import uuid, enum
 from datetime import datetime, timezone
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import String, Integer, DateTime, ForeignKey, LargeBinary, Enum as SQLEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.database import Base
+from app.db_types import GUID, JSONDocument
 
 
 class TransactionStatus(str, enum.Enum):
     PENDING = "pending"
+    PROCESSING = "processing"
     AUTHORIZED = "authorized"
     FAILED = "failed"
+    PARTIALLY_REFUNDED = "partially_refunded"
+    REFUNDED = "refunded"
+
+
+# Allowed status changes, applied with conditional UPDATEs so that
+# concurrent requests can't move a transaction twice.
+TRANSACTION_TRANSITIONS = {
+    TransactionStatus.PENDING: {TransactionStatus.PROCESSING, TransactionStatus.FAILED},
+    TransactionStatus.PROCESSING: {
+        TransactionStatus.PENDING,
+        TransactionStatus.AUTHORIZED,
+        TransactionStatus.FAILED,
+    },
+    TransactionStatus.AUTHORIZED: {TransactionStatus.PARTIALLY_REFUNDED, TransactionStatus.REFUNDED},
+    TransactionStatus.PARTIALLY_REFUNDED: {TransactionStatus.PARTIALLY_REFUNDED, TransactionStatus.REFUNDED},
+    TransactionStatus.FAILED: set(),
+    TransactionStatus.REFUNDED: set(),
+}
+
+# Statuses with an amount left to refund
+REFUNDABLE_STATUSES = (TransactionStatus.AUTHORIZED, TransactionStatus.PARTIALLY_REFUNDED)
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # Monthly range partitions on created_at (see ensure_transaction_partitions).
+    # Unique keys must include the partition key, so buy_order uniqueness is
+    # enforced by transaction_buy_orders instead.
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        GUID, primary_key=True, default=uuid.uuid4
     )
     payment_link_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True),
+        GUID,
         ForeignKey("payment_links.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
-    buy_order: Mapped[str] = mapped_column(String(26), unique=True, nullable=False, index=True)
+    buy_order: Mapped[str] = mapped_column(String(26), nullable=False, index=True)
     session_id: Mapped[str] = mapped_column(String(61), nullable=False)
-    token: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    token: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
     status: Mapped[TransactionStatus] = mapped_column(
         SQLEnum(TransactionStatus), default=TransactionStatus.PENDING, index=True
     )
@@ -35,11 +61,39 @@ class Transaction(Base):
     payment_type_code: Mapped[str | None] = mapped_column(String(3), nullable=True)
     installments_number: Mapped[int | None] = mapped_column(Integer, nullable=True)
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    refunded_amount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     card_last_four: Mapped[str | None] = mapped_column(String(4), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True
+        DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc), index=True
     )
     authorized_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
-    webpay_response: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    # Moved to transaction_archives once old: read it with get_webpay_response()
+    webpay_response: Mapped[dict | None] = mapped_column(JSONDocument, nullable=True, deferred=True)
 
     payment_link: Mapped["PaymentLink"] = relationship("PaymentLink", back_populates="transactions")
+
+
+class TransactionBuyOrder(Base):
+    """Buy orders of every transaction, unique across all partitions.
+
+    Transbank requires unique buy orders; the partitioned table can only
+    enforce uniqueness per created_at. Inserted with the transaction.
+    """
+
+    __tablename__ = "transaction_buy_orders"
+
+    buy_order: Mapped[str] = mapped_column(String(26), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class TransactionArchive(Base):
+    """Compressed raw Webpay response moved out of the hot transactions table."""
+
+    __tablename__ = "transaction_archives"
+
+    transaction_id: Mapped[uuid.UUID] = mapped_column(GUID, primary_key=True)
+    transaction_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    webpay_response: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
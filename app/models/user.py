@@ -1,23 +1,37 @@
+import enum
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import String, Boolean, DateTime
+from sqlalchemy import String, Boolean, DateTime, Integer, Enum as SQLEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID
 
 from app.database import Base
+from app.db_types import GUID
+
+
+class NotificationMode(str, enum.Enum):
+    # One email per payment
+    IMMEDIATE = "immediate"
+    # One summary every notification_digest_minutes
+    DIGEST = "digest"
+    # One summary a day, at NOTIFICATION_DAILY_HOUR
+    DAILY = "daily"
 
 
 class User(Base):
     __tablename__ = "users"
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        GUID, primary_key=True, default=uuid.uuid4
     )
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     google_id: Mapped[str] = mapped_column(String(255), unique=True, nullable=False, index=True)
     picture_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    notification_mode: Mapped[NotificationMode] = mapped_column(
+        SQLEnum(NotificationMode), nullable=False, default=NotificationMode.IMMEDIATE
+    )
+    notification_digest_minutes: Mapped[int] = mapped_column(Integer, nullable=False, default=60)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
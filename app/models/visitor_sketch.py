@@ -0,0 +1,20 @@
+import uuid
+from datetime import date
+
+from sqlalchemy import Date, ForeignKey, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.db_types import GUID
+
+
+class LinkVisitorSketch(Base):
+    """HyperLogLog sketch of the distinct visitors of a link on one day (UTC)."""
+
+    __tablename__ = "link_visitor_sketches"
+
+    payment_link_id: Mapped[uuid.UUID] = mapped_column(
+        GUID, ForeignKey("payment_links.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    registers: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
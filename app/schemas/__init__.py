@@ -1,13 +1,39 @@
-from app.schemas.user import UserRead
+from app.schemas.user import UserRead, UserUpdate
+from app.schemas.api_token import ApiTokenCreate, ApiTokenCreated, ApiTokenRead
 from app.schemas.payment_link import (
+    PaymentLinkBulkResponse,
+    PaymentLinkBulkUpdate,
     PaymentLinkCreate,
+    PaymentLinkFilter,
+    PaymentLinkListParams,
+    PaymentLinkQRBatch,
     PaymentLinkRead,
+    PaymentLinkStats,
     PaymentLinkUpdate,
 )
+from app.schemas.profile import ProfileSummary, ProfileToken
+from app.schemas.refund import RefundJobCreate, RefundJobItemRead, RefundJobRead
+from app.schemas.slow_query import SlowQueryRead
 
 __all__ = [
     "UserRead",
+    "UserUpdate",
+    "ApiTokenCreate",
+    "ApiTokenCreated",
+    "ApiTokenRead",
+    "PaymentLinkBulkResponse",
+    "PaymentLinkBulkUpdate",
     "PaymentLinkCreate",
+    "PaymentLinkFilter",
+    "PaymentLinkListParams",
+    "PaymentLinkQRBatch",
     "PaymentLinkRead",
+    "PaymentLinkStats",
     "PaymentLinkUpdate",
+    "ProfileSummary",
+    "ProfileToken",
+    "RefundJobCreate",
+    "RefundJobItemRead",
+    "RefundJobRead",
+    "SlowQueryRead",
 ]
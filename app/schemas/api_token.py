@@ -0,0 +1,32 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from app.models.api_token import ApiTokenScope
+from app.schemas.payment_link import _validate_future_datetime
+
+
+class ApiTokenCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    scopes: list[ApiTokenScope] = Field(..., min_length=1)
+    expires_at: datetime | None = None
+
+    _validate_expires_at = field_validator("expires_at")(_validate_future_datetime)
+
+
+class ApiTokenRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    name: str
+    prefix: str
+    scopes: list[ApiTokenScope]
+    expires_at: datetime | None
+    revoked_at: datetime | None
+    created_at: datetime
+
+
+class ApiTokenCreated(ApiTokenRead):
+    # Shown once: only its hash is stored
+    token: str
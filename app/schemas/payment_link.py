@@ -1,10 +1,14 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from enum import Enum
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 from app.models.payment_link import PaymentLinkStatus
+from app.services.qr import DEFAULT_SCALE, MAX_SCALE, MIN_SCALE, QRFormat
 
 MAX_AMOUNT_CLP = 999_999_999  # ~1 billion CLP
+MAX_BULK_IDS = 10_000
+MAX_QR_BATCH = 1_000
 
 
 def _validate_future_datetime(v: datetime | None) -> datetime | None:
@@ -31,6 +35,76 @@ class PaymentLinkUpdate(BaseModel):
     _validate_expires_at = field_validator("expires_at")(_validate_future_datetime)
 
 
+class PaymentLinkFilter(BaseModel):
+    status: PaymentLinkStatus | None = None
+    min_amount: int | None = Field(None, ge=0)
+    max_amount: int | None = Field(None, ge=0)
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    expires_from: datetime | None = None
+    expires_to: datetime | None = None
+    single_use: bool | None = None
+    payable: bool | None = Field(None, description="Activo y sin expirar")
+    expired: bool | None = Field(None, description="Con fecha de expiración ya pasada")
+    q: str | None = Field(None, min_length=1, max_length=100, description="Texto a buscar en la descripción")
+
+
+class PaymentLinkListParams(PaymentLinkFilter):
+    skip: int = 0
+    limit: int = 50
+
+
+class PaymentLinkBulkFilter(BaseModel):
+    status: PaymentLinkStatus | None = None
+    created_before: datetime | None = None
+    expires_before: datetime | None = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.status is None and self.created_before is None and self.expires_before is None:
+            raise ValueError("El filtro debe tener al menos un criterio")
+        return self
+
+
+class PaymentLinkBulkUpdate(BaseModel):
+    """Target status for the links in `ids` or matching `filter` (exactly one of them)."""
+
+    ids: list[UUID] | None = Field(None, min_length=1, max_length=MAX_BULK_IDS)
+    filter: PaymentLinkBulkFilter | None = None
+    status: PaymentLinkStatus
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Debe indicar ids o filter, pero no ambos")
+        if self.status == PaymentLinkStatus.PAID:
+            raise ValueError("Un link no puede marcarse como pagado manualmente")
+        return self
+
+
+class BulkOutcome(str, Enum):
+    UPDATED = "updated"
+    UNCHANGED = "unchanged"
+    PAID = "paid"
+    NOT_FOUND = "not_found"
+
+
+class PaymentLinkBulkResult(BaseModel):
+    id: UUID
+    outcome: BulkOutcome
+
+
+class PaymentLinkBulkResponse(BaseModel):
+    updated: int
+    results: list[PaymentLinkBulkResult]
+
+
+class PaymentLinkQRBatch(BaseModel):
+    ids: list[UUID] = Field(..., min_length=1, max_length=MAX_QR_BATCH)
+    format: QRFormat = QRFormat.PNG
+    scale: int = Field(DEFAULT_SCALE, ge=MIN_SCALE, le=MAX_SCALE)
+
+
 class PaymentLinkRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -44,5 +118,18 @@ class PaymentLinkRead(BaseModel):
     times_paid: int
     expires_at: datetime | None
     views_count: int
+    unique_visitors: int
     created_at: datetime
     updated_at: datetime
+
+
+class DailyVisitors(BaseModel):
+    day: date
+    unique_visitors: int
+
+
+class PaymentLinkStats(BaseModel):
+    views_count: int
+    unique_visitors: int
+    times_paid: int
+    daily: list[DailyVisitors]
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class ProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    status_code: int | None
+    started_at: datetime
+    duration_ms: float
+    samples: int
+    # Wall time per category: db, webpay, template, serialization, other
+    breakdown_ms: dict[str, float]
+
+
+class ProfileToken(BaseModel):
+    header: str
+    token: str
+    expires_at: datetime
@@ -0,0 +1,53 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from app.models.refund import RefundItemStatus, RefundJobStatus
+from app.schemas.payment_link import MAX_BULK_IDS, PaymentLinkFilter
+
+
+class RefundJobCreate(BaseModel):
+    """Refund every authorized payment of the links in `link_ids` or matching `filter` (exactly one)."""
+
+    link_ids: list[UUID] | None = Field(None, min_length=1, max_length=MAX_BULK_IDS)
+    filter: PaymentLinkFilter | None = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.link_ids is None) == (self.filter is None):
+            raise ValueError("Debe indicar link_ids o filter, pero no ambos")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            raise ValueError("El filtro debe tener al menos un criterio")
+        return self
+
+
+class RefundJobRead(BaseModel):
+    id: UUID
+    status: RefundJobStatus
+    criteria: dict
+    total_items: int
+    # Items per status
+    pending: int
+    succeeded: int
+    failed: int
+    skipped: int
+    refunded_amount: int
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+
+class RefundJobItemRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    transaction_id: UUID
+    status: RefundItemStatus
+    amount: int
+    attempts: int
+    refund_type: str | None
+    authorization_code: str | None
+    response_code: int | None
+    error: str | None
+    processed_at: datetime | None
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SlowQueryRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    fingerprint_id: str
+    fingerprint: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    # Last occurrence
+    route: str | None
+    parameters: dict | list | str | None
+    last_seen: datetime | None
+    explain: str | None
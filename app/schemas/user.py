@@ -1,6 +1,11 @@
 from datetime import datetime
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+
+from app.models.user import NotificationMode
+
+MIN_DIGEST_MINUTES = 5
+MAX_DIGEST_MINUTES = 1440
 
 
 class UserRead(BaseModel):
@@ -11,4 +16,11 @@ class UserRead(BaseModel):
     name: str
     picture_url: str | None
     is_active: bool
+    notification_mode: NotificationMode
+    notification_digest_minutes: int
     created_at: datetime
+
+
+class UserUpdate(BaseModel):
+    notification_mode: NotificationMode | None = None
+    notification_digest_minutes: int | None = Field(None, ge=MIN_DIGEST_MINUTES, le=MAX_DIGEST_MINUTES)
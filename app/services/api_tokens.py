@@ -0,0 +1,106 @@
+"""Personal API tokens: generation, hashing and cached verification.
+
+Tokens look like `lp_<prefix>_<secret>`. Verification looks the prefix up
+in a bounded TTL cache (falling back to the database on a miss, including
+for unknown prefixes) and compares SHA-256 digests in constant time, so a
+busy integration costs one hash and no queries per request. Revoking a token
+evicts it in every worker through the cache invalidation channel; if that
+notification is lost, the entry still expires after API_TOKEN_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import hmac
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.api_token import ApiToken
+from app.services.cache import TTLCache, register_cache
+
+settings = get_settings()
+
+TOKEN_PREFIX = "lp_"
+PREFIX_LENGTH = 12
+
+
+@dataclass(frozen=True)
+class TokenGrant:
+    user_id: str
+    scopes: frozenset[str]
+    token_hash: str
+    expires_at: datetime | None
+    revoked: bool
+
+    def is_valid(self) -> bool:
+        if self.revoked:
+            return False
+        if self.expires_at is None:
+            return True
+        expires_at = self.expires_at
+        if expires_at.tzinfo is None:
+            # SQLite returns naive datetimes (stored in UTC)
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) < expires_at
+
+
+# Cached for prefixes with no token, so guessed tokens don't reach the database
+_UNKNOWN = TokenGrant(user_id="", scopes=frozenset(), token_hash="", expires_at=None, revoked=True)
+
+# TokenGrant (or _UNKNOWN) keyed by token prefix
+token_cache = TTLCache(
+    maxsize=settings.api_token_cache_size,
+    ttl=settings.api_token_cache_ttl_seconds,
+    fallback_ttl=settings.cache_fallback_ttl_seconds,
+)
+register_cache("api_token", token_cache)
+
+
+def generate_token() -> tuple[str, str]:
+    """New (token, prefix) pair; the token is shown to the user once."""
+    prefix = secrets.token_hex(PREFIX_LENGTH // 2)
+    return f"{TOKEN_PREFIX}{prefix}_{secrets.token_urlsafe(32)}", prefix
+
+
+def hash_token(token: str) -> str:
+    # The secret is 256 random bits: a fast hash is enough, no key stretching needed
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_prefix(token: str) -> str | None:
+    if not token.startswith(TOKEN_PREFIX) or len(token) <= len(TOKEN_PREFIX) + PREFIX_LENGTH + 1:
+        return None
+    prefix = token[len(TOKEN_PREFIX):len(TOKEN_PREFIX) + PREFIX_LENGTH]
+    if token[len(TOKEN_PREFIX) + PREFIX_LENGTH] != "_":
+        return None
+    return prefix
+
+
+def verify_token(db: Session, token: str) -> TokenGrant | None:
+    """The grant of a valid (known, unrevoked, unexpired) token, else None."""
+    prefix = token_prefix(token)
+    if prefix is None:
+        return None
+
+    grant = token_cache.get(prefix)
+    if grant is None:
+        row = (
+            db.query(ApiToken.user_id, ApiToken.scopes, ApiToken.token_hash, ApiToken.expires_at, ApiToken.revoked_at)
+            .filter(ApiToken.prefix == prefix)
+            .first()
+        )
+        grant = _UNKNOWN
+        if row is not None:
+            grant = TokenGrant(
+                user_id=str(row.user_id),
+                scopes=frozenset(row.scopes),
+                token_hash=row.token_hash,
+                expires_at=row.expires_at,
+                revoked=row.revoked_at is not None,
+            )
+        token_cache.set(prefix, grant)
+
+    if not grant.is_valid() or not hmac.compare_digest(grant.token_hash, hash_token(token)):
+        return None
+    return grant
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any
+
+import orjson
+from sqlalchemy.orm import Session
+
+from app.services.pubsub import notify, pg_listener
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "linkpago_invalidate"
+# NOTIFY payloads are limited to 8000 bytes; 100 UUIDs stay well below that
+_KEYS_PER_NOTIFY = 100
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with per-entry TTL.
+
+    While the invalidation listener is down the cache is `degraded` and
+    entries are only trusted for `fallback_ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, fallback_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.degraded = True
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        max_age = self.fallback_ttl if self.degraded else self.ttl
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            if time.monotonic() - stored_at > max_age:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_caches: dict[str, list[TTLCache]] = defaultdict(list)
+
+
+def register_cache(kind: str, cache: TTLCache) -> None:
+    """Evict entries of `cache` whenever an object of `kind` changes."""
+    _caches[kind].append(cache)
+    cache.degraded = not pg_listener.connected
+
+
+def evict(kind: str, keys: list[str]) -> None:
+    for cache in _caches.get(kind, ()):
+        for key in keys:
+            cache.pop(key)
+
+
+def invalidate(db: Session, kind: str, *keys: Any) -> None:
+    """Evict `keys` here now and in every other worker when `db` commits."""
+    keys = [str(key) for key in keys]
+    evict(kind, keys)
+    for i in range(0, len(keys), _KEYS_PER_NOTIFY):
+        payload = {"kind": kind, "keys": keys[i:i + _KEYS_PER_NOTIFY]}
+        notify(db, INVALIDATION_CHANNEL, orjson.dumps(payload).decode())
+
+
+def _on_invalidation(payload: str) -> None:
+    event = orjson.loads(payload)
+    evict(event["kind"], event["keys"])
+
+
+def _on_connection_change(connected: bool) -> None:
+    for caches in _caches.values():
+        for cache in caches:
+            # Events may have been missed while disconnected
+            cache.clear()
+            cache.degraded = not connected
+    if not connected:
+        logger.warning("Cache invalidation listener down, using fallback TTL")
+
+
+pg_listener.subscribe(INVALIDATION_CHANNEL, _on_invalidation)
+pg_listener.on_connection_change(_on_connection_change)
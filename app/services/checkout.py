@@ -0,0 +1,297 @@
+"""Checkout state changes on transactions and single-use links.
+
+Every change is a conditional UPDATE, so concurrent requests (two tabs, a
+reload during the commit, the reconciler) can't apply it twice.
+
+When a commit fails without a clear answer from Transbank (timeout, network
+or server error) the card may still have been charged. The transaction then
+stays PROCESSING, which keeps a single-use link reserved, until Transbank's
+transaction status says how it ended: when the buyer comes back to the
+return URL, or from CheckoutReconciler once Transbank can no longer commit
+it.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.payment_link import PaymentLink, PaymentLinkStatus
+from app.models.transaction import TRANSACTION_TRANSITIONS, Transaction, TransactionStatus
+from app.services.email import send_payment_notification
+from app.services.link_events import publish_link_event
+from app.services.notifications import queue_payment_notification
+from app.services.webpay import webpay_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Transbank status of a transaction whose commit it hasn't processed
+NOT_COMMITTED = "INITIALIZED"
+
+
+def transition_transaction(
+    db: Session,
+    transaction_id: uuid.UUID,
+    created_at: datetime,
+    from_status: TransactionStatus,
+    to_status: TransactionStatus,
+    **values,
+) -> bool:
+    """Conditionally move a transaction between states.
+
+    Returns False if it is no longer in `from_status` (another request got
+    there first). The caller commits.
+    """
+    if to_status not in TRANSACTION_TRANSITIONS[from_status]:
+        raise ValueError(f"Invalid transaction transition {from_status} -> {to_status}")
+    result = db.execute(
+        update(Transaction)
+        .where(
+            Transaction.id == transaction_id,
+            Transaction.created_at == created_at,
+            Transaction.status == from_status,
+        )
+        .values(status=to_status, **values)
+    )
+    return result.rowcount == 1
+
+
+def reserve_link(db: Session, link_id: uuid.UUID, buy_order: str) -> bool:
+    """Reserve a single-use link for the checkout `buy_order`.
+
+    A single conditional UPDATE: it only matches while the link is payable,
+    not held by an unexpired reservation and has no commit in progress or
+    awaiting reconciliation, so of several concurrent inits exactly one
+    gets it. Abandoned reservations lapse after PAYMENT_RESERVATION_SECONDS.
+    The caller commits.
+    """
+    now = datetime.now(timezone.utc)
+    processing = (
+        select(Transaction.id)
+        .where(Transaction.payment_link_id == PaymentLink.id, Transaction.status == TransactionStatus.PROCESSING)
+        .exists()
+    )
+    result = db.execute(
+        update(PaymentLink)
+        .where(
+            PaymentLink.id == link_id,
+            PaymentLink.is_payable,
+            or_(PaymentLink.reserved_until.is_(None), PaymentLink.reserved_until < now),
+            ~processing,
+        )
+        .values(
+            reserved_until=now + timedelta(seconds=settings.payment_reservation_seconds),
+            reserved_by=buy_order,
+            # Not an edit of the link: keep its ETags valid
+            updated_at=PaymentLink.updated_at,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount == 1
+
+
+def release_link(db: Session, link_id: uuid.UUID, buy_order: str) -> None:
+    """Drop the reservation if `buy_order` still holds it. The caller commits."""
+    db.execute(
+        update(PaymentLink)
+        .where(PaymentLink.id == link_id, PaymentLink.reserved_by == buy_order)
+        .values(reserved_until=None, reserved_by=None, updated_at=PaymentLink.updated_at),
+        execution_options={"synchronize_session": False},
+    )
+
+
+@dataclass
+class CheckoutTransaction:
+    """The keys of a transaction that the checkout needs after its session commits."""
+
+    id: uuid.UUID
+    created_at: datetime
+    payment_link_id: uuid.UUID
+    buy_order: str
+    token: str | None
+
+
+@dataclass
+class Payment:
+    """A payment that was just authorized, for the receipt and the merchant's email."""
+
+    recipient_email: str
+    description: str
+    amount: int
+    authorization_code: str | None
+    card_last_four: str | None
+    # Queued for the merchant's digest; otherwise it is emailed right away
+    queued: bool
+
+
+def _result_values(response: dict) -> dict:
+    card_detail = response.get("card_detail") or {}
+    return {
+        "webpay_response": response,
+        "response_code": response.get("response_code"),
+        "authorization_code": response.get("authorization_code"),
+        "payment_type_code": response.get("payment_type_code"),
+        "installments_number": response.get("installments_number"),
+        "card_last_four": card_detail.get("card_number"),
+    }
+
+
+def settle_transaction(
+    db: Session, transaction: CheckoutTransaction, response: dict, approved: bool
+) -> Payment | None:
+    """Move a PROCESSING transaction to AUTHORIZED or FAILED with Transbank's
+    answer (a commit or status response).
+
+    Returns the payment if this call authorized it; None if it was rejected
+    or another request settled it first. Commits.
+    """
+    values = _result_values(response)
+    if not approved:
+        if transition_transaction(
+            db, transaction.id, transaction.created_at,
+            TransactionStatus.PROCESSING, TransactionStatus.FAILED, **values,
+        ):
+            release_link(db, transaction.payment_link_id, transaction.buy_order)
+        db.commit()
+        return None
+
+    if not transition_transaction(
+        db, transaction.id, transaction.created_at,
+        TransactionStatus.PROCESSING, TransactionStatus.AUTHORIZED,
+        authorized_at=datetime.now(timezone.utc), **values,
+    ):
+        db.rollback()
+        return None
+    db.execute(
+        update(PaymentLink)
+        .where(PaymentLink.id == transaction.payment_link_id)
+        .values(
+            times_paid=PaymentLink.times_paid + 1,
+            reserved_until=None,
+            reserved_by=None,
+            # Solo marcar como PAID si es single_use
+            status=case(
+                (PaymentLink.single_use, literal(PaymentLinkStatus.PAID, PaymentLink.status.type)),
+                else_=PaymentLink.status,
+            ),
+        )
+    )
+    link = db.get(PaymentLink, transaction.payment_link_id, populate_existing=True)
+    publish_link_event(db, link)
+    payment = Payment(
+        recipient_email=link.user.email,
+        description=link.description,
+        amount=link.amount,
+        authorization_code=values["authorization_code"],
+        card_last_four=values["card_last_four"],
+        # Digest merchants: queued with the payment, sent by the notification digester
+        queued=queue_payment_notification(db, link, values["authorization_code"]),
+    )
+    db.commit()
+    return payment
+
+
+def reconcile_transaction(
+    db: Session, transaction: CheckoutTransaction, commit_window_closed: bool = False
+) -> tuple[bool | None, Payment | None]:
+    """Settle a PROCESSING transaction from Transbank's transaction status.
+
+    Returns (approved, payment): approved is None while the outcome is still
+    unknown (Transbank unreachable, or the commit not processed yet while it
+    still can be), and payment is set if this call authorized it. A
+    transaction Transbank never committed is only failed once
+    `commit_window_closed`, since an in-flight commit may still land.
+    """
+    if not transaction.token:
+        return None, None
+    try:
+        status = webpay_service.transaction_status(transaction.token)
+    except Exception as e:
+        logger.warning(f"Webpay status check failed for order {transaction.buy_order}: {e}")
+        return None, None
+
+    approved = webpay_service.is_approved(status)
+    if not approved and status.get("status") in (None, NOT_COMMITTED) and not commit_window_closed:
+        return None, None
+    return approved, settle_transaction(db, transaction, status, approved)
+
+
+class CheckoutReconciler:
+    """Settles transactions left PROCESSING by commits without an answer.
+
+    Only looks at transactions old enough that Transbank can no longer
+    commit them, so its answer is final; newer ones are settled when the
+    buyer returns.
+    """
+
+    def __init__(self, poll_seconds: float, commit_window_seconds: float, batch_size: int = 100):
+        self.poll_seconds = poll_seconds
+        self.commit_window_seconds = commit_window_seconds
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    def reconcile_stuck(self) -> list[Payment]:
+        """Reconcile one batch; runs in a worker thread. Returns the payments it authorized."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.commit_window_seconds)
+        payments = []
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(
+                    Transaction.id,
+                    Transaction.created_at,
+                    Transaction.payment_link_id,
+                    Transaction.buy_order,
+                    Transaction.token,
+                )
+                .where(Transaction.status == TransactionStatus.PROCESSING, Transaction.created_at < cutoff)
+                .order_by(Transaction.created_at)
+                .limit(self.batch_size)
+            ).all()
+            db.commit()
+            for row in rows:
+                transaction = CheckoutTransaction(*row)
+                approved, payment = reconcile_transaction(db, transaction, commit_window_closed=True)
+                if approved is not None:
+                    logger.info(f"Reconciled order {transaction.buy_order}: {'authorized' if approved else 'failed'}")
+                if payment is not None:
+                    payments.append(payment)
+        return payments
+
+    async def run_once(self) -> int:
+        payments = await run_in_threadpool(self.reconcile_stuck)
+        for payment in payments:
+            if not payment.queued:
+                await send_payment_notification(
+                    payment.recipient_email, payment.description, payment.amount, payment.authorization_code
+                )
+        return len(payments)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Checkout reconciliation failed: {e}")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+checkout_reconciler = CheckoutReconciler(
+    poll_seconds=settings.payment_reconcile_poll_seconds,
+    # The Webpay form stays open this long, then the commit has its own timeout
+    commit_window_seconds=settings.payment_reservation_seconds + settings.webpay_commit_timeout_seconds,
+)
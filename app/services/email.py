@@ -1,70 +1,48 @@
 import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timezone, tzinfo
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
 import aiosmtplib
+from jinja2 import Environment, FileSystemLoader
 
 from app.config import get_settings
 from app.utils import format_clp
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import. Autoescaped: descriptions are merchant input
+email_templates = Environment(
+    loader=FileSystemLoader("app/templates"),
+    autoescape=True,
+    auto_reload=False,
+)
+email_templates.filters["clp"] = format_clp
+_notification_template = email_templates.get_template("email/payment_notification.html")
+_digest_template = email_templates.get_template("email/payment_digest.html")
 
-async def send_payment_notification(
-    recipient_email: str,
-    description: str,
-    amount: int,
-    authorization_code: str,
-):
+# Payments listed one by one in a digest; the rest are only counted
+DIGEST_MAX_PAYMENTS = 50
+
+# (kind, outcome) -> emails
+emails_total: Counter[tuple[str, str]] = Counter()
+
+
+async def _send(kind: str, recipient_email: str, subject: str, html: str, summary: str) -> None:
+    """Send an HTML email; raises if SMTP fails. Without SMTP credentials it is only logged."""
     settings = get_settings()
 
     if not settings.smtp_user or not settings.smtp_password:
-        logger.info(
-            f"Payment notification (SMTP not configured): "
-            f"to={recipient_email} amount=${amount:,} code={authorization_code}"
-        )
+        logger.info(f"{subject} (SMTP not configured): to={recipient_email} {summary}")
+        emails_total[(kind, "logged")] += 1
         return
 
     message = MIMEMultipart("alternative")
-    message["Subject"] = f"Pago recibido: {description}"
+    message["Subject"] = subject
     message["From"] = settings.email_from
     message["To"] = recipient_email
-
-    formatted_amount = format_clp(amount)
-
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: #10B981; color: white; padding: 20px; text-align: center; border-radius: 8px 8px 0 0; }}
-            .content {{ background: #f9fafb; padding: 20px; border-radius: 0 0 8px 8px; }}
-            .amount {{ font-size: 32px; font-weight: bold; color: #10B981; }}
-            .detail {{ margin: 10px 0; padding: 10px; background: white; border-radius: 4px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Pago Recibido</h1>
-            </div>
-            <div class="content">
-                <p class="amount">{formatted_amount} CLP</p>
-                <div class="detail">
-                    <strong>Descripción:</strong> {description}
-                </div>
-                <div class="detail">
-                    <strong>Código de autorización:</strong> {authorization_code}
-                </div>
-                <p>El pago ha sido procesado exitosamente.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
     message.attach(MIMEText(html, "html"))
 
     try:
@@ -76,5 +54,93 @@ async def send_payment_notification(
             password=settings.smtp_password,
             start_tls=True,
         )
+    except Exception:
+        emails_total[(kind, "failed")] += 1
+        raise
+    emails_total[(kind, "sent")] += 1
+
+
+async def send_payment_notification(
+    recipient_email: str,
+    description: str,
+    amount: int,
+    authorization_code: str,
+):
+    html = _notification_template.render(
+        description=description,
+        amount=amount,
+        authorization_code=authorization_code,
+    )
+    try:
+        await _send(
+            "payment",
+            recipient_email,
+            f"Pago recibido: {description}",
+            html,
+            f"amount=${amount:,} code={authorization_code}",
+        )
     except Exception as e:
         logger.error(f"Failed to send payment notification to {recipient_email}: {e}")
+
+
+def _local(value: datetime, tz: tzinfo) -> datetime:
+    if value.tzinfo is None:
+        # SQLite returns naive datetimes (stored in UTC)
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(tz)
+
+
+async def send_payment_digest(
+    recipient_email: str,
+    payments: list,
+    since: datetime,
+    until: datetime,
+    tz: tzinfo,
+) -> None:
+    """One summary email for `payments` (objects with payment_link_id,
+    description, amount, authorization_code and created_at, oldest first),
+    with times shown in `tz`. Raises if SMTP fails."""
+    total = sum(payment.amount for payment in payments)
+    # By link, not description: different links may share one
+    by_link: dict[uuid.UUID, dict] = {}
+    for payment in payments:
+        link = by_link.setdefault(
+            payment.payment_link_id, {"description": payment.description, "count": 0, "total": 0}
+        )
+        link["count"] += 1
+        link["total"] += payment.amount
+
+    html = _digest_template.render(
+        count=len(payments),
+        total=total,
+        since=_local(since, tz).strftime("%d/%m/%Y %H:%M"),
+        until=_local(until, tz).strftime("%d/%m/%Y %H:%M"),
+        links=sorted(by_link.values(), key=lambda link: link["total"], reverse=True),
+        payments=[
+            {
+                "time": _local(payment.created_at, tz).strftime("%d/%m %H:%M"),
+                "description": payment.description,
+                "amount": payment.amount,
+                "authorization_code": payment.authorization_code,
+            }
+            for payment in reversed(payments[-DIGEST_MAX_PAYMENTS:])
+        ],
+    )
+    plural = "s" if len(payments) != 1 else ""
+    await _send(
+        "digest",
+        recipient_email,
+        f"Resumen: {len(payments)} pago{plural} recibido{plural} por {format_clp(total)}",
+        html,
+        f"payments={len(payments)} total=${total:,}",
+    )
+
+
+def prometheus_metrics() -> str:
+    lines = [
+        "# HELP emails_total Notification emails by kind (payment, digest) and outcome",
+        "# TYPE emails_total counter",
+    ]
+    for (kind, outcome), count in sorted(emails_total.items()):
+        lines.append(f'emails_total{{kind="{kind}",outcome="{outcome}"}} {count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,50 @@
+import hashlib
+import math
+
+DEFAULT_PRECISION = 12
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**precision one-byte registers.
+
+    The default precision (4096 registers, 4 KB) has a standard error of
+    about 1.04 / sqrt(4096) = 1.6%, regardless of how many items are added.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: bytes | None = None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(precision=len(data).bit_length() - 1, registers=data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, value: str) -> None:
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hashed & ((1 << remaining_bits) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.size != self.size:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+import orjson
+from sqlalchemy.orm import Session
+
+from app.models.payment_link import PaymentLink
+from app.services.pubsub import notify, pg_listener
+
+logger = logging.getLogger(__name__)
+
+LINK_EVENTS_CHANNEL = "linkpago_link_events"
+QUEUE_SIZE = 100
+
+
+def publish_link_event(db: Session, link: PaymentLink) -> None:
+    """Announce a link's live counters to its owner's dashboards on commit."""
+    payload = {
+        "user_id": str(link.user_id),
+        "id": str(link.id),
+        "status": link.status.value,
+        "times_paid": link.times_paid,
+        "views_count": link.views_count,
+    }
+    notify(db, LINK_EVENTS_CHANNEL, orjson.dumps(payload).decode())
+
+
+class LinkEventBroker:
+    """Fans link events out to this worker's open SSE streams.
+
+    Every worker receives all events through the shared pg_listener
+    connection and only forwards them to the streams of the owning user.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def _deliver(self, user_id: str, payload: str) -> None:
+        for queue in list(self._subscribers.get(user_id, ())):
+            if queue.full():
+                # Slow client: drop the oldest update, newer ones supersede it
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    def on_notification(self, payload: str) -> None:
+        # Called from the listener thread
+        user_id = orjson.loads(payload)["user_id"]
+        if user_id in self._subscribers and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, user_id, payload)
+
+
+link_event_broker = LinkEventBroker()
+pg_listener.subscribe(LINK_EVENTS_CHANNEL, link_event_broker.on_notification)
@@ -0,0 +1,167 @@
+"""Payment notifications according to each merchant's notification_mode.
+
+IMMEDIATE merchants get one email per payment. DIGEST and DAILY merchants
+get their payments queued in pending_notifications, in the same commit that
+authorizes them, and NotificationDigester sends one summary per merchant
+per window:
+
+- DIGEST: once the oldest queued payment is notification_digest_minutes old;
+- DAILY: at NOTIFICATION_DAILY_HOUR (NOTIFICATION_TIMEZONE), for everything
+  queued before then.
+
+A merchant's rows are claimed with FOR UPDATE SKIP LOCKED, so every worker
+can run the digester without a summary going out twice, and are deleted
+only after the email is sent.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo
+
+from anyio import from_thread
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.notification import PendingNotification
+from app.models.payment_link import PaymentLink
+from app.models.user import NotificationMode, User
+from app.services.email import send_payment_digest
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def queue_payment_notification(db: Session, link: PaymentLink, authorization_code: str | None) -> bool:
+    """Queue a payment for its merchant's next digest.
+
+    Returns False if the merchant wants an email per payment instead. The
+    caller commits.
+    """
+    if link.user.notification_mode == NotificationMode.IMMEDIATE:
+        return False
+    db.add(
+        PendingNotification(
+            user_id=link.user_id,
+            payment_link_id=link.id,
+            description=link.description,
+            amount=link.amount,
+            authorization_code=authorization_code,
+        )
+    )
+    return True
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        # SQLite returns naive datetimes (stored in UTC)
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def last_daily_send(now: datetime, hour: int, tz: tzinfo) -> datetime:
+    """Most recent daily digest time at or before `now`."""
+    local_now = now.astimezone(tz)
+    send_at = local_now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if send_at > local_now:
+        send_at -= timedelta(days=1)
+    return send_at
+
+
+class NotificationDigester:
+    def __init__(self, poll_seconds: float, daily_hour: int, tz: tzinfo):
+        self.poll_seconds = poll_seconds
+        self.daily_hour = daily_hour
+        self.tz = tz
+        self._task: asyncio.Task | None = None
+
+    def due_users(self, now: datetime) -> list[tuple[uuid.UUID, str]]:
+        """(id, email) of the merchants whose digest window has closed."""
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(
+                    User.id,
+                    User.email,
+                    User.notification_mode,
+                    User.notification_digest_minutes,
+                    func.min(PendingNotification.created_at),
+                )
+                .join(PendingNotification, PendingNotification.user_id == User.id)
+                .group_by(User.id, User.email, User.notification_mode, User.notification_digest_minutes)
+            ).all()
+
+        daily_send = last_daily_send(now, self.daily_hour, self.tz)
+        due = []
+        for user_id, email, mode, digest_minutes, oldest in rows:
+            oldest = _as_utc(oldest)
+            if mode == NotificationMode.DIGEST:
+                is_due = oldest <= now - timedelta(minutes=digest_minutes)
+            elif mode == NotificationMode.DAILY:
+                is_due = oldest < daily_send
+            else:
+                # Queued before the merchant switched back to immediate
+                is_due = True
+            if is_due:
+                due.append((user_id, email))
+        return due
+
+    def send_digest(self, user_id: uuid.UUID, email: str, now: datetime) -> int:
+        """Send one merchant's queued payments in a single email. Runs in a
+        worker thread; returns the number of payments sent."""
+        with SessionLocal() as db:
+            payments = (
+                db.query(PendingNotification)
+                .filter(PendingNotification.user_id == user_id)
+                .order_by(PendingNotification.created_at)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not payments:
+                # Sent by another worker
+                return 0
+            # On failure the rows are rolled back into the queue for the next poll
+            from_thread.run(send_payment_digest, email, payments, payments[0].created_at, now, self.tz)
+            db.execute(
+                delete(PendingNotification)
+                .where(PendingNotification.id.in_([payment.id for payment in payments]))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return len(payments)
+
+    async def send_due(self) -> int:
+        now = datetime.now(timezone.utc)
+        sent = 0
+        for user_id, email in await run_in_threadpool(self.due_users, now):
+            try:
+                sent += await run_in_threadpool(self.send_digest, user_id, email, now)
+            except Exception as e:
+                logger.error(f"Payment digest to {email} failed: {e}")
+        return sent
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.send_due()
+            except Exception as e:
+                logger.error(f"Payment digest run failed: {e}")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Queued payments stay in the table for the next run
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+notification_digester = NotificationDigester(
+    poll_seconds=settings.notification_digest_poll_seconds,
+    daily_hour=settings.notification_daily_hour,
+    tz=ZoneInfo(settings.notification_timezone),
+)
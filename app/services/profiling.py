@@ -0,0 +1,301 @@
+"""On-demand request profiling.
+
+A request is profiled when it carries a valid admin-signed X-Profile header
+(see create_profile_token) or is picked by PROFILING_SAMPLE_RATE. While it
+runs, a sampler thread records the stacks of the threads working for it and
+Span blocks add up the wall time spent in the database, Webpay, template
+rendering and JSON serialization. Finished profiles are kept in a bounded
+ring buffer and exported as speedscope or collapsed-stack (flamegraph) files.
+
+When a request is not profiled the only overhead is the header check, and a
+context variable lookup per Span and per SQL statement.
+"""
+import asyncio
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from types import FrameType
+
+from fastapi.responses import ORJSONResponse
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+
+from app.config import get_settings
+from app.database import engine
+
+settings = get_settings()
+
+PROFILE_HEADER = "X-Profile"
+CATEGORIES = ("db", "webpay", "template", "serialization")
+MAX_STACK_DEPTH = 128
+# Distinct stacks kept per profile; further samples count as truncated
+MAX_DISTINCT_STACKS = 5000
+
+Frame = tuple[str, str, int]  # (qualified name, file, first line)
+TRUNCATED: tuple[Frame, ...] = (("[truncated]", "", 0),)
+
+_current_profile: ContextVar["RequestProfile | None"] = ContextVar("request_profile", default=None)
+_serializer = URLSafeTimedSerializer(settings.secret_key, salt="request-profiling")
+
+
+def create_profile_token(user_id: str) -> str:
+    return _serializer.dumps({"user_id": user_id})
+
+
+def verify_profile_token(token: str) -> bool:
+    try:
+        _serializer.loads(token, max_age=settings.profiling_token_max_age_seconds)
+    except BadSignature:
+        return False
+    return True
+
+
+class RequestProfile:
+    def __init__(self, profile_id: int, method: str, path: str, interval: float):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.status_code: int | None = None
+        self.totals: Counter[str] = Counter()
+        # (category, *frames root to leaf) -> sample count
+        self.samples: Counter[tuple] = Counter()
+        self._start = time.perf_counter()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._loop_thread = threading.get_ident()
+        # Open span categories per thread working for this request
+        self._threads: dict[int, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def enter(self, category: str) -> None:
+        with self._lock:
+            self._threads.setdefault(threading.get_ident(), []).append(category)
+
+    def exit(self, category: str, elapsed: float) -> None:
+        thread_id = threading.get_ident()
+        with self._lock:
+            stack = self._threads[thread_id]
+            stack.pop()
+            if not stack:
+                del self._threads[thread_id]
+            # Nested spans of the same category are already in the outer one
+            if category not in stack:
+                self.totals[category] += elapsed
+
+    def sample(self, frames: dict[int, FrameType]) -> None:
+        with self._lock:
+            threads = {thread_id: stack[-1] for thread_id, stack in self._threads.items()}
+        # The event loop thread also runs other requests: only sample it while this task runs
+        if asyncio.current_task(self._loop) is self._task:
+            threads.setdefault(self._loop_thread, "other")
+        else:
+            threads.pop(self._loop_thread, None)
+
+        for thread_id, category in threads.items():
+            frame = frames.get(thread_id)
+            stack: list[Frame] = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            key = (category, *stack)
+            if key not in self.samples and len(self.samples) >= MAX_DISTINCT_STACKS:
+                key = (category, *TRUNCATED)
+            self.samples[key] += 1
+
+    def finish(self, status_code: int | None) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.status_code = status_code
+
+    def breakdown(self) -> dict[str, float]:
+        """Wall time per category in milliseconds; "other" is the rest."""
+        result = {category: round(self.totals[category] * 1000, 3) for category in CATEGORIES}
+        result["other"] = round(max(self.duration * 1000 - sum(result.values()), 0.0), 3)
+        return result
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.samples.values()),
+            "breakdown_ms": self.breakdown(),
+        }
+
+
+class Span:
+    """Time a block as `category` in the current request's profile, if any."""
+
+    __slots__ = ("category", "profile", "start")
+
+    def __init__(self, category: str):
+        self.category = category
+
+    def __enter__(self) -> "Span":
+        self.profile = _current_profile.get()
+        if self.profile is not None:
+            self.start = time.perf_counter()
+            self.profile.enter(self.category)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.profile is not None:
+            self.profile.exit(self.category, time.perf_counter() - self.start)
+
+
+class Profiler:
+    def __init__(self, buffer_size: int, sample_rate: float, interval_ms: float):
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.profiles: deque[RequestProfile] = deque(maxlen=buffer_size)
+        self._active: set[RequestProfile] = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def wants(self, headers: list[tuple[bytes, bytes]]) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        for name, value in headers:
+            if name == b"x-profile":
+                return verify_profile_token(value.decode("latin-1"))
+        return False
+
+    def begin(self, method: str, path: str) -> tuple[RequestProfile, Token]:
+        profile = RequestProfile(next(self._ids), method, path, self.interval)
+        token = _current_profile.set(profile)
+        with self._lock:
+            self._active.add(profile)
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return profile, token
+
+    def end(self, profile: RequestProfile, token: Token, status_code: int | None) -> None:
+        _current_profile.reset(token)
+        profile.finish(status_code)
+        with self._lock:
+            self._active.discard(profile)
+            self.profiles.append(profile)
+
+    def get(self, profile_id: int) -> RequestProfile | None:
+        with self._lock:
+            return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+    def list(self) -> list[RequestProfile]:
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+
+def to_speedscope(profile: RequestProfile) -> dict:
+    """Profile in speedscope's file format (https://www.speedscope.app)."""
+    frames: list[dict] = []
+    index: dict[Frame, int] = {}
+
+    def frame_index(frame: Frame) -> int:
+        if frame not in index:
+            index[frame] = len(frames)
+            name, file, line = frame
+            frames.append({"name": name, "file": file, "line": line} if file else {"name": name})
+        return index[frame]
+
+    samples = []
+    weights = []
+    interval_ms = profile.interval * 1000
+    for (category, *stack), count in profile.samples.items():
+        samples.append([frame_index((f"[{category}]", "", 0))] + [frame_index(frame) for frame in stack])
+        weights.append(count * interval_ms)
+
+    name = f"{profile.method} {profile.path} #{profile.id}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "linkpago",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def to_collapsed(profile: RequestProfile) -> str:
+    """Collapsed stacks, one "frame;frame;... count" line per stack (flamegraph.pl, inferno)."""
+    lines = []
+    for (category, *stack), count in profile.samples.items():
+        names = [f"[{category}]"] + [f"{name} ({file}:{line})" if file else name for name, file, line in stack]
+        lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class ProfiledJSONResponse(ORJSONResponse):
+    """ORJSONResponse that reports its rendering as serialization time."""
+
+    def render(self, content) -> bytes:
+        with Span("serialization"):
+            return super().render(content)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        span = Span("db")
+        span.__enter__()
+        conn.info.setdefault("profile_spans", []).append(span)
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("profile_spans")
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("profile_spans") if connection is not None else None
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+profiler = Profiler(
+    buffer_size=settings.profiling_buffer_size,
+    sample_rate=settings.profiling_sample_rate,
+    interval_ms=settings.profiling_interval_ms,
+)
@@ -0,0 +1,134 @@
+import logging
+import select
+import threading
+from collections import defaultdict
+from typing import Callable
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 30
+RECONNECT_SECONDS = 5
+
+
+def notify(db: Session, channel: str, payload: str) -> None:
+    """Queue a NOTIFY on the session's transaction; it is delivered on commit."""
+    if db.get_bind().dialect.name != "postgresql":
+        # Single-process backends (SQLite): deliver to this worker's subscribers on commit
+        db.info.setdefault("local_notifications", []).append((channel, payload))
+        return
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_local_notifications(session: Session) -> None:
+    for channel, payload in session.info.pop("local_notifications", ()):
+        pg_listener._dispatch(channel, payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_local_notifications(session: Session) -> None:
+    session.info.pop("local_notifications", None)
+
+
+class PgListener:
+    """Single LISTEN connection per worker, shared by every channel subscriber.
+
+    Runs in a daemon thread; callbacks are invoked from that thread and must
+    be quick and thread-safe. Subscribe before calling start(). Without a
+    dsn (non-Postgres databases) nothing is started and notify() delivers
+    locally.
+    """
+
+    def __init__(self, dsn: str | None):
+        self.dsn = dsn
+        self.connected = False
+        self._callbacks: dict[str, list[Callable[[str], None]]] = defaultdict(list)
+        self._connection_callbacks: list[Callable[[bool], None]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._callbacks[channel].append(callback)
+
+    def on_connection_change(self, callback: Callable[[bool], None]) -> None:
+        self._connection_callbacks.append(callback)
+
+    def start(self) -> None:
+        if self.dsn is None or self._thread is not None or not self._callbacks:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=RECONNECT_SECONDS)
+            self._thread = None
+
+    def _set_connected(self, connected: bool) -> None:
+        if connected == self.connected:
+            return
+        self.connected = connected
+        for callback in self._connection_callbacks:
+            try:
+                callback(connected)
+            except Exception as e:
+                logger.error(f"Listener connection callback failed: {e}")
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Listener callback for {channel} failed: {e}")
+
+    def _listen(self) -> None:
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                for channel in self._callbacks:
+                    cur.execute(f'LISTEN "{channel}"')
+            self._set_connected(True)
+
+            idle = 0.0
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    idle += 1.0
+                    if idle >= KEEPALIVE_SECONDS:
+                        # Detect half-open connections that select() won't report
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        idle = 0.0
+                    continue
+                idle = 0.0
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    self._dispatch(notification.channel, notification.payload)
+        finally:
+            self._set_connected(False)
+            conn.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Postgres listener disconnected: {e}")
+            self._stop.wait(RECONNECT_SECONDS)
+
+
+pg_listener = PgListener(
+    engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    if engine.dialect.name == "postgresql"
+    else None
+)
@@ -0,0 +1,197 @@
+"""Slow-query log.
+
+app/database.py times every statement and hands the ones slower than
+SLOW_QUERY_THRESHOLD_MS to slow_query_log, which logs them with their
+parameters redacted and the route that issued them, and aggregates them by
+fingerprint (the statement with literals and bind parameters collapsed).
+Only the slowest fingerprints are kept.
+
+With SLOW_QUERY_EXPLAIN enabled on PostgreSQL, slow SELECTs are explained at
+most once per fingerprint per SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, in a
+background thread on a connection of its own, so the request that ran them
+doesn't wait for it. Read-only SELECTs are re-run under EXPLAIN (ANALYZE,
+BUFFERS); SELECTs that may have side effects (locking rows, calling
+functions like pg_notify) only get a plain EXPLAIN, which doesn't execute
+them. The explaining transaction is always rolled back.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from starlette.types import Scope
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request being served (set by QueryContextMiddleware);
+# the router fills in scope["route"]
+request_scope: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+_BIND_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_FROM = re.compile(r"\bFROM\b", re.IGNORECASE)
+# SELECTs that lock rows or call functions with side effects
+_NOT_READ_ONLY = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(?:KEY\s+)?SHARE\b"
+    r"|\b(?:pg_notify|ensure_transaction_partitions|nextval|setval|pg_advisory_\w*lock\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals and bind parameters replaced by ?, IN lists collapsed."""
+    text = _STRING.sub("?", statement)
+    text = _BIND_PARAM.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _LIST.sub("(...)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+def explain_statement(statement: str) -> str:
+    """EXPLAIN for a slow SELECT: with ANALYZE (which runs it) only when it is read-only."""
+    if _FROM.search(statement) and not _NOT_READ_ONLY.search(statement):
+        return f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+    return f"EXPLAIN {statement}"
+
+
+def redact(parameters) -> dict | list | str | None:
+    """Parameter names and types, never their values."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def current_route() -> str | None:
+    scope = request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+@dataclass
+class SlowQueryStats:
+    fingerprint_id: str
+    fingerprint: str
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    route: str | None = None
+    parameters: dict | list | str | None = None
+    last_seen: datetime | None = None
+    explain: str | None = None
+    explained_at: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float,
+        max_fingerprints: int,
+        explain: bool = False,
+        explain_interval_seconds: float = 60,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.max_fingerprints = max_fingerprints
+        self.explain = explain
+        self.explain_interval = explain_interval_seconds
+        self._stats: dict[str, SlowQueryStats] = {}
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    def record(self, conn, statement: str, parameters, elapsed: float, executemany: bool) -> None:
+        elapsed_ms = elapsed * 1000
+        text = fingerprint(statement)
+        fingerprint_id = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+        route = current_route()
+        redacted = None if executemany else redact(parameters)
+        logger.warning(
+            "Slow query %.1fms [%s] route=%s params=%s: %s",
+            elapsed_ms, fingerprint_id, route, redacted, text,
+        )
+
+        with self._lock:
+            stats = self._stats.get(fingerprint_id)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # Make room by forgetting the fingerprint with the fastest worst case
+                    fastest = min(self._stats.values(), key=lambda s: s.max_ms)
+                    if fastest.max_ms >= elapsed_ms:
+                        return
+                    del self._stats[fastest.fingerprint_id]
+                stats = self._stats[fingerprint_id] = SlowQueryStats(fingerprint_id, text, statement)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.route = route
+            stats.parameters = redacted
+            stats.last_seen = datetime.now(timezone.utc)
+
+            now = time.monotonic()
+            should_explain = (
+                self.explain
+                and not executemany
+                and conn.dialect.name == "postgresql"
+                and statement.lstrip()[:6].upper() == "SELECT"
+                and now - stats.explained_at >= self.explain_interval
+            )
+            if should_explain:
+                stats.explained_at = now
+
+        if should_explain:
+            # Parameters are copied: the caller's may be reused once it returns
+            if isinstance(parameters, dict):
+                parameters = dict(parameters)
+            elif isinstance(parameters, list):
+                parameters = list(parameters)
+            self._explainer.submit(self._explain, conn.engine, stats, statement, parameters)
+
+    def _explain(self, engine, stats: SlowQueryStats, statement: str, parameters) -> None:
+        """Run EXPLAIN on a raw DBAPI connection of its own (without firing
+        engine events) and roll it back, so nothing it ran is kept."""
+        try:
+            connection = engine.raw_connection()
+        except Exception:
+            logger.exception("Could not EXPLAIN slow query")
+            return
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(explain_statement(statement), parameters)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+                connection.rollback()
+        except Exception:
+            logger.exception("Could not EXPLAIN slow query")
+            return
+        finally:
+            connection.close()
+        with self._lock:
+            stats.explain = plan
+
+    def top(self, limit: int) -> list[SlowQueryStats]:
+        with self._lock:
+            return sorted(self._stats.values(), key=lambda s: s.max_ms, reverse=True)[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
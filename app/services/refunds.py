@@ -0,0 +1,491 @@
+"""Bulk refunds through Transbank.
+
+create_refund_job() snapshots the refundable transactions of a set of links
+into refund_job_items; RefundRunner then works through the pending items:
+
+- at most REFUND_CONCURRENCY Transbank calls in flight, and at most
+  REFUND_RATE_PER_SECOND started per second, per running job;
+- every outcome is committed as soon as it is known, so an interrupted job
+  resumes where it stopped;
+- a job is leased to one worker, which renews the lease from a heartbeat
+  thread while it runs (so slow Transbank calls can't outlast it); a job
+  whose worker died is taken over by the next worker that polls.
+
+When Transbank doesn't answer in time the refund may still have gone
+through, so the item stays pending and its next attempt starts by asking
+Transbank for the remaining balance. While the Webpay circuit breaker is open
+the job pauses instead of failing items.
+
+Pending jobs can also be run without the web app (e.g. from cron):
+
+    python -m app.services.refunds
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Select, and_, case, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.refund import RefundItemStatus, RefundJob, RefundJobItem, RefundJobStatus
+from app.models.transaction import REFUNDABLE_STATUSES, Transaction, TransactionStatus
+from app.services.webpay import WebpayTimeoutError, WebpayUnavailableError, webpay_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Item outcomes that leave it pending
+PAUSED = "paused"
+RETRY = "retry"
+
+ACTIVE_JOB_STATUSES = (RefundJobStatus.PENDING, RefundJobStatus.RUNNING)
+
+
+def create_refund_job(db: Session, user_id: uuid.UUID, link_ids: Select, criteria: dict) -> RefundJob:
+    """Job refunding the remaining balance of every refundable transaction of
+    the links selected by `link_ids` (a SELECT of PaymentLink.id).
+
+    Transactions already pending in another active job are left out, so two
+    jobs never refund the same payment. The caller commits.
+    """
+    in_active_job = (
+        select(RefundJobItem.id)
+        .join(RefundJob, RefundJob.id == RefundJobItem.job_id)
+        .where(
+            RefundJobItem.transaction_id == Transaction.id,
+            RefundJobItem.status == RefundItemStatus.PENDING,
+            RefundJob.status.in_(ACTIVE_JOB_STATUSES),
+        )
+        .exists()
+    )
+    transactions = db.execute(
+        select(Transaction.id, Transaction.created_at, Transaction.amount - Transaction.refunded_amount)
+        .where(
+            Transaction.payment_link_id.in_(link_ids.scalar_subquery()),
+            Transaction.status.in_(REFUNDABLE_STATUSES),
+            ~in_active_job,
+        )
+        .order_by(Transaction.created_at, Transaction.id)
+    ).all()
+
+    job = RefundJob(user_id=user_id, criteria=criteria, total_items=len(transactions))
+    db.add(job)
+    db.flush()
+    if transactions:
+        db.execute(
+            insert(RefundJobItem),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "job_id": job.id,
+                    "transaction_id": transaction_id,
+                    "transaction_created_at": created_at,
+                    "status": RefundItemStatus.PENDING,
+                    "amount": balance,
+                    "attempts": 0,
+                }
+                for transaction_id, created_at, balance in transactions
+            ],
+        )
+    return job
+
+
+def item_counts(db: Session, job_ids: list[uuid.UUID]) -> dict[uuid.UUID, dict[str, int]]:
+    """Items per status, and the amount refunded, for each job."""
+    counts = {job_id: {status.value: 0 for status in RefundItemStatus} | {"refunded_amount": 0} for job_id in job_ids}
+    rows = db.execute(
+        select(RefundJobItem.job_id, RefundJobItem.status, func.count(), func.sum(RefundJobItem.amount))
+        .where(RefundJobItem.job_id.in_(job_ids))
+        .group_by(RefundJobItem.job_id, RefundJobItem.status)
+    )
+    for job_id, status, count, amount in rows:
+        counts[job_id][status.value] = count
+        if status == RefundItemStatus.SUCCEEDED:
+            counts[job_id]["refunded_amount"] = amount or 0
+    return counts
+
+
+class RateLimiter:
+    """Spaces call starts evenly, at most `rate` per second across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _finish_item(db: Session, item_id: uuid.UUID, status: RefundItemStatus, **values) -> None:
+    db.execute(
+        update(RefundJobItem)
+        .where(RefundJobItem.id == item_id, RefundJobItem.status == RefundItemStatus.PENDING)
+        .values(status=status, processed_at=datetime.now(timezone.utc), **values)
+    )
+    db.commit()
+
+
+def _apply_refund(db: Session, item_id: uuid.UUID, item, amount: int, **values) -> None:
+    """Record a refund Transbank accepted on the transaction and the item, atomically."""
+    refunded_amount = Transaction.refunded_amount + amount
+    db.execute(
+        update(Transaction)
+        .where(
+            Transaction.id == item.transaction_id,
+            Transaction.created_at == item.transaction_created_at,
+            Transaction.status.in_(REFUNDABLE_STATUSES),
+        )
+        .values(
+            refunded_amount=refunded_amount,
+            status=case(
+                (
+                    refunded_amount >= Transaction.amount,
+                    literal(TransactionStatus.REFUNDED, Transaction.status.type),
+                ),
+                else_=literal(TransactionStatus.PARTIALLY_REFUNDED, Transaction.status.type),
+            ),
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    _finish_item(db, item_id, RefundItemStatus.SUCCEEDED, amount=amount, error=None, **values)
+
+
+class RefundRunner:
+    def __init__(
+        self,
+        concurrency: int,
+        rate_per_second: float,
+        max_attempts: int,
+        lease_seconds: float,
+        poll_seconds: float,
+    ):
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._running: set[uuid.UUID] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller: threading.Thread | None = None
+
+    # Leases
+
+    def _claim(self, db: Session, job_id: uuid.UUID) -> bool:
+        now = datetime.now(timezone.utc)
+        result = db.execute(
+            update(RefundJob)
+            .where(
+                RefundJob.id == job_id,
+                or_(
+                    RefundJob.status == RefundJobStatus.PENDING,
+                    and_(
+                        RefundJob.status == RefundJobStatus.RUNNING,
+                        or_(RefundJob.lease_expires_at.is_(None), RefundJob.lease_expires_at < now),
+                    ),
+                ),
+            )
+            .values(
+                status=RefundJobStatus.RUNNING,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                started_at=func.coalesce(RefundJob.started_at, now),
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def _renew(self, db: Session, job_id: uuid.UUID) -> bool:
+        """Extend the lease; False once the job was cancelled."""
+        result = db.execute(
+            update(RefundJob)
+            .where(RefundJob.id == job_id, RefundJob.status == RefundJobStatus.RUNNING)
+            .values(lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def _release(self, db: Session, job_id: uuid.UUID, completed: bool) -> None:
+        now = datetime.now(timezone.utc)
+        if completed:
+            values = {"status": RefundJobStatus.COMPLETED, "finished_at": now, "lease_expires_at": None}
+        else:
+            # Any worker may resume it right away
+            values = {"lease_expires_at": now}
+        db.execute(
+            update(RefundJob)
+            .where(RefundJob.id == job_id, RefundJob.status == RefundJobStatus.RUNNING)
+            .values(**values),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+
+    # Items
+
+    def refund_item(self, item_id: uuid.UUID) -> str:
+        """Refund one pending item; returns its outcome (or PAUSED / RETRY)."""
+        with SessionLocal() as db:
+            item = db.execute(
+                select(
+                    RefundJobItem.transaction_id,
+                    RefundJobItem.transaction_created_at,
+                    RefundJobItem.attempts,
+                    Transaction.token,
+                    Transaction.status,
+                    (Transaction.amount - Transaction.refunded_amount).label("balance"),
+                )
+                .join(
+                    Transaction,
+                    and_(
+                        Transaction.id == RefundJobItem.transaction_id,
+                        Transaction.created_at == RefundJobItem.transaction_created_at,
+                    ),
+                )
+                .where(RefundJobItem.id == item_id, RefundJobItem.status == RefundItemStatus.PENDING)
+            ).first()
+            if item is None:
+                return RefundItemStatus.SKIPPED.value
+            if item.status not in REFUNDABLE_STATUSES or item.balance <= 0 or not item.token:
+                _finish_item(db, item_id, RefundItemStatus.SKIPPED, amount=0, error="Sin saldo por reembolsar")
+                return RefundItemStatus.SKIPPED.value
+
+            if item.attempts > 0:
+                # An earlier attempt may have gone through without an answer
+                try:
+                    status = webpay_service.transaction_status(item.token)
+                except WebpayUnavailableError:
+                    return PAUSED
+                except Exception as e:
+                    logger.warning(f"Refund item {item_id}: status check failed: {e}")
+                    if item.attempts >= self.max_attempts:
+                        _finish_item(
+                            db, item_id, RefundItemStatus.FAILED,
+                            error=f"No se pudo verificar el reembolso en Transbank: {e}"[:500],
+                        )
+                        return RefundItemStatus.FAILED.value
+                    db.execute(
+                        update(RefundJobItem)
+                        .where(RefundJobItem.id == item_id)
+                        .values(attempts=RefundJobItem.attempts + 1)
+                    )
+                    db.commit()
+                    return RETRY
+                remote_balance = 0 if status.get("status") in ("REVERSED", "NULLIFIED") else status.get("balance")
+                if remote_balance is not None and remote_balance < item.balance:
+                    _apply_refund(db, item_id, item, item.balance - remote_balance, refund_type=status.get("status"))
+                    return RefundItemStatus.SUCCEEDED.value
+                if item.attempts >= self.max_attempts:
+                    _finish_item(
+                        db, item_id, RefundItemStatus.FAILED,
+                        error=f"Transbank no respondió tras {item.attempts} intentos",
+                    )
+                    return RefundItemStatus.FAILED.value
+
+            # Counted before calling, so a crash mid-call also triggers the status check
+            db.execute(
+                update(RefundJobItem)
+                .where(RefundJobItem.id == item_id)
+                .values(attempts=RefundJobItem.attempts + 1)
+            )
+            db.commit()
+
+            try:
+                response = webpay_service.refund_transaction(item.token, item.balance)
+            except WebpayUnavailableError:
+                # Never reached Transbank
+                db.execute(
+                    update(RefundJobItem)
+                    .where(RefundJobItem.id == item_id)
+                    .values(attempts=RefundJobItem.attempts - 1)
+                )
+                db.commit()
+                return PAUSED
+            except WebpayTimeoutError:
+                logger.warning(f"Refund item {item_id}: Transbank timed out")
+                return RETRY
+            except Exception as e:
+                logger.error(f"Refund item {item_id} failed: {e}")
+                _finish_item(db, item_id, RefundItemStatus.FAILED, error=str(e)[:500])
+                return RefundItemStatus.FAILED.value
+
+            result = {
+                "refund_type": response.get("type"),
+                "authorization_code": response.get("authorization_code"),
+                "response_code": response.get("response_code"),
+            }
+            if not webpay_service.is_refunded(response):
+                _finish_item(db, item_id, RefundItemStatus.FAILED, error="Reembolso rechazado por Transbank", **result)
+                return RefundItemStatus.FAILED.value
+            _apply_refund(db, item_id, item, response.get("nullified_amount") or item.balance, **result)
+            return RefundItemStatus.SUCCEEDED.value
+
+    # Jobs
+
+    def _keep_lease(self, job_id: uuid.UUID, done: threading.Event, cancelled: threading.Event) -> None:
+        """Renew the lease every third of its length until `done`, however
+        long the items in flight take; sets `cancelled` once the job is."""
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                with SessionLocal() as db:
+                    renewed = self._renew(db, job_id)
+            except Exception as e:
+                # The lease is still valid for a while: try again next beat
+                logger.error(f"Refund job {job_id}: lease renewal failed: {e}")
+                continue
+            if not renewed:
+                cancelled.set()
+                return
+
+    def run_job(self, job_id: uuid.UUID) -> bool:
+        """Process a job until it has no pending items, is cancelled or the
+        runner stops. Returns False if another worker holds it."""
+        with SessionLocal() as db:
+            if not self._claim(db, job_id):
+                return False
+            logger.info(f"Refund job {job_id} started")
+
+            rate_limiter = RateLimiter(self.rate_per_second)
+            done = threading.Event()
+            cancelled = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._keep_lease, args=(job_id, done, cancelled), name=f"refund-lease-{job_id}", daemon=True
+            )
+            heartbeat.start()
+
+            def process(item_id: uuid.UUID) -> str:
+                if self._stop.is_set() or cancelled.is_set():
+                    return PAUSED
+                if webpay_service.breaker.is_open:
+                    return PAUSED
+                rate_limiter.wait()
+                try:
+                    return self.refund_item(item_id)
+                except Exception as e:
+                    # Left pending (database error...): retried in the next batch
+                    logger.error(f"Refund item {item_id} failed unexpectedly: {e}")
+                    return RETRY
+
+            completed = False
+            try:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="refund") as pool:
+                    while not self._stop.is_set():
+                        item_ids = db.execute(
+                            select(RefundJobItem.id)
+                            .where(RefundJobItem.job_id == job_id, RefundJobItem.status == RefundItemStatus.PENDING)
+                            .order_by(RefundJobItem.transaction_created_at, RefundJobItem.id)
+                            # Small batches keep cancellation prompt
+                            .limit(self.concurrency * 4)
+                        ).scalars().all()
+                        db.commit()
+                        if not item_ids:
+                            completed = True
+                            break
+
+                        outcomes = list(pool.map(process, item_ids))
+                        if cancelled.is_set() or not self._renew(db, job_id):
+                            logger.info(f"Refund job {job_id} cancelled")
+                            return True
+                        if PAUSED in outcomes:
+                            # Wait for the circuit breaker to let calls through again
+                            self._stop.wait(webpay_service.breaker.open_seconds)
+                        elif RETRY in outcomes and len(set(outcomes)) == 1:
+                            # Nothing but timeouts: back off before the next round
+                            self._stop.wait(min(self.lease_seconds / 2, 5))
+            finally:
+                done.set()
+                heartbeat.join()
+
+            self._release(db, job_id, completed)
+            logger.info(f"Refund job {job_id} {'completed' if completed else 'paused'}")
+            return True
+
+    def _run_in_thread(self, job_id: uuid.UUID) -> None:
+        try:
+            self.run_job(job_id)
+        except Exception as e:
+            logger.error(f"Refund job {job_id} crashed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def submit(self, job_id: uuid.UUID) -> None:
+        """Run a job in the background in this process."""
+        with self._lock:
+            if job_id in self._running:
+                return
+            self._running.add(job_id)
+        threading.Thread(target=self._run_in_thread, args=(job_id,), name=f"refund-job-{job_id}", daemon=True).start()
+
+    def claimable_jobs(self, db: Session) -> list[uuid.UUID]:
+        now = datetime.now(timezone.utc)
+        return db.execute(
+            select(RefundJob.id)
+            .where(
+                or_(
+                    RefundJob.status == RefundJobStatus.PENDING,
+                    and_(RefundJob.status == RefundJobStatus.RUNNING, RefundJob.lease_expires_at < now),
+                )
+            )
+            .order_by(RefundJob.created_at)
+        ).scalars().all()
+
+    def resume_jobs(self) -> None:
+        with SessionLocal() as db:
+            job_ids = self.claimable_jobs(db)
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    def _poll(self) -> None:
+        while True:
+            try:
+                self.resume_jobs()
+            except Exception as e:
+                logger.error(f"Refund job poll failed: {e}")
+            if self._stop.wait(self.poll_seconds):
+                return
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, name="refund-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        """Stop taking new items; running jobs release their lease after the current batch."""
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+            self._poller = None
+
+
+refund_runner = RefundRunner(
+    concurrency=settings.refund_concurrency,
+    rate_per_second=settings.refund_rate_per_second,
+    max_attempts=settings.refund_max_attempts,
+    lease_seconds=settings.refund_lease_seconds,
+    poll_seconds=settings.refund_poll_seconds,
+)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        job_ids = refund_runner.claimable_jobs(db)
+    for job_id in job_ids:
+        refund_runner.run_job(job_id)
+    logger.info(f"Ran {len(job_ids)} refund jobs")
+
+
+if __name__ == "__main__":
+    main()
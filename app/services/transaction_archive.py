@@ -0,0 +1,127 @@
+"""Maintenance job for the partitioned transactions table.
+
+Run periodically (e.g. daily from cron):
+
+    python -m app.services.transaction_archive
+"""
+import logging
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from sqlalchemy import null, select, text, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.transaction import Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_transaction_partitions(db: Session, months_ahead: int) -> None:
+    """Create the monthly partitions up to `months_ahead` months from now."""
+    if db.get_bind().dialect.name != "postgresql":
+        # Only Postgres partitions the table
+        return
+    db.execute(
+        text("SELECT ensure_transaction_partitions(:months_ahead)"),
+        {"months_ahead": months_ahead},
+    )
+    db.commit()
+
+
+def compress_webpay_response(response: dict) -> bytes:
+    return zlib.compress(orjson.dumps(response), 9)
+
+
+def decompress_webpay_response(data: bytes) -> dict:
+    return orjson.loads(zlib.decompress(data))
+
+
+def get_webpay_response(db: Session, transaction_id: uuid.UUID, created_at: datetime) -> dict | None:
+    """Raw Webpay response of a transaction, from the table or, once
+    archive_webpay_responses() moved it, from transaction_archives."""
+    response = db.scalar(
+        select(Transaction.webpay_response).where(
+            Transaction.id == transaction_id, Transaction.created_at == created_at
+        )
+    )
+    if response is not None:
+        return response
+    archived = db.scalar(
+        select(TransactionArchive.webpay_response).where(TransactionArchive.transaction_id == transaction_id)
+    )
+    return decompress_webpay_response(archived) if archived is not None else None
+
+
+def archive_webpay_responses(db: Session, older_than_days: int, batch_size: int) -> int:
+    """Move raw Webpay responses older than the cutoff to transaction_archives.
+
+    Walks the old partitions in (created_at, id) order, one committed batch
+    at a time, so it can be interrupted and re-run safely.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    archived = 0
+    last_key = None
+
+    while True:
+        query = (
+            select(Transaction.id, Transaction.created_at, Transaction.webpay_response)
+            .where(
+                Transaction.created_at < cutoff,
+                Transaction.webpay_response.isnot(None),
+            )
+            .order_by(Transaction.created_at, Transaction.id)
+            .limit(batch_size)
+        )
+        if last_key is not None:
+            query = query.where(tuple_(Transaction.created_at, Transaction.id) > last_key)
+
+        rows = db.execute(query).all()
+        if not rows:
+            break
+
+        db.add_all(
+            TransactionArchive(
+                transaction_id=row.id,
+                transaction_created_at=row.created_at,
+                webpay_response=compress_webpay_response(row.webpay_response),
+            )
+            for row in rows
+        )
+        db.execute(
+            update(Transaction)
+            .where(
+                Transaction.id.in_([row.id for row in rows]),
+                Transaction.created_at < cutoff,
+            )
+            .values(webpay_response=null()),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+
+        archived += len(rows)
+        last_key = (rows[-1].created_at, rows[-1].id)
+
+    return archived
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+
+    with SessionLocal() as db:
+        ensure_transaction_partitions(db, settings.transaction_partitions_ahead)
+        archived = archive_webpay_responses(
+            db,
+            older_than_days=settings.webpay_response_archive_days,
+            batch_size=settings.webpay_response_archive_batch_size,
+        )
+
+    logger.info(f"Archived {archived} Webpay responses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import uuid
+from datetime import date, datetime, timezone
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.payment_link import PaymentLink
+from app.models.visitor_sketch import LinkVisitorSketch
+from app.services.hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+VISITOR_KEY_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def visitor_key(visitor_id: str | None, client_ip: str | None, user_agent: str | None) -> str:
+    """Hashed visitor identity.
+
+    A first visit is keyed by its IP and user agent, and that key becomes
+    its visitor cookie: clients that never send the cookie back (bots) keep
+    the same key on every hit, and browsers keep theirs when the IP changes.
+    """
+    if visitor_id is not None and VISITOR_KEY_RE.fullmatch(visitor_id):
+        return visitor_id
+    raw = f"{client_ip}|{user_agent}"
+    return hashlib.blake2b(raw.encode(), key=settings.secret_key.encode()[:64], digest_size=16).hexdigest()
+
+
+def _merge_daily(db: Session, link_id: uuid.UUID, day: date, sketch: HyperLogLog) -> None:
+    row = (
+        db.query(LinkVisitorSketch)
+        .filter(LinkVisitorSketch.payment_link_id == link_id, LinkVisitorSketch.day == day)
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        try:
+            with db.begin_nested():
+                db.add(LinkVisitorSketch(payment_link_id=link_id, day=day, registers=sketch.to_bytes()))
+            return
+        except IntegrityError:
+            # Another worker inserted it first
+            row = (
+                db.query(LinkVisitorSketch)
+                .filter(LinkVisitorSketch.payment_link_id == link_id, LinkVisitorSketch.day == day)
+                .with_for_update()
+                .one()
+            )
+    merged = HyperLogLog.from_bytes(row.registers)
+    merged.merge(sketch)
+    row.registers = merged.to_bytes()
+
+
+class VisitorCounter:
+    """Per-link, per-day HyperLogLog sketches buffered in memory.
+
+    Visits only touch the in-memory sketches; flush() merges them into
+    link_visitor_sketches and the link's all-time sketch in one batch.
+    Memory is bounded by max_pending sketches of 4 KB each.
+    """
+
+    def __init__(self, max_pending: int, flush_seconds: float):
+        self.max_pending = max_pending
+        self.flush_seconds = flush_seconds
+        self._pending: dict[tuple[uuid.UUID, date], HyperLogLog] = {}
+        self._lock = threading.Lock()
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    def add(self, link_id: uuid.UUID, key: str) -> None:
+        day = datetime.now(timezone.utc).date()
+        with self._lock:
+            sketch = self._pending.get((link_id, day))
+            if sketch is None:
+                sketch = self._pending[(link_id, day)] = HyperLogLog()
+            sketch.add(key)
+            full = len(self._pending) >= self.max_pending
+        if full and self._loop is not None:
+            # Called from request threads
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self._write(pending)
+        except Exception:
+            # Keep the visits for the next flush
+            with self._lock:
+                for key, sketch in pending.items():
+                    current = self._pending.get(key)
+                    if current is not None:
+                        sketch.merge(current)
+                    self._pending[key] = sketch
+            raise
+        return len(pending)
+
+    def _write(self, pending: dict[tuple[uuid.UUID, date], HyperLogLog]) -> None:
+        by_link: dict[uuid.UUID, HyperLogLog] = {}
+        for (link_id, _), sketch in pending.items():
+            by_link.setdefault(link_id, HyperLogLog()).merge(sketch)
+
+        with SessionLocal() as db:
+            # Lock order (links, then daily rows by key) avoids deadlocks between workers
+            links = (
+                db.query(PaymentLink)
+                .options(load_only(PaymentLink.visitors_sketch, PaymentLink.unique_visitors))
+                .filter(PaymentLink.id.in_(by_link))
+                .order_by(PaymentLink.id)
+                .with_for_update()
+                .all()
+            )
+            for link in links:
+                total = HyperLogLog.from_bytes(link.visitors_sketch) if link.visitors_sketch else HyperLogLog()
+                total.merge(by_link[link.id])
+                link.visitors_sketch = total.to_bytes()
+                link.unique_visitors = total.count()
+
+            existing = {link.id for link in links}
+            for (link_id, day), sketch in sorted(pending.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+                if link_id in existing:
+                    _merge_daily(db, link_id, day, sketch)
+            db.commit()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception as e:
+                logger.error(f"Visitor sketch flush failed: {e}")
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await run_in_threadpool(self.flush)
+        except Exception as e:
+            logger.error(f"Visitor sketch flush failed: {e}")
+
+
+visitor_counter = VisitorCounter(
+    max_pending=settings.visitor_sketch_max_pending,
+    flush_seconds=settings.visitor_sketch_flush_seconds,
+)
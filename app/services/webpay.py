@@ -1,16 +1,173 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
 from transbank.webpay.webpay_plus.transaction import Transaction
 from transbank.common.options import WebpayOptions
 from transbank.common.integration_commerce_codes import IntegrationCommerceCodes
 from transbank.common.integration_api_keys import IntegrationApiKeys
+from transbank.error.transbank_error import TransbankError
 
 from app.config import get_settings
+from app.services.profiling import Span
+from app.services.webpay_simulator import ABORTED, APPROVED, REJECTED, TIMEOUT, SimulatedWebpay
+
+logger = logging.getLogger(__name__)
+
+
+class WebpayUnavailableError(Exception):
+    """Raised without calling Transbank while the circuit breaker is open."""
+
+
+class WebpayTimeoutError(Exception):
+    """Transbank did not answer within the operation's latency budget."""
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Whether an error counts against Transbank's health.
+
+    A 4xx answer (invalid token, transaction already locked, invalid refund
+    amount) is caused by the request, not by an outage: a burst of them must
+    not open the breaker for every other payment.
+    """
+    code = getattr(error, "code", None)
+    return not (isinstance(error, TransbankError) and isinstance(code, int) and 400 <= code < 500)
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for calls to Transbank.
+
+    Opens when, over the last `window_seconds`, at least `min_calls` calls
+    were made and the share of failed or slow calls reaches `error_rate`.
+    After `open_seconds` a single probe call is let through (half-open);
+    its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        window_seconds: float,
+        min_calls: int,
+        error_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        # (timestamp, healthy, latency) of recent calls
+        self._window: deque[tuple[float, bool, float]] = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+    def _open(self, now: float) -> None:
+        if self.state != self.OPEN:
+            logger.warning("Webpay circuit breaker opened")
+        self.state = self.OPEN
+        self.opened_at = now
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.open_seconds
+
+    def before_call(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    raise WebpayUnavailableError("Webpay circuit breaker is open")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise WebpayUnavailableError("Webpay circuit breaker probe in progress")
+                self._probe_in_flight = True
+
+    def record(self, success: bool, latency: float) -> None:
+        healthy = success and latency <= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN and self._probe_in_flight:
+                self._probe_in_flight = False
+                if healthy:
+                    logger.info("Webpay circuit breaker closed")
+                    self.state = self.CLOSED
+                    self._window.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._window.append((now, healthy, latency))
+            self._prune(now)
+            if self.state == self.CLOSED and len(self._window) >= self.min_calls:
+                unhealthy = sum(1 for _, ok, _ in self._window if not ok)
+                if unhealthy / len(self._window) >= self.error_rate:
+                    self._open(now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._window)
+            unhealthy = sum(1 for _, ok, _ in self._window if not ok)
+            latencies = sorted(latency for _, _, latency in self._window)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "error_rate": unhealthy / calls if calls else 0.0,
+                "latency_p95_seconds": latencies[int(0.95 * (calls - 1))] if calls else 0.0,
+            }
 
 
 class WebpayService:
     def __init__(self):
         settings = get_settings()
 
-        if settings.webpay_environment == "integration":
+        self.create_timeout = settings.webpay_create_timeout_seconds
+        self.commit_timeout = settings.webpay_commit_timeout_seconds
+        self.refund_timeout = settings.webpay_refund_timeout_seconds
+        self.status_timeout = settings.webpay_status_timeout_seconds
+        self.breaker = CircuitBreaker(
+            window_seconds=settings.webpay_breaker_window_seconds,
+            min_calls=settings.webpay_breaker_min_calls,
+            error_rate=settings.webpay_breaker_error_rate,
+            slow_call_seconds=settings.webpay_breaker_slow_call_seconds,
+            open_seconds=settings.webpay_breaker_open_seconds,
+        )
+        # The SDK has no timeout option; calls run here so callers can stop waiting
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.webpay_max_concurrency, thread_name_prefix="webpay"
+        )
+        self.calls: Counter[tuple[str, str]] = Counter()
+
+        if settings.webpay_environment == "simulated":
+            self.tx = SimulatedWebpay(
+                form_url=f"{settings.app_url}/api/v1/simulator/webpay",
+                ratios={
+                    APPROVED: settings.webpay_simulator_approve_ratio,
+                    REJECTED: settings.webpay_simulator_reject_ratio,
+                    ABORTED: settings.webpay_simulator_abort_ratio,
+                    TIMEOUT: settings.webpay_simulator_timeout_ratio,
+                },
+                latency_median_ms=settings.webpay_simulator_latency_median_ms,
+                latency_sigma=settings.webpay_simulator_latency_sigma,
+                error_ratio=settings.webpay_simulator_error_ratio,
+            )
+        elif settings.webpay_environment == "integration":
             self.tx = Transaction(
                 WebpayOptions(
                     commerce_code=IntegrationCommerceCodes.WEBPAY_PLUS,
@@ -25,6 +182,34 @@ class WebpayService:
                 )
             )
 
+    def _call(self, operation: str, timeout: float, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        try:
+            self.breaker.before_call()
+        except WebpayUnavailableError:
+            self.calls[(operation, "rejected")] += 1
+            raise
+
+        start = time.monotonic()
+        future = self._executor.submit(fn, *args, **kwargs)
+        try:
+            with Span("webpay"):
+                result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Still queued: make sure it never reaches Transbank after the caller gave up
+            future.cancel()
+            self.breaker.record(False, time.monotonic() - start)
+            self.calls[(operation, "timeout")] += 1
+            raise WebpayTimeoutError(f"Webpay {operation} timed out after {timeout}s")
+        except Exception as e:
+            failure = is_upstream_failure(e)
+            self.breaker.record(not failure, time.monotonic() - start)
+            self.calls[(operation, "failure" if failure else "client_error")] += 1
+            raise
+
+        self.breaker.record(True, time.monotonic() - start)
+        self.calls[(operation, "success")] += 1
+        return result
+
     def create_transaction(
         self,
         buy_order: str,
@@ -32,7 +217,10 @@ class WebpayService:
         amount: int,
         return_url: str,
     ) -> dict:
-        response = self.tx.create(
+        response = self._call(
+            "create",
+            self.create_timeout,
+            self.tx.create,
             buy_order=buy_order,
             session_id=session_id,
             amount=amount,
@@ -44,7 +232,7 @@ class WebpayService:
         return {"token": response.token, "url": response.url}
 
     def commit_transaction(self, token: str) -> dict:
-        response = self.tx.commit(token)
+        response = self._call("commit", self.commit_timeout, self.tx.commit, token)
         # SDK v5 returns dict, normalize to dict for consistency
         if not isinstance(response, dict):
             response = response.__dict__
@@ -64,5 +252,66 @@ class WebpayService:
             and commit_response.get("status") == "AUTHORIZED"
         )
 
+    def refund_transaction(self, token: str, amount: int) -> dict:
+        """Refund `amount` of an authorized transaction.
+
+        Transbank reverses full refunds made shortly after the payment and
+        nullifies everything else; only nullifications carry a response code.
+        """
+        response = self._call("refund", self.refund_timeout, self.tx.refund, token, amount)
+        if not isinstance(response, dict):
+            response = response.__dict__
+
+        fields = [
+            "type", "authorization_code", "authorization_date",
+            "nullified_amount", "balance", "response_code",
+        ]
+        return {field: response.get(field) for field in fields}
+
+    def is_refunded(self, refund_response: dict) -> bool:
+        if refund_response.get("type") == "REVERSED":
+            return True
+        return refund_response.get("type") == "NULLIFIED" and refund_response.get("response_code") == 0
+
+    def transaction_status(self, token: str) -> dict:
+        """Current state of a transaction; once committed it carries the
+        same fields as the commit response, plus the refundable balance."""
+        response = self._call("status", self.status_timeout, self.tx.status, token)
+        if not isinstance(response, dict):
+            response = response.__dict__
+
+        fields = [
+            "vci", "amount", "status", "balance", "buy_order", "session_id",
+            "accounting_date", "transaction_date", "authorization_code",
+            "payment_type_code", "response_code", "installments_number",
+        ]
+        result = {field: response.get(field) for field in fields}
+        result["card_detail"] = response.get("card_detail", {})
+        return result
+
+    def prometheus_metrics(self) -> str:
+        """Breaker state and call counters in Prometheus text format."""
+        snapshot = self.breaker.snapshot()
+        states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        lines = [
+            "# HELP webpay_circuit_state Circuit breaker state (0=closed, 1=half-open, 2=open)",
+            "# TYPE webpay_circuit_state gauge",
+            f"webpay_circuit_state {states[snapshot['state']]}",
+            "# HELP webpay_window_calls Calls in the breaker's rolling window",
+            "# TYPE webpay_window_calls gauge",
+            f"webpay_window_calls {snapshot['window_calls']}",
+            "# HELP webpay_error_rate Share of failed or slow calls in the rolling window",
+            "# TYPE webpay_error_rate gauge",
+            f"webpay_error_rate {snapshot['error_rate']:.4f}",
+            "# HELP webpay_latency_p95_seconds 95th percentile latency in the rolling window",
+            "# TYPE webpay_latency_p95_seconds gauge",
+            f"webpay_latency_p95_seconds {snapshot['latency_p95_seconds']:.4f}",
+            "# HELP webpay_calls_total Calls to Transbank by operation and outcome",
+            "# TYPE webpay_calls_total counter",
+        ]
+        for (operation, outcome), count in sorted(self.calls.items()):
+            lines.append(f'webpay_calls_total{{operation="{operation}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
 
 webpay_service = WebpayService()
@@ -0,0 +1,189 @@
+"""In-process stand-in for Webpay Plus (WEBPAY_ENVIRONMENT=simulated).
+
+Implements the create/commit/refund/status calls used by WebpayService,
+with random latency, and the payment form at /api/v1/simulator/webpay that sends the
+buyer back to the return URL. Each token's outcome (approved, rejected,
+aborted or timed out) is derived from a hash of the token, so every worker
+agrees on it without sharing state.
+"""
+import hashlib
+import math
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from transbank.error.transaction_commit_error import TransactionCommitError
+from transbank.error.transaction_create_error import TransactionCreateError
+from transbank.error.transaction_refund_error import TransactionRefundError
+from transbank.error.transaction_status_error import TransactionStatusError
+
+APPROVED = "approved"
+REJECTED = "rejected"
+ABORTED = "aborted"
+TIMEOUT = "timeout"
+
+MAX_TRACKED_TOKENS = 100_000
+# Full refunds within this long of the commit are reversals; anything else is a nullification
+REVERSAL_WINDOW_SECONDS = 3 * 3600
+
+
+@dataclass
+class SimulatedPayment:
+    buy_order: str
+    session_id: str
+    amount: int
+    return_url: str
+    committed: bool = False
+    committed_at: float | None = None
+    authorization_code: str | None = None
+    refunded: int = 0
+
+
+class SimulatedWebpay:
+    """Drop-in replacement for the SDK's webpay_plus Transaction."""
+
+    def __init__(
+        self,
+        form_url: str,
+        ratios: dict[str, float],
+        latency_median_ms: float,
+        latency_sigma: float,
+        error_ratio: float = 0.0,
+    ):
+        total = sum(ratios.values())
+        if total <= 0:
+            raise ValueError("At least one simulated outcome ratio must be positive")
+        self.form_url = form_url
+        # Cumulative thresholds over [0, 1) in a fixed order
+        self._thresholds: list[tuple[float, str]] = []
+        cumulative = 0.0
+        for outcome in (APPROVED, REJECTED, ABORTED, TIMEOUT):
+            cumulative += ratios.get(outcome, 0.0) / total
+            self._thresholds.append((cumulative, outcome))
+        self.latency_mu = math.log(max(latency_median_ms, 0.001) / 1000)
+        self.latency_sigma = latency_sigma
+        self.error_ratio = error_ratio
+        self._payments: OrderedDict[str, SimulatedPayment] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def outcome(self, token: str) -> str:
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        point = int.from_bytes(digest, "big") / 2**64
+        for threshold, outcome in self._thresholds:
+            if point < threshold:
+                return outcome
+        return self._thresholds[-1][1]
+
+    def payment(self, token: str) -> SimulatedPayment | None:
+        with self._lock:
+            return self._payments.get(token)
+
+    def _wait(self) -> None:
+        time.sleep(random.lognormvariate(self.latency_mu, self.latency_sigma))
+
+    def _maybe_fail(self, error: type[Exception], operation: str) -> None:
+        if self.error_ratio and random.random() < self.error_ratio:
+            raise error(f"Simulated Webpay {operation} error", 500)
+
+    def create(self, buy_order: str, session_id: str, amount: int, return_url: str) -> dict:
+        self._wait()
+        self._maybe_fail(TransactionCreateError, "create")
+        token = secrets.token_hex(32)
+        with self._lock:
+            self._payments[token] = SimulatedPayment(buy_order, session_id, amount, return_url)
+            while len(self._payments) > MAX_TRACKED_TOKENS:
+                self._payments.popitem(last=False)
+        return {"token": token, "url": self.form_url}
+
+    def commit(self, token: str) -> dict:
+        self._wait()
+        self._maybe_fail(TransactionCommitError, "commit")
+        approved = self.outcome(token) == APPROVED
+        authorization_code = f"{random.randrange(1_000_000):06d}" if approved else "000000"
+        with self._lock:
+            payment = self._payments.get(token)
+            if payment is not None:
+                if payment.committed:
+                    raise TransactionCommitError("Transaction already locked by another process", 422)
+                payment.committed = True
+                payment.committed_at = time.monotonic()
+                payment.authorization_code = authorization_code
+        return self._details(token, payment, authorization_code)
+
+    def _details(self, token: str, payment: SimulatedPayment | None, authorization_code: str | None) -> dict:
+        approved = self.outcome(token) == APPROVED
+        now = datetime.now(timezone.utc)
+        return {
+            "vci": "TSY" if approved else "TSN",
+            "amount": payment.amount if payment else None,
+            "status": "AUTHORIZED" if approved else "FAILED",
+            "buy_order": payment.buy_order if payment else None,
+            "session_id": payment.session_id if payment else None,
+            "card_detail": {"card_number": "6623"},
+            "accounting_date": now.strftime("%m%d"),
+            "transaction_date": now.isoformat(),
+            "authorization_code": authorization_code,
+            "payment_type_code": "VN",
+            "response_code": 0 if approved else -1,
+            "installments_number": 0,
+        }
+
+    def refund(self, token: str, amount: int) -> dict:
+        self._wait()
+        self._maybe_fail(TransactionRefundError, "refund")
+        if self.outcome(token) != APPROVED:
+            raise TransactionRefundError("Transaction is not authorized", 422)
+        with self._lock:
+            payment = self._payments.get(token)
+            if payment is None:
+                # Committed by another worker (or before a restart): take the first refund as the full amount
+                payment = self._payments[token] = SimulatedPayment("", "", amount, "", committed=True)
+            balance = payment.amount - payment.refunded
+            if amount <= 0 or amount > balance:
+                raise TransactionRefundError(f"Invalid refund amount {amount}, balance is {balance}", 422)
+            payment.refunded += amount
+            balance -= amount
+            reversal = (
+                payment.committed_at is not None
+                and payment.refunded == payment.amount
+                and time.monotonic() - payment.committed_at < REVERSAL_WINDOW_SECONDS
+            )
+
+        if reversal:
+            return {"type": "REVERSED"}
+        return {
+            "type": "NULLIFIED",
+            "authorization_code": f"{random.randrange(1_000_000):06d}",
+            "authorization_date": datetime.now(timezone.utc).isoformat(),
+            "nullified_amount": amount,
+            "balance": balance,
+            "response_code": 0,
+        }
+
+    def status(self, token: str) -> dict:
+        self._wait()
+        self._maybe_fail(TransactionStatusError, "status")
+        with self._lock:
+            payment = self._payments.get(token)
+        approved = self.outcome(token) == APPROVED
+        if payment is None:
+            # Committed by another worker (or before a restart): amounts and code unknown
+            return self._details(token, None, None) | {"balance": None}
+        if not payment.committed:
+            return {
+                "status": "INITIALIZED",
+                "amount": payment.amount,
+                "balance": None,
+                "buy_order": payment.buy_order,
+                "session_id": payment.session_id,
+                "response_code": None,
+            }
+        details = self._details(token, payment, payment.authorization_code)
+        details["balance"] = payment.amount - payment.refunded if approved else None
+        if approved and payment.refunded:
+            details["status"] = "PARTIALLY_NULLIFIED" if payment.refunded < payment.amount else "NULLIFIED"
+        return details
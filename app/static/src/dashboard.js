@@ -0,0 +1,166 @@
+const API_URL = '/api/v1/links';
+
+async function loadUser() {
+    const res = await fetch('/auth/me');
+    if (res.ok) {
+        const user = await res.json();
+        document.getElementById('user-name').textContent = user.name;
+    }
+}
+
+function getFilterParams() {
+    const formData = new FormData(document.getElementById('filter-form'));
+    const params = new URLSearchParams();
+    for (const [key, value] of formData) {
+        if (value) params.append(key, value);
+    }
+    return params.toString();
+}
+
+let links = [];
+
+async function loadLinks() {
+    const params = getFilterParams();
+    const res = await fetch(params ? `${API_URL}?${params}` : API_URL);
+    links = await res.json();
+    renderLinks();
+}
+
+function renderLinks() {
+    const container = document.getElementById('links-list');
+
+    if (links.length === 0) {
+        container.innerHTML = '<p class="text-gray-500 text-center py-8">No tienes links creados</p>';
+        return;
+    }
+
+    // Stats
+    const active = links.filter(l => l.status === 'active').length;
+    const paid = links.filter(l => l.status === 'paid').length;
+    const total = links.filter(l => l.status === 'paid').reduce((sum, l) => sum + l.amount, 0);
+
+    document.getElementById('stat-active').textContent = active;
+    document.getElementById('stat-paid').textContent = paid;
+    document.getElementById('stat-total').textContent = '$' + total.toLocaleString('es-CL');
+
+    container.innerHTML = links.map(link => `
+        <div class="bg-white rounded-xl p-4 shadow-sm flex items-center justify-between">
+            <div class="flex-1">
+                <div class="flex items-center gap-2 mb-1">
+                    <span class="font-medium text-gray-900">${link.description}</span>
+                    <span class="px-2 py-0.5 text-xs rounded-full ${getStatusColor(link.status)}">${getStatusText(link.status)}</span>
+                </div>
+                <p class="text-lg font-bold text-gray-900">$${link.amount.toLocaleString('es-CL')}</p>
+                <p class="text-sm text-gray-500">${link.views_count} visitas · ${link.unique_visitors} visitantes únicos</p>
+            </div>
+            <div class="flex items-center gap-2">
+                <button onclick="copyLink('${link.slug}')" class="p-2 text-gray-500 hover:text-primary" title="Copiar link">
+                    <svg class="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M8 16H6a2 2 0 01-2-2V6a2 2 0 012-2h8a2 2 0 012 2v2m-6 12h8a2 2 0 002-2v-8a2 2 0 00-2-2h-8a2 2 0 00-2 2v8a2 2 0 002 2z"/>
+                    </svg>
+                </button>
+                ${link.status === 'active' ? `
+                <button onclick="deleteLink('${link.id}')" class="p-2 text-gray-500 hover:text-red-500" title="Cancelar">
+                    <svg class="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M19 7l-.867 12.142A2 2 0 0116.138 21H7.862a2 2 0 01-1.995-1.858L5 7m5 4v6m4-6v6m1-10V4a1 1 0 00-1-1h-4a1 1 0 00-1 1v3M4 7h16"/>
+                    </svg>
+                </button>
+                ` : ''}
+            </div>
+        </div>
+    `).join('');
+}
+
+function getStatusColor(status) {
+    switch(status) {
+        case 'active': return 'bg-blue-100 text-blue-700';
+        case 'paid': return 'bg-green-100 text-green-700';
+        case 'expired': return 'bg-gray-100 text-gray-700';
+        case 'cancelled': return 'bg-red-100 text-red-700';
+        default: return 'bg-gray-100 text-gray-700';
+    }
+}
+
+function getStatusText(status) {
+    switch(status) {
+        case 'active': return 'Activo';
+        case 'paid': return 'Pagado';
+        case 'expired': return 'Expirado';
+        case 'cancelled': return 'Cancelado';
+        default: return status;
+    }
+}
+
+function copyLink(slug) {
+    const url = `${window.location.origin}/pay/${slug}`;
+    navigator.clipboard.writeText(url);
+    alert('Link copiado!');
+}
+
+async function deleteLink(id) {
+    if (!confirm('¿Cancelar este link?')) return;
+    await fetch(`${API_URL}/${id}`, { method: 'DELETE' });
+    loadLinks();
+}
+
+function openModal() {
+    document.getElementById('modal').classList.remove('hidden');
+    document.getElementById('modal').classList.add('flex');
+}
+
+function closeModal() {
+    document.getElementById('modal').classList.add('hidden');
+    document.getElementById('modal').classList.remove('flex');
+    document.getElementById('create-form').reset();
+}
+
+document.getElementById('create-form').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const formData = new FormData(e.target);
+
+    const res = await fetch(API_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            amount: parseInt(formData.get('amount')),
+            description: formData.get('description')
+        })
+    });
+
+    if (res.ok) {
+        closeModal();
+        loadLinks();
+    } else {
+        const error = await res.json();
+        alert(error.detail || 'Error al crear link');
+    }
+});
+
+let filterTimeout;
+document.getElementById('filter-form').addEventListener('input', () => {
+    clearTimeout(filterTimeout);
+    filterTimeout = setTimeout(loadLinks, 300);
+});
+document.getElementById('filter-form').addEventListener('submit', (e) => e.preventDefault());
+
+async function logout() {
+    await fetch('/auth/logout', { method: 'POST' });
+    window.location.reload();
+}
+
+function listenLinkEvents() {
+    const source = new EventSource(`${API_URL}/events`);
+    source.addEventListener('link', (e) => {
+        const update = JSON.parse(e.data);
+        const link = links.find(l => l.id === update.id);
+        if (!link) return;
+        link.status = update.status;
+        link.times_paid = update.times_paid;
+        link.views_count = update.views_count;
+        renderLinks();
+    });
+}
+
+loadUser();
+loadLinks();
+listenLinkEvents();
@@ -0,0 +1,22 @@
+async function initPayment() {
+    const btn = document.getElementById('pay-btn');
+    btn.disabled = true;
+    btn.innerHTML = '<svg class="animate-spin h-5 w-5 mr-2" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4" fill="none"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4z"></path></svg> Procesando...';
+
+    try {
+        const res = await fetch('/pay/' + encodeURIComponent(btn.dataset.slug) + '/init', { method: 'POST' });
+        const data = await res.json();
+
+        if (res.ok) {
+            window.location.href = data.redirect_url;
+        } else {
+            alert(data.detail || 'Error al iniciar pago');
+            btn.disabled = false;
+            btn.innerHTML = 'Pagar con Webpay';
+        }
+    } catch (e) {
+        alert('Error de conexión');
+        btn.disabled = false;
+        btn.innerHTML = 'Pagar con Webpay';
+    }
+}
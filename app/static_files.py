@@ -0,0 +1,50 @@
+import stat
+from mimetypes import guess_type
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Preferred first
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves the hashed build output under dist/.
+
+    Uses the .br/.gz variants generated at build time when the client accepts
+    them, and marks every hashed file as immutable.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if not path.startswith("dist/"):
+            return await super().get_response(path, scope)
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+
+        response = None
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                response = FileResponse(
+                    full_path,
+                    stat_result=stat_result,
+                    media_type=guess_type(path)[0],
+                    headers={"Content-Encoding": encoding},
+                )
+                break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
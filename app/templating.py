@@ -0,0 +1,39 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from fastapi.templating import Jinja2Templates
+
+from app.services.profiling import Span
+
+STATIC_DIR = Path("app/static")
+MANIFEST_PATH = STATIC_DIR / "dist" / "manifest.json"
+
+
+@lru_cache
+def load_asset_manifest() -> dict[str, str]:
+    """Map of source asset name to hashed file, written by scripts/build_assets.py."""
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text())
+
+
+def asset_url(name: str) -> str:
+    """URL of a static asset, hashed when the assets have been built."""
+    hashed = load_asset_manifest().get(name)
+    if hashed:
+        return f"/static/dist/{hashed}"
+    return f"/static/src/{name}"
+
+
+class ProfiledTemplates(Jinja2Templates):
+    """Jinja2Templates that reports rendering as template time in request profiles."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        with Span("template"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+templates = ProfiledTemplates(directory="app/templates")
+templates.env.globals["asset_url"] = asset_url
+templates.env.globals["assets_built"] = lambda: bool(load_asset_manifest())
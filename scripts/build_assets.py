@@ -0,0 +1,84 @@
+"""Build the static assets served from app/static/dist.
+
+Compiles the purged, minified Tailwind CSS, copies the page scripts,
+fingerprints every file with a content hash and writes .gz/.br variants next
+to it, plus the manifest read by app.templating.
+
+    python scripts/build_assets.py
+
+Requires Node.js (npx) for the Tailwind CLI. Brotli variants are only
+generated when the `brotli` package is installed.
+"""
+import gzip
+import hashlib
+import json
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = ROOT / "app" / "static" / "src"
+DIST_DIR = ROOT / "app" / "static" / "dist"
+TAILWIND_VERSION = "3.4.17"
+SCRIPTS = ("dashboard.js", "payment_page.js")
+
+
+def build_css(output: Path) -> None:
+    subprocess.run(
+        [
+            "npx", "--yes", f"tailwindcss@{TAILWIND_VERSION}",
+            "--config", str(ROOT / "tailwind.config.js"),
+            "--input", str(SRC_DIR / "app.css"),
+            "--output", str(output),
+            "--minify",
+        ],
+        cwd=ROOT,
+        check=True,
+    )
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    stem, ext = name.rsplit(".", 1)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{stem}.{digest}.{ext}"
+
+
+def write_variants(path: Path, content: bytes) -> None:
+    path.write_bytes(content)
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(content, quality=11))
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        css_path = Path(tmp) / "app.css"
+        build_css(css_path)
+        sources = {"app.css": css_path.read_bytes()}
+
+    for name in SCRIPTS:
+        sources[name] = (SRC_DIR / name).read_bytes()
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    DIST_DIR.mkdir(parents=True)
+
+    manifest = {}
+    for name, content in sources.items():
+        hashed = fingerprint(name, content)
+        write_variants(DIST_DIR / hashed, content)
+        manifest[name] = hashed
+        print(f"{name} -> dist/{hashed} ({len(content)} bytes)")
+
+    (DIST_DIR / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    if brotli is None:
+        print("brotli not installed: skipped .br variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Concurrency check for single-use link reservations.
+
+Fires many simultaneous POST /pay/{slug}/init against one unpaid, unreserved
+single-use link and checks that exactly one gets a Webpay redirect and every
+other attempt is answered 409 (payment in progress):
+
+    python scripts/check_reservations.py --slug abc123xyz --attempts 50
+
+Best run against a server with WEBPAY_ENVIRONMENT=simulated. The winning
+checkout is left pending, so the link stays reserved for
+PAYMENT_RESERVATION_SECONDS; use a fresh link for every run.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+
+async def run(base_url: str, slug: str, attempts: int) -> bool:
+    limits = httpx.Limits(max_connections=attempts, max_keepalive_connections=attempts)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # Release every request at once
+        start_gate = asyncio.Event()
+
+        async def attempt() -> int:
+            await start_gate.wait()
+            response = await client.post(f"/api/v1/pay/{slug}/init")
+            return response.status_code
+
+        tasks = [asyncio.create_task(attempt()) for _ in range(attempts)]
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        start_gate.set()
+        statuses = Counter(await asyncio.gather(*tasks))
+        elapsed = time.perf_counter() - start
+
+    print(f"{attempts} concurrent inits in {elapsed * 1000:.0f}ms")
+    for code, count in sorted(statuses.items()):
+        print(f"  HTTP {code:<4} {count}")
+
+    ok = statuses[200] == 1 and statuses[409] == attempts - 1
+    print("ok: exactly one checkout started" if ok else "FAIL: expected one 200 and the rest 409")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--slug", required=True, help="Slug of an unpaid single-use payment link")
+    parser.add_argument("--attempts", type=int, default=50)
+    args = parser.parse_args()
+    if not asyncio.run(run(args.base_url, args.slug, args.attempts)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""End-to-end checkout load test against a server running with WEBPAY_ENVIRONMENT=simulated.
+
+Each run opens the payment page, starts the payment, loads the simulated
+Webpay form and follows it back to /pay/return, exactly like a browser:
+
+    python scripts/load_checkout.py --slug abc123xyz --payments 1000 --concurrency 10
+
+Use a multi-use link (single_use=false) so every payment can go through.
+Prints the outcome counts and per-step latency percentiles.
+"""
+import argparse
+import asyncio
+import re
+import time
+from collections import Counter, defaultdict
+from html import unescape
+from urllib.parse import urlsplit
+
+import httpx
+
+REFRESH_URL = re.compile(r'http-equiv="refresh" content="\d+;url=([^"]+)"')
+STEPS = ("page", "init", "webpay", "return")
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+
+
+async def checkout(client: httpx.AsyncClient, slug: str, timings: dict[str, list[float]]) -> str:
+    async def timed(step: str, method: str, url: str) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url)
+        timings[step].append(time.perf_counter() - start)
+        return response
+
+    page = await timed("page", "GET", f"/api/v1/pay/{slug}")
+    if page.status_code != 200:
+        return f"page_{page.status_code}"
+
+    init = await timed("init", "POST", f"/api/v1/pay/{slug}/init")
+    if init.status_code != 200:
+        return f"init_{init.status_code}"
+
+    form = await timed("webpay", "GET", init.json()["redirect_url"])
+    match = REFRESH_URL.search(form.text)
+    if form.status_code != 200 or not match:
+        return f"webpay_{form.status_code}"
+
+    # The return URL is public (APP_URL/pay/return); call the API route directly
+    query = urlsplit(unescape(match.group(1))).query
+    result = await timed("return", "GET", f"/api/v1/pay/return?{query}")
+    if "Pago Exitoso" in result.text:
+        return "approved"
+    if result.status_code == 503:
+        return "unavailable"
+    return "not_approved"
+
+
+async def run(base_url: str, slug: str, payments: int, concurrency: int) -> None:
+    timings: dict[str, list[float]] = defaultdict(list)
+    outcomes: Counter[str] = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def one() -> None:
+            async with semaphore:
+                try:
+                    outcomes[await checkout(client, slug, timings)] += 1
+                except httpx.HTTPError as e:
+                    outcomes[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(payments)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{payments} checkouts in {elapsed:.1f}s ({payments / elapsed:.1f}/s), concurrency {concurrency}")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:<16} {count}")
+    print(f"{'step':<8} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for step in STEPS:
+        values = timings[step]
+        if values:
+            print(
+                f"{step:<8} {len(values):>7} {percentile(values, 0.5):>9.1f} "
+                f"{percentile(values, 0.95):>9.1f} {percentile(values, 0.99):>9.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--slug", required=True, help="Slug of a multi-use payment link")
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.slug, args.payments, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+    content: [
+        './app/templates/**/*.html',
+        './app/static/src/**/*.js',
+    ],
+    theme: {
+        extend: {
+            colors: {
+                primary: '#6366f1',
+                secondary: '#10b981',
+            },
+        },
+    },
+};
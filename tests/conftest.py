@@ -0,0 +1,94 @@
+"""Test setup: a scratch database migrated to head and the simulated Webpay.
+
+Settings are read when app modules are imported, so the environment is set
+here first. The suite runs on a temporary SQLite file; set
+TEST_DATABASE_URL to run it against a scratch PostgreSQL database instead.
+"""
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+_tmp_dir = tempfile.mkdtemp(prefix="linkpago-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{_tmp_dir}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ["WEBPAY_ENVIRONMENT"] = "simulated"
+os.environ["WEBPAY_SIMULATOR_LATENCY_MEDIAN_MS"] = "20"
+os.environ["WEBPAY_SIMULATOR_ERROR_RATIO"] = "0"
+# Every simulated payment is approved unless a test patches the outcome
+os.environ["WEBPAY_SIMULATOR_APPROVE_RATIO"] = "1"
+for outcome in ("REJECT", "ABORT", "TIMEOUT"):
+    os.environ[f"WEBPAY_SIMULATOR_{outcome}_RATIO"] = "0"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.main import app
+from app.models.payment_link import PaymentLink
+from app.models.user import User
+from app.services.webpay import CircuitBreaker, webpay_service
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    # No ini file: it would reconfigure logging under pytest
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def user(db) -> User:
+    user = User(
+        email=f"{uuid.uuid4().hex[:12]}@example.com",
+        name="Test merchant",
+        google_id=uuid.uuid4().hex,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def make_link(db, user):
+    def make_link(**values) -> PaymentLink:
+        link = PaymentLink(user_id=user.id, **({"amount": 10_000, "description": "Test link"} | values))
+        db.add(link)
+        db.commit()
+        return link
+
+    return make_link
+
+
+@pytest.fixture
+def client():
+    # No lifespan: background workers stay off
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def webpay_breaker(monkeypatch):
+    """A fresh circuit breaker per test, so failures don't carry over."""
+    breaker = webpay_service.breaker
+    monkeypatch.setattr(
+        webpay_service,
+        "breaker",
+        CircuitBreaker(
+            window_seconds=breaker.window_seconds,
+            min_calls=breaker.min_calls,
+            error_rate=breaker.error_rate,
+            slow_call_seconds=breaker.slow_call_seconds,
+            open_seconds=breaker.open_seconds,
+        ),
+    )
@@ -0,0 +1,120 @@
+"""Commits that get no answer from Transbank are reconciled, never failed blindly."""
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.models.payment_link import PaymentLinkStatus
+from app.models.transaction import Transaction, TransactionStatus
+from app.services.checkout import CheckoutReconciler
+from app.services.webpay import webpay_service
+
+
+def start_checkout(client, slug: str) -> str:
+    response = client.post(f"/api/v1/pay/{slug}/init")
+    assert response.status_code == 200, response.text
+    return parse_qs(urlparse(response.json()["redirect_url"]).query)["token_ws"][0]
+
+
+def transaction_status(db, token: str) -> TransactionStatus:
+    db.expire_all()
+    return db.query(Transaction.status).filter(Transaction.token == token).scalar()
+
+
+@pytest.fixture
+def commit_timeout(monkeypatch):
+    monkeypatch.setattr(webpay_service, "commit_timeout", 0.1)
+
+
+def test_commit_timeout_keeps_link_reserved_until_reconciled(client, db, make_link, commit_timeout, monkeypatch):
+    link = make_link(single_use=True)
+    token = start_checkout(client, link.slug)
+
+    commit = webpay_service.tx.commit
+
+    def late_commit(token):
+        time.sleep(0.3)
+        return commit(token)
+
+    monkeypatch.setattr(webpay_service.tx, "commit", late_commit)
+    response = client.get("/api/v1/pay/return", params={"token_ws": token})
+    assert "procesando" in response.text
+    assert transaction_status(db, token) == TransactionStatus.PROCESSING
+    # The charge may still go through: nobody else can pay the link meanwhile
+    assert client.post(f"/api/v1/pay/{link.slug}/init").status_code == 409
+
+    time.sleep(0.4)
+    response = client.get("/api/v1/pay/return", params={"token_ws": token})
+    assert "Pago Exitoso" in response.text
+    assert transaction_status(db, token) == TransactionStatus.AUTHORIZED
+    db.refresh(link)
+    assert link.status == PaymentLinkStatus.PAID
+    assert link.times_paid == 1
+
+
+def test_commit_that_never_landed_fails_after_commit_window(client, db, make_link, commit_timeout, monkeypatch):
+    link = make_link(single_use=True)
+    token = start_checkout(client, link.slug)
+
+    def lost_commit(token):
+        time.sleep(0.2)
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(webpay_service.tx, "commit", lost_commit)
+    client.get("/api/v1/pay/return", params={"token_ws": token})
+    assert transaction_status(db, token) == TransactionStatus.PROCESSING
+
+    # Transbank never committed it: only final once it no longer can
+    CheckoutReconciler(poll_seconds=60, commit_window_seconds=3600).reconcile_stuck()
+    assert transaction_status(db, token) == TransactionStatus.PROCESSING
+    CheckoutReconciler(poll_seconds=60, commit_window_seconds=0).reconcile_stuck()
+    assert transaction_status(db, token) == TransactionStatus.FAILED
+
+    assert client.post(f"/api/v1/pay/{link.slug}/init").status_code == 200
+
+
+def test_rejected_commit_releases_link(client, db, make_link, monkeypatch):
+    link = make_link(single_use=True)
+    token = start_checkout(client, link.slug)
+
+    monkeypatch.setattr(webpay_service.tx, "outcome", lambda token: "rejected")
+    response = client.get("/api/v1/pay/return", params={"token_ws": token})
+    assert "rechazado" in response.text
+    assert transaction_status(db, token) == TransactionStatus.FAILED
+    assert client.post(f"/api/v1/pay/{link.slug}/init").status_code == 200
+
+
+def test_open_breaker_still_shows_payment_page(client, make_link):
+    link = make_link()
+    breaker = webpay_service.breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False, 0.0)
+    assert breaker.is_open
+
+    response = client.get(f"/api/v1/pay/{link.slug}")
+    assert response.status_code == 200
+    assert link.description in response.text
+    assert "no está disponible" in response.text
+
+    response = client.post(f"/api/v1/pay/{link.slug}/init")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_checkout_reads_no_unloaded_link_columns(client, make_link):
+    slug = make_link(single_use=True).slug
+    selects = []
+
+    def count_link_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM payment_links" in statement:
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_link_selects)
+    try:
+        assert client.post(f"/api/v1/pay/{slug}/init").status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", count_link_selects)
+    # Only the projected lookup: no lazy load of a column it left out
+    assert len(selects) == 1, "\n\n".join(selects)
@@ -0,0 +1,54 @@
+"""Checkout concurrency is bounded by Transbank, not by the DB connection pool."""
+import math
+from urllib.parse import parse_qs, urlparse
+
+import anyio
+import httpx
+import pytest
+
+from app.main import app
+from app.models.transaction import Transaction, TransactionStatus
+from app.services.webpay import webpay_service
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def checkout(client: httpx.AsyncClient, slug: str) -> str:
+    response = await client.post(f"/api/v1/pay/{slug}/init")
+    assert response.status_code == 200, response.text
+    token = parse_qs(urlparse(response.json()["redirect_url"]).query)["token_ws"][0]
+    response = await client.get("/api/v1/pay/return", params={"token_ws": token})
+    assert "Pago Exitoso" in response.text
+    return token
+
+
+async def test_checkouts_beyond_pool_size(db, make_link, monkeypatch):
+    # Every Transbank call takes ~300 ms, so all checkouts are in flight at once
+    monkeypatch.setattr(webpay_service.tx, "latency_mu", math.log(0.3))
+    monkeypatch.setattr(webpay_service.tx, "latency_sigma", 0.0)
+    link = make_link(single_use=False)
+    # Well past the connection pool (5 + 10 overflow)
+    checkouts = 40
+
+    tokens = []
+
+    async def run():
+        tokens.append(await checkout(client, link.slug))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        with anyio.fail_after(30):
+            async with anyio.create_task_group() as tasks:
+                for _ in range(checkouts):
+                    tasks.start_soon(run)
+
+    assert len(tokens) == checkouts
+    statuses = db.query(Transaction.status).filter(Transaction.token.in_(tokens)).all()
+    assert {status for status, in statuses} == {TransactionStatus.AUTHORIZED}
+    db.refresh(link)
+    assert link.times_paid == checkouts
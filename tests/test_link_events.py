@@ -0,0 +1,59 @@
+"""Link changes reach the owner's dashboards as link events."""
+from collections import defaultdict
+
+import orjson
+import pytest
+
+from app.api.deps import get_current_user
+from app.main import app
+from app.models.payment_link import PaymentLinkStatus
+from app.services.link_events import LINK_EVENTS_CHANNEL
+from app.services.pubsub import pg_listener
+
+
+@pytest.fixture
+def link_events(monkeypatch) -> list[dict]:
+    events = []
+    monkeypatch.setattr(pg_listener, "_callbacks", defaultdict(list))
+    pg_listener.subscribe(LINK_EVENTS_CHANNEL, lambda payload: events.append(orjson.loads(payload)))
+    return events
+
+
+@pytest.fixture
+def logged_in(user):
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield user
+    app.dependency_overrides.pop(get_current_user)
+
+
+def test_bulk_update_publishes_each_updated_link(client, make_link, logged_in, link_events):
+    active = [make_link(), make_link()]
+    paid = make_link(status=PaymentLinkStatus.PAID)
+
+    response = client.patch(
+        "/api/v1/links/bulk",
+        json={"ids": [str(link.id) for link in [*active, paid]], "status": "cancelled"},
+    )
+    assert response.status_code == 200
+    assert response.json()["updated"] == 2
+
+    assert sorted(event["id"] for event in link_events) == sorted(str(link.id) for link in active)
+    assert {event["status"] for event in link_events} == {"cancelled"}
+    assert {event["user_id"] for event in link_events} == {str(logged_in.id)}
+
+
+def test_update_publishes_link(client, make_link, logged_in, link_events):
+    link = make_link()
+
+    response = client.patch(f"/api/v1/links/{link.id}", json={"status": "cancelled"})
+    assert response.status_code == 200
+
+    assert [(event["id"], event["status"]) for event in link_events] == [(str(link.id), "cancelled")]
+
+
+def test_delete_publishes_link(client, make_link, logged_in, link_events):
+    link = make_link()
+
+    assert client.delete(f"/api/v1/links/{link.id}").status_code == 204
+
+    assert [(event["id"], event["status"]) for event in link_events] == [(str(link.id), "cancelled")]
@@ -0,0 +1,12 @@
+"""The migrations and the models describe the same schema."""
+from alembic import command
+from alembic.config import Config
+
+from tests.conftest import ROOT
+
+
+def test_models_match_migrations():
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    # Raises AutogenerateDiffsDetected on drift
+    command.check(config)
@@ -0,0 +1,139 @@
+"""Digest notifications: when each merchant's summary is due, and what it sends."""
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import anyio
+import pytest
+
+from app.models.notification import PendingNotification
+from app.models.user import NotificationMode
+from app.services import email, notifications
+from app.services.notifications import NotificationDigester, last_daily_send
+
+SANTIAGO = ZoneInfo("America/Santiago")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def digester() -> NotificationDigester:
+    return NotificationDigester(poll_seconds=60, daily_hour=8, tz=SANTIAGO)
+
+
+@pytest.fixture
+def queue_payment(db, user, make_link):
+    def queue_payment(created_at: datetime, link=None, description: str = "Test link") -> PendingNotification:
+        link = link or make_link(description=description)
+        payment = PendingNotification(
+            user_id=user.id,
+            payment_link_id=link.id,
+            description=description,
+            amount=10_000,
+            authorization_code="123456",
+            # In UTC like the column default: SQLite drops the offset
+            created_at=created_at.astimezone(timezone.utc),
+        )
+        db.add(payment)
+        db.commit()
+        return payment
+
+    return queue_payment
+
+
+def is_due(digester: NotificationDigester, user, now: datetime) -> bool:
+    return user.id in {user_id for user_id, _ in digester.due_users(now)}
+
+
+def test_digest_is_due_after_digest_minutes(db, user, digester, queue_payment):
+    user.notification_mode = NotificationMode.DIGEST
+    user.notification_digest_minutes = 30
+    db.commit()
+    queued_at = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    queue_payment(queued_at)
+
+    assert not is_due(digester, user, queued_at + timedelta(minutes=29))
+    assert is_due(digester, user, queued_at + timedelta(minutes=30))
+
+
+def test_last_daily_send_uses_local_hour():
+    # 10:30 UTC is 07:30 in Santiago (UTC-3): today's 08:00 hasn't come yet
+    now = datetime(2026, 10, 19, 10, 30, tzinfo=timezone.utc)
+    assert last_daily_send(now, 8, SANTIAGO) == datetime(2026, 10, 18, 8, 0, tzinfo=SANTIAGO)
+    assert last_daily_send(now, 8, timezone.utc) == datetime(2026, 10, 19, 8, 0, tzinfo=timezone.utc)
+
+
+def test_daily_is_due_at_local_hour(db, user, digester, queue_payment):
+    user.notification_mode = NotificationMode.DAILY
+    db.commit()
+    queue_payment(datetime(2026, 10, 19, 7, 30, tzinfo=SANTIAGO))
+
+    assert not is_due(digester, user, datetime(2026, 10, 19, 7, 59, tzinfo=SANTIAGO))
+    # 08:00 in Santiago is 11:00 UTC, well after 08:00 UTC
+    assert not is_due(digester, user, datetime(2026, 10, 19, 10, 59, tzinfo=timezone.utc))
+    assert is_due(digester, user, datetime(2026, 10, 19, 8, 0, tzinfo=SANTIAGO))
+
+
+def test_daily_waits_for_next_day_after_send_hour(db, user, digester, queue_payment):
+    user.notification_mode = NotificationMode.DAILY
+    db.commit()
+    queue_payment(datetime(2026, 10, 19, 8, 30, tzinfo=SANTIAGO))
+
+    assert not is_due(digester, user, datetime(2026, 10, 19, 23, 0, tzinfo=SANTIAGO))
+    assert is_due(digester, user, datetime(2026, 10, 20, 8, 0, tzinfo=SANTIAGO))
+
+
+@pytest.mark.anyio
+async def test_queued_payments_are_deleted_only_after_sending(db, user, digester, queue_payment, monkeypatch):
+    queue_payment(datetime.now(timezone.utc))
+    sent = []
+
+    async def failing_send(*args):
+        raise ConnectionError("SMTP unavailable")
+
+    async def send(recipient_email, payments, since, until, tz):
+        sent.append((recipient_email, len(payments)))
+
+    def pending() -> int:
+        db.expire_all()
+        return db.query(PendingNotification).filter(PendingNotification.user_id == user.id).count()
+
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(notifications, "send_payment_digest", failing_send)
+    with pytest.raises(ConnectionError):
+        await anyio.to_thread.run_sync(digester.send_digest, user.id, user.email, now)
+    assert pending() == 1
+
+    monkeypatch.setattr(notifications, "send_payment_digest", send)
+    assert await anyio.to_thread.run_sync(digester.send_digest, user.id, user.email, now) == 1
+    assert sent == [(user.email, 1)]
+    assert pending() == 0
+
+
+@pytest.mark.anyio
+async def test_digest_groups_by_link_not_description(user, make_link, queue_payment, monkeypatch):
+    now = datetime.now(timezone.utc)
+    # Two links with the same description
+    first, second = make_link(description="Entrada"), make_link(description="Entrada")
+    payments = [
+        queue_payment(now, link=first, description="Entrada"),
+        queue_payment(now, link=first, description="Entrada"),
+        queue_payment(now, link=second, description="Entrada"),
+    ]
+    rendered = {}
+
+    class Template:
+        def render(self, **context):
+            rendered.update(context)
+            return ""
+
+    async def no_send(*args):
+        pass
+
+    monkeypatch.setattr(email, "_digest_template", Template())
+    monkeypatch.setattr(email, "_send", no_send)
+    await email.send_payment_digest(user.email, payments, now, now, SANTIAGO)
+
+    assert [(link["description"], link["count"]) for link in rendered["links"]] == [("Entrada", 2), ("Entrada", 1)]
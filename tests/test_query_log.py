@@ -0,0 +1,28 @@
+"""Slow queries are only re-executed by EXPLAIN ANALYZE when that is harmless."""
+import pytest
+
+from app.services.query_log import explain_statement
+
+READ_ONLY = [
+    "SELECT payment_links.id FROM payment_links WHERE payment_links.slug = %(slug)s",
+    "SELECT count(*) FROM transactions JOIN payment_links ON payment_links.id = transactions.payment_link_id",
+]
+
+SIDE_EFFECTS = [
+    "SELECT pg_notify(%(channel)s, %(payload)s)",
+    "SELECT ensure_transaction_partitions(%(months_ahead)s)",
+    "SELECT payment_links.id FROM payment_links WHERE payment_links.id = %(id)s FOR UPDATE",
+    "SELECT notification_queue.id FROM notification_queue FOR UPDATE SKIP LOCKED",
+    "SELECT link_visitor_sketches.id FROM link_visitor_sketches FOR NO KEY UPDATE",
+    "SELECT pg_notify('linkpago_link_events', payment_links.id::text) FROM payment_links",
+]
+
+
+@pytest.mark.parametrize("statement", READ_ONLY)
+def test_read_only_select_is_analyzed(statement):
+    assert explain_statement(statement) == f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+
+
+@pytest.mark.parametrize("statement", SIDE_EFFECTS)
+def test_select_with_side_effects_is_not_executed(statement):
+    assert explain_statement(statement) == f"EXPLAIN {statement}"
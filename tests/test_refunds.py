@@ -0,0 +1,77 @@
+"""Refund jobs keep their lease for as long as their worker runs them."""
+import threading
+import time
+
+from sqlalchemy import select
+
+from app.models.payment_link import PaymentLink
+from app.models.refund import RefundItemStatus, RefundJobItem, RefundJobStatus
+from app.services.refunds import RefundRunner, create_refund_job
+from app.services.webpay import webpay_service
+from tests.test_checkout import start_checkout
+
+LEASE_SECONDS = 0.3
+
+
+def make_runner() -> RefundRunner:
+    return RefundRunner(
+        concurrency=1, rate_per_second=100, max_attempts=3, lease_seconds=LEASE_SECONDS, poll_seconds=60
+    )
+
+
+def test_lease_outlives_slow_refunds(client, db, user, make_link, monkeypatch):
+    link = make_link(single_use=False)
+    for _ in range(2):
+        client.get("/api/v1/pay/return", params={"token_ws": start_checkout(client, link.slug)})
+    job = create_refund_job(db, user.id, select(PaymentLink.id).where(PaymentLink.id == link.id), {})
+    db.commit()
+
+    refund = webpay_service.tx.refund
+
+    def slow_refund(token, amount):
+        # Each refund, and so the batch, takes longer than the lease
+        time.sleep(LEASE_SECONDS * 2)
+        return refund(token, amount)
+
+    monkeypatch.setattr(webpay_service.tx, "refund", slow_refund)
+    worker = threading.Thread(target=make_runner().run_job, args=(job.id,))
+    worker.start()
+
+    time.sleep(LEASE_SECONDS * 3)
+    assert worker.is_alive()
+    # Another worker polling meanwhile can't take the job over
+    assert not make_runner()._claim(db, job.id)
+
+    worker.join(timeout=10)
+    db.refresh(job)
+    assert job.status == RefundJobStatus.COMPLETED
+    statuses = db.execute(select(RefundJobItem.status).where(RefundJobItem.job_id == job.id)).scalars().all()
+    assert statuses == [RefundItemStatus.SUCCEEDED] * 2
+
+
+def test_cancelled_job_stops_between_items(client, db, user, make_link, monkeypatch):
+    link = make_link(single_use=False)
+    for _ in range(3):
+        client.get("/api/v1/pay/return", params={"token_ws": start_checkout(client, link.slug)})
+    job = create_refund_job(db, user.id, select(PaymentLink.id).where(PaymentLink.id == link.id), {})
+    db.commit()
+
+    refund = webpay_service.tx.refund
+
+    def slow_refund(token, amount):
+        time.sleep(LEASE_SECONDS * 2)
+        return refund(token, amount)
+
+    monkeypatch.setattr(webpay_service.tx, "refund", slow_refund)
+    worker = threading.Thread(target=make_runner().run_job, args=(job.id,))
+    worker.start()
+
+    time.sleep(LEASE_SECONDS)
+    job.status = RefundJobStatus.CANCELLED
+    db.commit()
+
+    worker.join(timeout=10)
+    statuses = db.execute(select(RefundJobItem.status).where(RefundJobItem.job_id == job.id)).scalars().all()
+    # The refund in flight finishes; the lease heartbeat stops the rest of the batch
+    assert statuses.count(RefundItemStatus.SUCCEEDED) == 1
+    assert statuses.count(RefundItemStatus.PENDING) == 2
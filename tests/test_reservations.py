@@ -0,0 +1,37 @@
+"""A single-use link can only be in one checkout at a time."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.webpay import webpay_service
+
+ATTEMPTS = 20
+
+
+def test_concurrent_inits_reserve_single_use_link_once(make_link):
+    link = make_link(single_use=True)
+    start = threading.Barrier(ATTEMPTS)
+
+    def init(_) -> int:
+        client = TestClient(app)
+        start.wait()
+        return client.post(f"/api/v1/pay/{link.slug}/init").status_code
+
+    with ThreadPoolExecutor(max_workers=ATTEMPTS) as executor:
+        codes = sorted(executor.map(init, range(ATTEMPTS)))
+
+    assert codes == [200] + [409] * (ATTEMPTS - 1)
+
+
+def test_reservation_is_released_when_webpay_fails(client, make_link, monkeypatch):
+    link = make_link(single_use=True)
+
+    def failing_create(**kwargs):
+        raise ConnectionError("connection refused")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(webpay_service.tx, "create", failing_create)
+        assert client.post(f"/api/v1/pay/{link.slug}/init").status_code == 500
+    assert client.post(f"/api/v1/pay/{link.slug}/init").status_code == 200
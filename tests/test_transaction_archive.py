@@ -0,0 +1,21 @@
+"""Archived Webpay responses are still readable."""
+from app.models.transaction import Transaction
+from app.services.transaction_archive import archive_webpay_responses, get_webpay_response
+from tests.test_checkout import start_checkout
+
+
+def test_archived_response_is_read_back(client, db, make_link):
+    link = make_link()
+    token = start_checkout(client, link.slug)
+    client.get("/api/v1/pay/return", params={"token_ws": token})
+    transaction_id, created_at, response = (
+        db.query(Transaction.id, Transaction.created_at, Transaction.webpay_response)
+        .filter(Transaction.token == token)
+        .one()
+    )
+    assert response["status"] == "AUTHORIZED"
+
+    # A cutoff in the future archives everything
+    assert archive_webpay_responses(db, older_than_days=-1, batch_size=100) >= 1
+    assert db.query(Transaction.webpay_response).filter(Transaction.token == token).scalar() is None
+    assert get_webpay_response(db, transaction_id, created_at) == response
@@ -0,0 +1,37 @@
+"""Unique visitors of a payment page are counted once per visitor."""
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.visitors import visitor_counter
+
+
+def unique_visitors(db, link) -> int:
+    visitor_counter.flush()
+    db.refresh(link)
+    return link.unique_visitors
+
+
+def test_returning_visitor_is_counted_once(client, db, make_link):
+    link = make_link()
+    for _ in range(3):
+        assert client.get(f"/api/v1/pay/{link.slug}").status_code == 200
+    assert unique_visitors(db, link) == 1
+
+    # A different user agent (or address) with the same cookie is the same visitor
+    other = TestClient(app, headers={"user-agent": "updated-browser"}, cookies=client.cookies)
+    assert other.get(f"/api/v1/pay/{link.slug}").status_code == 200
+    assert unique_visitors(db, link) == 1
+
+    other = TestClient(app, headers={"user-agent": "other-browser"})
+    assert other.get(f"/api/v1/pay/{link.slug}").status_code == 200
+    assert unique_visitors(db, link) == 2
+    assert link.views_count == 5
+
+
+def test_cookieless_hits_are_counted_once(db, make_link):
+    link = make_link()
+    for _ in range(2):
+        # A fresh client each time: the cookie is never sent back
+        response = TestClient(app).get(f"/api/v1/pay/{link.slug}")
+        assert response.status_code == 200
+    assert unique_visitors(db, link) == 1
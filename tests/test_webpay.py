@@ -0,0 +1,52 @@
+"""Calls to Transbank: timeouts and what counts against the circuit breaker."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from transbank.error.transaction_commit_error import TransactionCommitError
+
+from app.services.webpay import WebpayTimeoutError, webpay_service
+
+
+def test_client_errors_do_not_open_breaker(monkeypatch):
+    def locked(token):
+        raise TransactionCommitError("Transaction already locked by another process", 422)
+
+    monkeypatch.setattr(webpay_service.tx, "commit", locked)
+    for _ in range(webpay_service.breaker.min_calls * 2):
+        with pytest.raises(TransactionCommitError):
+            webpay_service.commit_transaction("token")
+    assert not webpay_service.breaker.is_open
+
+
+def test_server_errors_open_breaker(monkeypatch):
+    def unavailable(token):
+        raise TransactionCommitError("Service unavailable", 503)
+
+    monkeypatch.setattr(webpay_service.tx, "commit", unavailable)
+    for _ in range(webpay_service.breaker.min_calls):
+        with pytest.raises(TransactionCommitError):
+            webpay_service.commit_transaction("token")
+    assert webpay_service.breaker.is_open
+
+
+def test_timed_out_call_still_queued_never_runs(monkeypatch):
+    monkeypatch.setattr(webpay_service, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(webpay_service, "refund_timeout", 0.1)
+    started = []
+    release = threading.Event()
+
+    def slow_refund(token, amount):
+        started.append(token)
+        release.wait(1)
+        return {"type": "REVERSED"}
+
+    monkeypatch.setattr(webpay_service.tx, "refund", slow_refund)
+    # The first call holds the only worker, so the second one times out while queued
+    for token in ("running", "queued"):
+        with pytest.raises(WebpayTimeoutError):
+            webpay_service.refund_transaction(token, 1_000)
+    release.set()
+    time.sleep(0.2)
+    assert started == ["running"]